@@ -0,0 +1,373 @@
+"""Offline benchmark of the collection pipeline against a simulated Vast.ai fleet.
+
+Starts a local stand-in for the Vast.ai API (/instances/ and /users/current) and a pool of
+paramiko SSH servers that serve synthetic miner.log files, then times every phase of
+instance_list -> get_log_info -> aggregation -> print_table at several fleet sizes.
+No Vast.ai account, API key or real instance is needed.
+
+Usage (from the repository folder):
+    python benchmarks/simulated_fleet.py
+    python benchmarks/simulated_fleet.py --sizes 10 100 1000 --latency 0.05 --failure-rate 0.02
+    python benchmarks/simulated_fleet.py --sizes 10 100 --stream
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vastai_aggregator as bot  # noqa: E402
+from vastai_aggregator import Config  # noqa: E402
+
+
+# Placeholder log path sent by the collector; each fake host swaps in its own log file
+SIMULATED_LOG_PATH = '/simulated/XENGPUMiner/miner.log'
+
+GPU_TYPES = [('RTX 4090', 1, 0.45, 2100.0), ('RTX 3090', 1, 0.22, 1150.0),
+             ('RTX 4090', 4, 1.80, 2100.0), ('RTX A5000', 2, 0.40, 900.0)]
+
+# Ways a simulated host can misbehave
+FAILURE_MODES = ('refuse', 'auth', 'missing_log', 'timeout')
+
+
+def write_ed25519_key(path):
+    """Write a new unencrypted Ed25519 private key in OpenSSH format and return the paramiko key."""
+    key = Ed25519PrivateKey.generate()
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH,
+                                  serialization.NoEncryption()))
+    return paramiko.Ed25519Key(filename=path)
+
+
+def miner_progress_line(runtime_seconds, normal_blocks, hash_rate, difficulty, ansi=True):
+    hours, rest = divmod(int(runtime_seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    green, reset = ('\x1b[32m', '\x1b[0m') if ansi else ('', '')
+    return (f"{green}Mining{reset}: {normal_blocks} {green}Blocks{reset} [{hours:02d}:{minutes:02d}:{seconds:02d}, "
+            f"0.01 Blocks/s, Details={green}super:0 normal:{normal_blocks}{reset}, "
+            f"HashRate:{green}{hash_rate:.2f}{reset}, Difficulty={difficulty}]")
+
+
+class SimulatedInstance:
+    """One fake Vast.ai instance: its API record, its miner.log and how its SSH server behaves."""
+
+    def __init__(self, instance_id, log_dir, latency=0.0, failure=None, ansi_noise=True):
+        gpu_name, num_gpus, dph_total, per_gpu_rate = random.choice(GPU_TYPES)
+        self.instance_id = instance_id
+        self.gpu_name = gpu_name
+        self.num_gpus = num_gpus
+        self.dph_total = dph_total
+        self.hash_rate = per_gpu_rate * num_gpus * random.uniform(0.7, 1.05)
+        self.latency = latency
+        self.failure = failure
+        self.ansi_noise = ansi_noise
+        self.runtime = random.randint(600, 48 * 3600)
+        self.normal_blocks = int(self.runtime / 3600 * random.uniform(2, 6))
+        self.log_path = os.path.join(log_dir, f'miner_{instance_id}.log')
+        self.ssh_port = None
+        open(self.log_path, 'w').close()
+        self.append_log(200)
+
+    def append_log(self, num_lines):
+        """Append tqdm-style progress updates (carriage-return separated) and some ANSI noise."""
+        chunks = []
+        for _ in range(num_lines):
+            self.runtime += 1
+            if random.random() < 0.01:
+                self.normal_blocks += 1
+            chunks.append('\r' + miner_progress_line(self.runtime, self.normal_blocks,
+                                                     self.hash_rate * random.uniform(0.98, 1.02), 120000,
+                                                     ansi=self.ansi_noise))
+            if self.ansi_noise and random.random() < 0.05:
+                chunks.append('\n\x1b[33mRecent block hash: 0000abcd...\x1b[0m\n')
+        with open(self.log_path, 'a') as f:
+            f.write(''.join(chunks))
+
+    def api_record(self):
+        return {
+            'id': self.instance_id,
+            'gpu_name': self.gpu_name,
+            'dph_total': self.dph_total,
+            'ssh_host': '127.0.0.1',
+            'ssh_port': self.ssh_port,
+            'num_gpus': self.num_gpus,
+            'gpu_util': random.uniform(80, 100),
+            'disk_util': random.uniform(5, 20),
+            'disk_space': 40.0,
+            'cpu_util': random.uniform(5, 30),
+            'label': f'sim-{self.instance_id}',
+            'actual_status': 'running',
+        }
+
+
+class FakeVastAPI:
+    """Local HTTP stand-in for the Vast.ai endpoints the script uses."""
+
+    def __init__(self, instances, latency=0.0, balance=1234.56):
+        self.instances = instances
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(latency)
+                path = self.path.split('?', 1)[0]
+                if path.startswith('/instances'):
+                    payload = {'instances': [instance.api_record() for instance in api.instances]}
+                elif path.startswith('/users/current'):
+                    payload = {'credit': balance}
+                else:
+                    payload = {}
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSSHServer(paramiko.ServerInterface):
+    """paramiko server side of one connection; runs the collector's command against the instance's log."""
+
+    def __init__(self, instance, exec_timeout):
+        self.instance = instance
+        self.exec_timeout = exec_timeout
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        if self.instance.failure == 'auth':
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._run, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def _run(self, channel, command):
+        """Run the command against the instance's log and stream its output until it exits or the channel closes."""
+        process = None
+        try:
+            time.sleep(self.instance.latency)
+            if self.instance.failure == 'timeout':
+                time.sleep(self.exec_timeout + 1)
+            # A host without miner.log gets a log path that does not exist, so the probe reports
+            # '@@log missing' and the tail command exits, as on a real instance
+            log_path = self.instance.log_path + '.missing' if self.instance.failure == 'missing_log' else self.instance.log_path
+            process = subprocess.Popen(['bash', '-c', command.replace(SIMULATED_LOG_PATH, log_path)],
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stdout, selectors.EVENT_READ)
+                while not channel.closed:
+                    if not selector.select(timeout=0.2):
+                        continue
+                    data = os.read(process.stdout.fileno(), 65536)
+                    if not data:
+                        break
+                    channel.sendall(data)
+            channel.send_exit_status(process.wait())
+        except Exception:
+            pass
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            if process is not None:
+                process.stdout.close()
+            channel.close()
+
+
+class FakeSSHFleet:
+    """One listening socket per simulated instance, served by a single accept loop."""
+
+    def __init__(self, instances, exec_timeout, host_key):
+        self.exec_timeout = exec_timeout
+        self.host_key = host_key
+        self.selector = selectors.DefaultSelector()
+        self.transports = []
+        self._stopped = False
+        for instance in instances:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('127.0.0.1', 0))
+            sock.listen(16)
+            sock.setblocking(False)
+            instance.ssh_port = sock.getsockname()[1]
+            self.selector.register(sock, selectors.EVENT_READ, instance)
+        self.thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while not self._stopped:
+            for key, _ in self.selector.select(timeout=0.2):
+                try:
+                    conn, _ = key.fileobj.accept()
+                except OSError:
+                    continue
+                conn.setblocking(True)
+                if key.data.failure == 'refuse':
+                    conn.close()
+                    continue
+                threading.Thread(target=self._serve, args=(conn, key.data), daemon=True).start()
+
+    def _serve(self, conn, instance):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self.host_key)
+        self.transports.append(transport)
+        try:
+            transport.start_server(server=FakeSSHServer(instance, self.exec_timeout))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def close(self):
+        self._stopped = True
+        self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        for transport in self.transports:
+            transport.close()
+
+
+def timed(results, phase, num_instances, func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    results.append((num_instances, phase, elapsed))
+    return value
+
+
+def wait_for_records(collector, instance_ids, predicate, timeout):
+    """Drain the collector until every instance in 'instance_ids' pushed a record matching 'predicate'; returns how many did."""
+    pending = set(instance_ids)
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        pending.difference_update(instance_id for instance_id, record in collector.drain().items() if predicate(record))
+        time.sleep(0.01)
+    return len(instance_ids) - len(pending)
+
+
+def run_benchmark(num_instances, args, workdir):
+    """Build a simulated fleet of the given size and time each pipeline phase against it."""
+    instances = []
+    for instance_id in range(1, num_instances + 1):
+        failure = random.choice(FAILURE_MODES) if random.random() < args.failure_rate else None
+        instances.append(SimulatedInstance(instance_id, workdir, latency=args.latency, failure=failure,
+                                           ansi_noise=not args.no_ansi))
+    ssh_fleet = FakeSSHFleet(instances, args.exec_timeout, write_ed25519_key(os.path.join(workdir, 'host_key')))
+    api = FakeVastAPI(instances, latency=args.api_latency)
+    client = bot.VastClient('simulated', base_url=api.url, requests_per_second=0)
+    pool = bot.SSHConnectionPool('root', args.client_key_path, connect_timeout=args.connect_timeout)
+    log_cursors = {}
+    results = []
+    try:
+        ssh_info_list, total_dph, total_gpus, balance = timed(
+            results, 'api (instances + balance)', num_instances, bot.fetch_instances_and_balance, client)
+        timed(results, 'ssh collect (cold)', num_instances, bot.collect_log_info, ssh_info_list, pool,
+              max_workers=args.workers, exec_timeout=args.exec_timeout, log_cursors=log_cursors,
+              log_path=SIMULATED_LOG_PATH)
+        for instance in instances:
+            instance.append_log(50)
+        log_info_by_instance = timed(results, 'ssh collect (warm)', num_instances, bot.collect_log_info, ssh_info_list,
+                                     pool, max_workers=args.workers, exec_timeout=args.exec_timeout,
+                                     log_cursors=log_cursors, log_path=SIMULATED_LOG_PATH)
+        fleet = timed(results, 'aggregate', num_instances, bot.aggregate_fleet, ssh_info_list, log_info_by_instance)
+        with contextlib.redirect_stdout(io.StringIO()):
+            timed(results, 'print_table', num_instances, bot.print_table, fleet['table_data'], fleet['mean_difficulty'],
+                  fleet['average_dollars_per_normal_block'], total_dph, None, None, None, None, None, None, None,
+                  fleet['sum_normal_block_per_hour'], fleet['total_hash_rate'], total_gpus)
+        parsed = sum(1 for log_info in log_info_by_instance.values() if log_info[0] is not None)
+        expected = sum(1 for instance in instances if instance.failure is None)
+        print(f"{num_instances} instances: {parsed} parsed, {expected} healthy, "
+              f"{num_instances - expected} simulated failures")
+
+        if args.stream:
+            healthy_ids = [instance.instance_id for instance in instances if instance.failure is None]
+            collector = bot.StreamingCollector(pool, {}, log_path=SIMULATED_LOG_PATH, max_workers=args.workers)
+            collector.set_instances(ssh_info_list)
+            collector.start()
+            try:
+                streaming = timed(results, 'stream (subscribe)', num_instances, wait_for_records, collector, healthy_ids,
+                                  lambda record: record.latest is not None, args.exec_timeout)
+                for instance in instances:
+                    instance.append_log(50)
+                updated = timed(results, 'stream (new lines)', num_instances, wait_for_records, collector, healthy_ids,
+                                lambda record: record.samples, args.exec_timeout)
+            finally:
+                collector.stop()
+            print(f"{num_instances} instances: {streaming} streaming, {updated} pushed new lines")
+    finally:
+        pool.close_all()
+        client.close()
+        api.close()
+        ssh_fleet.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the aggregator pipeline against a simulated fleet.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="Fleet sizes to simulate.")
+    parser.add_argument('--latency', type=float, default=0.02, help="Extra seconds each SSH command takes.")
+    parser.add_argument('--api-latency', type=float, default=0.05, help="Extra seconds each API call takes.")
+    parser.add_argument('--failure-rate', type=float, default=0.02,
+                        help="Fraction of hosts that refuse, reject auth, lack miner.log or time out.")
+    parser.add_argument('--no-ansi', action='store_true', help="Write logs without ANSI color codes.")
+    parser.add_argument('--workers', type=int, default=Config.max_concurrent_ssh, help="max_concurrent_ssh to use.")
+    parser.add_argument('--connect-timeout', type=float, default=Config.ssh_connect_timeout)
+    parser.add_argument('--exec-timeout', type=float, default=Config.ssh_exec_timeout)
+    parser.add_argument('--stream', action='store_true',
+                        help="Also time the 'tail -F' streaming collector: subscribing and pushing new lines.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        args.client_key_path = os.path.join(workdir, 'id_ed25519')
+        write_ed25519_key(args.client_key_path)
+        for size in args.sizes:
+            size_dir = os.path.join(workdir, str(size))
+            os.mkdir(size_dir)
+            results.extend(run_benchmark(size, args, size_dir))
+
+    print()
+    print(f"{'Instances':>9}  {'Phase':<26} {'Wall time':>10} {'Instances/s':>12}")
+    for num_instances, phase, elapsed in results:
+        print(f"{num_instances:>9}  {phase:<26} {elapsed:>9.3f}s {num_instances / elapsed if elapsed else float('inf'):>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""Builders for the samples, log lines and instances the tests feed to the aggregator."""
+from vastai_aggregator.logparse import MiningSample
+from vastai_aggregator.records import InstanceRecord
+
+
+def mining_sample(runtime_seconds, normal_blocks=0, hash_rate=1000.0, difficulty=120000):
+    """The MiningSample of a progress line written 'runtime_seconds' into a miner run."""
+    hours, rest = divmod(runtime_seconds, 3600)
+    return MiningSample(hours, rest // 60, rest % 60, 0, normal_blocks, 0, hash_rate, difficulty)
+
+
+def progress_line(runtime_seconds, normal_blocks, hash_rate=1000.0, difficulty=120000):
+    """A tqdm 'Mining:' progress line with colour codes, as written to miner.log."""
+    hours, rest = divmod(runtime_seconds, 3600)
+    return (f"\x1b[32mMining\x1b[0m: {normal_blocks} Blocks [{hours:02d}:{rest // 60:02d}:{rest % 60:02d}, 0.01 Blocks/s, "
+            f"Details=normal:{normal_blocks}, HashRate:{hash_rate:.2f}, Difficulty={difficulty}]")
+
+
+def instance_record(instance_id, num_gpus=1, dph_total=0.5, ssh_host='host', ssh_port=22, **fields):
+    """A running instance as listed by the API; 'fields' override any other attribute."""
+    record = InstanceRecord(instance_id, 'RTX 4090', dph_total, ssh_host, ssh_port, num_gpus, 99.0, 'running', '', 10.0, 100.0, 5.0)
+    for name, value in fields.items():
+        record[name] = value
+    return record
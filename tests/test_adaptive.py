@@ -0,0 +1,68 @@
+from vastai_aggregator.adaptive import AdaptivePollScheduler, running_instances
+from vastai_aggregator.probe import EMPTY_PROBE, ProbeResult
+
+from .helpers import instance_record, mining_sample
+
+
+def probe(hash_rate=1000.0):
+    return ProbeResult(mining_sample(3600, 10, hash_rate), None, None, None)
+
+
+def settle(scheduler, ssh_info, now=0):
+    """Record 'history_size' identical polls; returns the interval after the last one."""
+    for _ in range(scheduler.history_size):
+        interval = scheduler.record(ssh_info, probe(), now)
+    return interval
+
+
+def test_only_running_instances_are_due():
+    instances = [instance_record(1), instance_record(2, actual_status='exited'), instance_record(3, actual_status='loading')]
+    assert AdaptivePollScheduler(60).due(instances, now=0) == [instances[0]]
+    assert running_instances(instances) == [instances[0]]
+
+
+def test_stable_instance_interval_doubles_up_to_max():
+    scheduler = AdaptivePollScheduler(60, max_interval=300, history_size=3)
+    host = instance_record(1)
+    assert settle(scheduler, host) == 120
+    assert scheduler.record(host, probe(), 0) == 240
+    assert scheduler.record(host, probe(), 0) == 300
+    assert scheduler.record(host, probe(), 0) == 300
+
+
+def test_interval_resets_on_change():
+    scheduler = AdaptivePollScheduler(60, max_interval=600, history_size=3)
+    host = instance_record(1)
+    settle(scheduler, host)
+    assert scheduler.record(host, probe(), 0) == 240
+    assert scheduler.record(host, probe(hash_rate=700.0), 0) == 60
+
+
+def test_low_gpu_utilization_keeps_the_minimum_interval():
+    scheduler = AdaptivePollScheduler(60, history_size=3)
+    assert settle(scheduler, instance_record(1, gpu_util=40.0)) == 60
+
+
+def test_failures_back_off():
+    scheduler = AdaptivePollScheduler(60, max_interval=300)
+    host = instance_record(1)
+    failed = EMPTY_PROBE._replace(error='timeout')
+    assert [scheduler.record(host, failed, 0) for _ in range(4)] == [120, 240, 300, 300]
+    # A successful poll after failures is treated like a new sample, not a stable one
+    assert scheduler.record(host, probe(), 0) == 60
+
+
+def test_due_follows_next_poll_time():
+    scheduler = AdaptivePollScheduler(60, history_size=3)
+    host = instance_record(1)
+    settle(scheduler, host, now=1000)
+    assert scheduler.due([host], now=1000 + 60) == []
+    assert scheduler.due([host], now=1000 + 120 - 30) == [host]
+
+
+def test_stopped_instances_start_over():
+    scheduler = AdaptivePollScheduler(60, history_size=3)
+    host = instance_record(1)
+    settle(scheduler, host, now=0)
+    assert scheduler.due([instance_record(1, actual_status='stopped')], now=1) == []
+    assert scheduler.due([host], now=1) == [host]
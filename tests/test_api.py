@@ -0,0 +1,105 @@
+import email.utils
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from vastai_aggregator import api
+from vastai_aggregator.api import MissingJsonKeyError, VastClient, fetch_instance_list, iter_json_array
+
+DOCUMENT = {'success': True, 'instances': [{'id': 1, 'dph_total': 0.3125, 'label': None},
+                                           {'id': 22, 'dph_total': 12e-1, 'label': 'café "x"'}], 'total': 2}
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_items_match_json_loads_for_any_chunking(size):
+    data = json.dumps(DOCUMENT, indent=1, ensure_ascii=False).encode()
+    assert list(iter_json_array(chunked(data, size), 'instances')) == DOCUMENT['instances']
+
+
+def test_number_split_across_chunks():
+    assert list(iter_json_array([b'{"instances": [12', b'34, 5.', b'5e', b'1]}'], 'instances')) == [1234, 55.0]
+
+
+def test_empty_array_and_empty_chunks():
+    assert list(iter_json_array([b'', b' { "instances" : [ ] } ', b''], 'instances')) == []
+
+
+def test_missing_key_raises_key_error():
+    with pytest.raises(MissingJsonKeyError):
+        list(iter_json_array([b'{"success": false, "error": "not found"}'], 'instances'))
+    with pytest.raises(KeyError):
+        list(iter_json_array([b'{}'], 'instances'))
+
+
+@pytest.mark.parametrize('data', [b'[1, 2]', b'{"instances": [1, 2', b'{"instances": [1 2]}', b''])
+def test_invalid_json_raises_value_error(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array([data], 'instances'))
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.text = body.decode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size):
+        return chunked(self.body, chunk_size)
+
+
+def fake_client(body):
+    return SimpleNamespace(get=lambda path, **kwargs: FakeResponse(body))
+
+
+def test_fetch_instance_list_totals_running_instances():
+    body = json.dumps({'instances': [{'id': 1, 'dph_total': 0.5, 'num_gpus': 2, 'actual_status': 'running'},
+                                     {'id': 2, 'dph_total': 0.25, 'num_gpus': 1, 'actual_status': 'exited'}]}).encode()
+    ssh_info_list, total_dph, total_gpus = fetch_instance_list(fake_client(body), log_instances=False)
+    assert [ssh_info['instance_id'] for ssh_info in ssh_info_list] == [1, 2]
+    assert (total_dph, total_gpus) == (0.5, 2)
+
+
+def test_fetch_instance_list_reports_missing_instances_key(caplog):
+    assert fetch_instance_list(fake_client(b'{"success": false}'), log_instances=False) is None
+    assert "'instances' key not found" in caplog.text
+
+
+def test_fetch_instance_list_key_error_while_reading_an_instance_is_not_a_missing_key(caplog, monkeypatch):
+    def from_api(instance):
+        raise KeyError('gpu_name')
+    monkeypatch.setattr(api.InstanceRecord, 'from_api', from_api)
+    assert fetch_instance_list(fake_client(b'{"instances": [{"id": 1}]}'), log_instances=False) is None
+    assert "'instances' key not found" not in caplog.text
+    assert "An unexpected error occurred: 'gpu_name'" in caplog.text
+
+
+def retry_delay(retry_after, attempt=2):
+    client = VastClient('key', backoff_base=1.0, backoff_max=60, requests_per_second=0)
+    return client._retry_delay(attempt, SimpleNamespace(headers={'Retry-After': retry_after}))
+
+
+def test_retry_after_seconds_and_http_date():
+    assert retry_delay('7') == 7.0
+    assert retry_delay('3600') == 60
+    assert 20 < retry_delay(email.utils.formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_negative_retry_after_is_clamped_to_zero():
+    assert retry_delay('-5') == 0
+
+
+@pytest.mark.parametrize('retry_after', ['soon', 'Mon, 99 Foo 2024 99:99:99 GMT', '', 'nan', 'inf', '-inf'])
+def test_unparsable_retry_after_falls_back_to_backoff(retry_after):
+    assert 0 <= retry_delay(retry_after, attempt=2) <= 4.0
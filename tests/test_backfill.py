@@ -0,0 +1,36 @@
+import gzip
+
+import pytest
+
+from vastai_aggregator import backfill
+from vastai_aggregator.backfill import parse_log_file, timestamp_samples
+
+from .helpers import mining_sample, progress_line
+
+
+def test_timestamp_samples_keeps_one_per_resolution_and_the_last():
+    dated = timestamp_samples([mining_sample(t) for t in range(0, 200, 10)], mtime=10000, resolution=60)
+    assert [(ts, s.seconds + 60 * s.minutes) for ts, s in dated] == [(9810, 0), (9870, 60), (9930, 120), (9990, 180), (10000, 190)]
+
+
+def test_timestamp_samples_restarted_run_ends_where_the_next_begins():
+    samples = [mining_sample(100), mining_sample(160), mining_sample(20), mining_sample(50)]
+    assert [ts for ts, _ in timestamp_samples(samples, mtime=1000, resolution=0)] == [890, 950, 970, 1000]
+
+
+def test_timestamp_samples_empty():
+    assert timestamp_samples([], mtime=1000) == []
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_parse_log_file_in_small_chunks(tmp_path, monkeypatch, compressed):
+    monkeypatch.setattr(backfill, 'READ_CHUNK_BYTES', 37)
+    lines = '\r'.join(progress_line(t, t // 30) for t in range(0, 600, 15))
+    data = ('miner started\n' + lines + '\r' + progress_line(600, 20)[:40]).encode()
+    path = tmp_path / 'miner.log'
+    path.write_bytes(gzip.compress(data) if compressed else data)
+
+    rows, consumed = parse_log_file(str(path), compressed, mtime=5000, resolution=60)
+    assert consumed == data.rfind(b'\r') + 1
+    expected = timestamp_samples([mining_sample(t, t // 30) for t in range(0, 600, 15)], mtime=5000, resolution=60)
+    assert rows == [(ts, s.normal_blocks, s.hash_rate, s.runtime_hours, s.difficulty) for ts, s in expected]
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from vastai_aggregator.breaker import HostCircuitBreaker
+from vastai_aggregator.probe import EMPTY_PROBE, ProbeResult
+
+from .helpers import instance_record
+
+SAMPLE = (1, 0, 0, 0, 10, 0, 1000.0, 120000)
+HOST = instance_record(1)
+OK = ProbeResult(SAMPLE, None, None, None)
+
+
+def failed(kind):
+    return EMPTY_PROBE._replace(error=kind)
+
+
+def test_opens_after_threshold_then_half_open_then_closed():
+    breaker = HostCircuitBreaker(failure_threshold=2)
+    breaker.record(HOST, failed('timeout'), now=1000)
+    assert breaker.state(HOST) == 'closed'
+    breaker.record(HOST, failed('timeout'), now=1000)
+    assert breaker.state(HOST) == 'open'
+    assert not breaker.allow(HOST, now=1059)
+    assert breaker.allow(HOST, now=1060)
+    assert breaker.state(HOST) == 'half_open'
+    breaker.record(HOST, OK, now=1061)
+    assert breaker.state(HOST) == 'closed'
+    assert breaker.allow(HOST, now=1061)
+
+
+def test_failed_test_poll_reopens_with_doubled_delay():
+    breaker = HostCircuitBreaker(failure_threshold=2)
+    for _ in range(2):
+        breaker.record(HOST, failed('timeout'), now=1000)
+    assert breaker.allow(HOST, now=1060)
+    breaker.record(HOST, failed('timeout'), now=1060)
+    assert breaker.state(HOST) == 'open'
+    assert not breaker.allow(HOST, now=1060 + 119)
+    assert breaker.allow(HOST, now=1060 + 120)
+
+
+@pytest.mark.parametrize('kind, delay', [('auth', 600), ('missing_log', 300), ('parse', 120), ('timeout', 60),
+                                         ('connection_refused', 60), ('ssh_error', 60), ('unknown', 60)])
+def test_delay_depends_on_failure_kind(kind, delay):
+    breaker = HostCircuitBreaker(failure_threshold=1)
+    breaker.record(HOST, failed(kind), now=0)
+    assert not breaker.allow(HOST, now=delay - 1)
+    assert breaker.allow(HOST, now=delay)
+
+
+def test_delay_is_capped_at_max_delay():
+    breaker = HostCircuitBreaker(failure_threshold=1, max_delay=1000)
+    for _ in range(5):
+        breaker.record(HOST, failed('auth'), now=0)
+    assert breaker.allow(HOST, now=1000)
+
+
+def test_filter_splits_admitted_and_blocked():
+    other = instance_record(2, ssh_host='other')
+    breaker = HostCircuitBreaker(failure_threshold=1)
+    breaker.record(HOST, failed('timeout'), now=0)
+    assert breaker.filter([HOST, other], now=10) == ([other], [HOST])
+
+
+def test_state_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'breakers.json')
+    breaker = HostCircuitBreaker(path, failure_threshold=1)
+    breaker.record(HOST, OK, now=1000)
+    breaker.record(HOST, failed('auth'), now=2000)
+    breaker.save()
+    assert set(json.load(open(path))['hosts']) == {'host:22'}
+
+    reloaded = HostCircuitBreaker(path, failure_threshold=1)
+    assert reloaded.state(HOST) == 'open'
+    assert not reloaded.allow(HOST, now=2599)
+    assert reloaded.stale_probe(HOST, now=2000) == ProbeResult(SAMPLE, None, None, None, 'auth')
+
+
+def test_unreadable_state_file_is_ignored(tmp_path):
+    path = tmp_path / 'breakers.json'
+    path.write_text('{not json')
+    assert HostCircuitBreaker(str(path)).state(HOST) == 'closed'
+
+
+def test_stale_probe_keeps_the_failure_and_the_last_sample():
+    breaker = HostCircuitBreaker()
+    breaker.record(HOST, OK, now=1000)
+    stale = breaker.stale_probe(HOST, failed('timeout'), now=1100)
+    assert stale.sample == SAMPLE and stale.error == 'timeout' and stale.stale
+
+
+def test_stale_probe_of_a_host_that_never_succeeded():
+    breaker = HostCircuitBreaker()
+    stale = breaker.stale_probe(HOST, failed('auth'), now=0)
+    assert stale.sample[0] is None and stale.stale
+    assert breaker.stale_probe(instance_record(2, ssh_host='unknown')).error == 'ssh_error'
+
+
+def test_stale_probe_drops_samples_older_than_max_age():
+    breaker = HostCircuitBreaker(max_sample_age=3600)
+    breaker.record(HOST, OK, now=1000)
+    assert breaker.stale_probe(HOST, failed('timeout'), now=1000 + 3600).sample == SAMPLE
+    stale = breaker.stale_probe(HOST, failed('timeout'), now=1000 + 3601)
+    assert stale.sample[0] is None and stale.stale
+
+
+def test_local_config_errors_do_not_open_the_breaker():
+    breaker = HostCircuitBreaker(failure_threshold=1)
+    breaker.record(HOST, failed('config'), now=1000)
+    assert breaker.state(HOST) == 'closed'
+    assert breaker.allow(HOST, now=1000)
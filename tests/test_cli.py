@@ -0,0 +1,18 @@
+import pytest
+
+from vastai_aggregator.cli import main
+
+
+@pytest.mark.parametrize('argv, message', [
+    (['--watch', '0'], "--watch INTERVAL must be greater than 0"),
+    (['--watch', '-5'], "--watch INTERVAL must be greater than 0"),
+    (['--stream'], "--stream needs --watch"),
+    (['--inventory-interval', '30'], "--inventory-interval needs --watch"),
+    (['--watch', '60', '--inventory-interval', '0'], "--inventory-interval SECONDS must be greater than 0"),
+    (['--dashboard'], "--dashboard needs --watch"),
+])
+def test_invalid_watch_options_are_rejected(argv, message, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 2
+    assert message in capsys.readouterr().err
@@ -0,0 +1,95 @@
+import random
+import statistics
+
+import pytest
+
+from vastai_aggregator.fleet import FleetAggregator, RunningStats, account_summaries, aggregate_fleet
+from vastai_aggregator.logparse import MiningSample
+
+from .helpers import instance_record
+
+
+def stats_of(values):
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+def test_add_matches_statistics():
+    values = [812.5, 2345.67, 1999.0, 1200.25]
+    stats = stats_of(values)
+    assert stats.count == 4
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.std_dev == pytest.approx(statistics.stdev(values))
+
+
+def test_remove_matches_stats_of_remaining_values():
+    rng = random.Random(5)
+    values = [rng.uniform(500, 3000) for _ in range(50)]
+    stats = stats_of(values)
+    for value in values[::2]:
+        stats.remove(value)
+    remaining = values[1::2]
+    assert stats.count == len(remaining)
+    assert stats.mean == pytest.approx(statistics.mean(remaining))
+    assert stats.std_dev == pytest.approx(statistics.stdev(remaining))
+
+
+def test_remove_down_to_one_and_zero_values():
+    stats = stats_of([100.0, 300.0])
+    stats.remove(100.0)
+    assert (stats.count, stats.mean, stats.std_dev) == (1, pytest.approx(300.0), 0.0)
+    stats.remove(300.0)
+    assert (stats.count, stats.mean, stats.m2) == (0, 0.0, 0.0)
+
+
+def test_remove_never_makes_variance_negative():
+    stats = stats_of([1e9 + 0.1, 1e9 + 0.1, 1e9 + 0.1])
+    stats.remove(1e9 + 0.1)
+    assert stats.m2 >= 0.0
+    assert stats.std_dev == pytest.approx(0.0, abs=1e-3)
+
+
+def test_aggregate_fleet_totals_follow_updates():
+    instances = [instance_record(1, 1, 0.5), instance_record(2, 2, 1.0), instance_record(3, 1, 0.5)]
+    log_info = {1: MiningSample(2, 0, 0, 0, 10, 0, 1000.0, 120000), 2: MiningSample(1, 0, 0, 0, 4, 0, 3000.0, 130000)}
+    aggregator = FleetAggregator()
+    fleet = aggregate_fleet(instances, log_info, aggregator)
+    assert len(fleet['table_data']) == 2
+    assert fleet['total_hash_rate'] == pytest.approx(4000.0)
+    assert fleet['mean_difficulty'] == pytest.approx(125000)
+    assert fleet['sum_normal_block_per_hour'] == pytest.approx(5 + 4)
+    assert fleet['average_dollars_per_normal_block'] == pytest.approx((2 * 0.5 / 10 + 1 * 1.0 / 4) / 2)
+    assert fleet['gpu_stats']['RTX 4090']['mean'] == pytest.approx(1250.0)
+
+    log_info[2] = MiningSample(1, 30, 0, 0, 6, 0, 2000.0, 130000)
+    fleet = aggregate_fleet(instances, log_info, aggregator)
+    assert fleet['total_hash_rate'] == pytest.approx(3000.0)
+    assert fleet['gpu_stats']['RTX 4090']['mean'] == pytest.approx(1000.0)
+
+
+def test_stale_instances_are_shown_but_not_counted():
+    stale = instance_record(2, 2, 1.0, stale='timeout', account='work')
+    fresh = instance_record(1, 1, 0.5, account='work')
+    log_info = {1: MiningSample(2, 0, 0, 0, 10, 0, 1000.0, 120000), 2: MiningSample(1, 0, 0, 0, 4, 0, 3000.0, 130000)}
+    fleet = aggregate_fleet([fresh, stale], log_info)
+    assert sorted(row[0] for row in fleet['table_data']) == [1, 2]
+    assert fleet['total_hash_rate'] == pytest.approx(1000.0)
+    assert fleet['mean_difficulty'] == pytest.approx(120000)
+    assert fleet['sum_normal_block_per_hour'] == pytest.approx(5.0)
+    assert fleet['gpu_stats']['RTX 4090']['count'] == 1
+    summary = account_summaries(fleet['table_data'], [fresh, stale], ['work'])['work']
+    assert summary['total_hash_rate'] == pytest.approx(1000.0)
+    assert summary['gpu_stats']['RTX 4090']['count'] == 1
+
+
+def test_invalid_sort_column_is_logged_once(caplog, capsys):
+    aggregator = FleetAggregator(sort_column_index=99)
+    fleet = aggregate_fleet([instance_record(1), instance_record(2)], {1: MiningSample(2, 0, 0, 0, 10, 0, 1000.0, 120000),
+                                                                      2: MiningSample(1, 0, 0, 0, 4, 0, 3000.0, 130000)}, aggregator)
+    assert sorted(row[0] for row in fleet['table_data']) == [1, 2]
+    aggregator.table_data()
+    assert [record.getMessage() for record in caplog.records].count(
+        "Invalid sort_column_index: 99. Must be between 0 and {}.".format(len(fleet['table_data'][0]) - 1)) == 1
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,88 @@
+import pytest
+
+from vastai_aggregator import inventory as inventory_module
+from vastai_aggregator.inventory import InstanceInventory
+
+from .helpers import instance_record
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Replaces the instance list download; set .result to what the API returns (None on failure)."""
+    class FakeApi:
+        result = None
+        calls = 0
+
+        def fetch(self, client, log_instances=True):
+            self.calls += 1
+            if self.result is None:
+                return None
+            ssh_info_list = self.result
+            return ssh_info_list, sum(ssh_info['dph_total'] for ssh_info in ssh_info_list), sum(ssh_info['num_gpus'] for ssh_info in ssh_info_list)
+
+    fake = FakeApi()
+    monkeypatch.setattr(inventory_module, 'fetch_instance_list', fake.fetch)
+    return fake
+
+
+def test_refresh_only_downloads_after_ttl(api, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(inventory_module.time, 'time', lambda: now[0])
+    inventory = InstanceInventory(ttl=120)
+    api.result = [instance_record(1)]
+    assert inventory.refresh(None)[0] == api.result
+    now[0] += 60
+    api.result = [instance_record(2)]
+    ssh_info_list, total_dph, total_gpus = inventory.refresh(None)
+    assert [ssh_info['instance_id'] for ssh_info in ssh_info_list] == [1]
+    assert (total_dph, total_gpus, api.calls) == (0.5, 1, 1)
+    assert [ssh_info['instance_id'] for ssh_info in inventory.refresh(None, force=True)[0]] == [2]
+    now[0] += 121
+    inventory.refresh(None)
+    assert api.calls == 3
+
+
+def test_failed_refresh_falls_back_to_disk_cache(api, tmp_path):
+    path = str(tmp_path / 'inventory.json')
+    api.result = [instance_record(1, dph_total=0.25, num_gpus=2), instance_record(2, actual_status='exited')]
+    InstanceInventory(path).refresh(None)
+
+    api.result = None
+    inventory = InstanceInventory(path, ttl=0)
+    ssh_info_list, total_dph, total_gpus = inventory.refresh(None)
+    assert [dict(ssh_info) for ssh_info in ssh_info_list] == [dict(ssh_info) for ssh_info in [instance_record(1, dph_total=0.25, num_gpus=2), instance_record(2, actual_status='exited')]]
+    assert (total_dph, total_gpus) == (0.25, 2)
+    assert api.calls == 2
+
+
+def test_unreadable_disk_cache_is_ignored(api, tmp_path):
+    path = tmp_path / 'inventory.json'
+    path.write_text('{"instances": [')
+    inventory = InstanceInventory(str(path))
+    assert inventory.ssh_info_list == [] and inventory.fetched_at is None
+    assert inventory.refresh(None) == ([], 0, 0)
+
+
+def test_listeners_get_added_removed_and_changed_events(api):
+    inventory = InstanceInventory(ttl=0)
+    events = []
+    inventory.add_listener(lambda kind, old, new: events.append((kind, (old or {}).get('instance_id'), (new or {}).get('instance_id'))))
+    api.result = [instance_record(1), instance_record(2)]
+    inventory.refresh(None)
+    assert events == [('added', None, 1), ('added', None, 2)]
+
+    events.clear()
+    # Utilization updates are not connection changes
+    api.result = [instance_record(1, gpu_util=50.0), instance_record(2, ssh_port=2222), instance_record(3)]
+    inventory.refresh(None)
+    assert events == [('changed', 2, 2), ('added', None, 3)]
+
+    events.clear()
+    api.result = [instance_record(3)]
+    inventory.refresh(None)
+    assert sorted(events) == [('removed', 1, None), ('removed', 2, None)]
+
+    events.clear()
+    api.result = None
+    inventory.refresh(None)
+    assert events == []
@@ -0,0 +1,49 @@
+from vastai_aggregator.logparse import MiningSample, clean_ansi_codes, parse_log_buffer, parse_log_line, parse_log_lines
+
+# Progress lines as tqdm writes them to miner.log, colour codes included
+NORMAL_LINE = ("\x1b[32mMining\x1b[0m: 42 \x1b[32mBlocks\x1b[0m [1:02:03, 0.01 Blocks/s, "
+               "Details=\x1b[32msuper:1 normal:42\x1b[0m, HashRate:\x1b[32m2345.67\x1b[0m, Difficulty=120000]")
+XUNI_LINE = ("\x1b[32mMining\x1b[0m: 7 \x1b[32mBlocks\x1b[0m [1:05:00, 0.00 Blocks/s, "
+             "Details=\x1b[32mxuni:7\x1b[0m, HashRate:\x1b[32m1999.00\x1b[0m, Difficulty=150000]")
+NO_HOURS_LINE = ("\x1b[32mMining\x1b[0m: 3 \x1b[32mBlocks\x1b[0m [05:09, 0.01 Blocks/s, "
+                 "Details=\x1b[32mnormal:3\x1b[0m, HashRate:\x1b[32m812.50\x1b[0m, Difficulty=120000]")
+
+
+def test_clean_ansi_codes_str_and_bytes():
+    assert clean_ansi_codes("\x1b[32mMining\x1b[0m:") == "Mining:"
+    assert clean_ansi_codes(b"\x1b[1;31mHashRate\x1b[0m") == b"HashRate"
+
+
+def test_parse_normal_blocks_line():
+    assert parse_log_line(NORMAL_LINE) == MiningSample(1, 2, 3, 1, 42, 0, 2345.67, 120000)
+
+
+def test_parse_xuni_line():
+    sample = parse_log_line(XUNI_LINE)
+    assert sample == MiningSample(1, 5, 0, 0, 0, 7, 1999.0, 150000)
+
+
+def test_parse_line_without_hours():
+    sample = parse_log_line(NO_HOURS_LINE)
+    assert (sample.hours, sample.minutes, sample.seconds) == (0, 5, 9)
+    assert sample.runtime_hours == 5 / 60 + 9 / 3600
+
+
+def test_parse_bytes_line_matches_str_line():
+    assert parse_log_line(NORMAL_LINE.encode()) == parse_log_line(NORMAL_LINE)
+
+
+def test_parse_buffer_split_on_carriage_returns():
+    # tqdm rewrites the progress line in place, so one "line" of the file holds many updates
+    buffer = ("Starting miner\n" + NORMAL_LINE + "\r" + XUNI_LINE + "\r\n" + NO_HOURS_LINE + "\r").encode()
+    assert [sample.hash_rate for sample in parse_log_buffer(buffer)] == [2345.67, 1999.0, 812.5]
+
+
+def test_lines_without_difficulty_are_skipped():
+    lines = ["Mining: 42 Blocks [1:02:03, 0.01 Blocks/s, Details=normal:42, HashRate:2345.67]",
+             "GPU 0 found a block", "", b"\x1b[32mMining\x1b[0m: starting", NORMAL_LINE]
+    assert list(parse_log_lines(lines)) == [parse_log_line(NORMAL_LINE)]
+
+
+def test_unparsable_progress_line_returns_none():
+    assert parse_log_line("Mining: Difficulty=120000 but no progress") is None
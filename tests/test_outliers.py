@@ -0,0 +1,61 @@
+import pytest
+
+from vastai_aggregator.outliers import EwmaStats, OutlierDetector
+from vastai_aggregator.probe import EMPTY_PROBE
+
+from .helpers import instance_record, mining_sample
+
+
+def test_ewma_mean():
+    stats = EwmaStats(window=3)
+    for value in (100.0, 200.0, 200.0):
+        stats.add(value)
+    assert stats.mean == pytest.approx(100 + 50 + 25)
+
+
+def feed(detector, rates):
+    """Observe one poll of per-GPU rates {instance_id: rate} for 'RTX 4090' instances; returns the alerts."""
+    return [alert for instance_id, rate in rates.items() if (alert := detector.observe(instance_id, 'RTX 4090', rate))]
+
+
+def test_sustained_outlier_raises_one_alert():
+    detector = OutlierDetector(threshold=1, window=1, sustain=3)
+    rates = {1: 1000.0, 2: 1010.0, 3: 990.0, 4: 1005.0, 5: 600.0}
+    assert feed(detector, rates) == []
+    assert feed(detector, rates) == []
+    [alert] = feed(detector, rates)
+    assert alert[:3] == (5, 'RTX 4090', 600.0) and alert[3] < -1
+    assert feed(detector, rates) == []
+    assert [outlier[0] for outlier in detector.outliers()['RTX 4090']] == [5]
+
+
+def test_group_stats_follow_replaced_and_removed_instances():
+    detector = OutlierDetector(window=1)
+    feed(detector, {1: 1000.0, 2: 2000.0, 3: 3000.0})
+    feed(detector, {3: 1500.0})
+    stats = detector.group_stats()['RTX 4090']
+    assert (stats['count'], stats['mean']) == (3, pytest.approx(1500.0))
+    detector.remove(2)
+    detector.remove(2)
+    stats = detector.group_stats()['RTX 4090']
+    assert (stats['count'], stats['mean'], stats['std_dev']) == (2, pytest.approx(1250.0), pytest.approx(353.553, rel=1e-4))
+    detector.remove(1)
+    detector.remove(3)
+    assert detector.group_stats() == {}
+
+
+def test_observe_fleet_skips_stale_and_repeated_samples_and_forgets_gone_instances():
+    detector = OutlierDetector(window=1)
+    instances = [instance_record(1, num_gpus=2), instance_record(2), instance_record(3)]
+    log_info = {1: mining_sample(60, hash_rate=2000.0), 2: mining_sample(60, hash_rate=1100.0), 3: mining_sample(60, hash_rate=900.0)}
+    detector.observe_fleet(instances, log_info, probes={3: EMPTY_PROBE._replace(error='timeout')})
+    stats = detector.group_stats()['RTX 4090']
+    assert (stats['count'], stats['mean']) == (2, pytest.approx(1050.0))
+
+    # The same samples again are not observed twice
+    detector.observe_fleet(instances, log_info)
+    assert detector._instances[1]['stats'].count == 1
+
+    detector.observe_fleet(instances[1:], log_info)
+    assert detector.group_stats()['RTX 4090']['count'] == 2
+    assert set(detector._instances) == {2, 3}
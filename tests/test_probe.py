@@ -0,0 +1,45 @@
+from vastai_aggregator.probe import DiskUsage, GpuStatus, parse_probe_output
+
+GPU_SECTION = (b"@@gpu\n"
+               b"0, 98, 61, 310.52, 2520, 10501, 4012, 24564\n"
+               b"1, [N/A], 58, [Not Supported], 2505, 10501, 4010, 24564\n")
+DISK_LINE = b"@@disk /dev/md0 104857600 52428800 52428800 50% /root\n"
+
+
+def test_all_sections():
+    output = GPU_SECTION + b"@@miner 2\n" + DISK_LINE + b"@@log 1234 2048 1024\nMining: ...\r"
+    gpus, miner_processes, disk, log_header, log_data = parse_probe_output(output)
+    assert gpus == [GpuStatus(0, 98.0, 61.0, 310.52, 2520.0, 10501.0, 4012.0, 24564.0),
+                    GpuStatus(1, None, 58.0, None, 2505.0, 10501.0, 4010.0, 24564.0)]
+    assert miner_processes == 2
+    assert disk == DiskUsage(104857600 * 1024, 52428800 * 1024)
+    assert log_header == ['1234', '2048', '1024']
+    assert log_data == b"Mining: ...\r"
+
+
+def test_missing_log():
+    output = GPU_SECTION + b"@@miner 0\n" + DISK_LINE + b"@@log missing\n"
+    _, miner_processes, _, log_header, log_data = parse_probe_output(output)
+    assert miner_processes == 0
+    assert log_header is None and log_data == b''
+
+
+def test_nvidia_smi_unavailable_or_garbled():
+    gpus, *_ = parse_probe_output(b"@@gpu\nunavailable\n@@miner 1\n@@log missing\n")
+    assert gpus is None
+    garbled = b"@@gpu\nNVIDIA-SMI has failed because it couldn't communicate with the NVIDIA driver.\n0, 98, 61\n@@miner 1\n"
+    gpus, miner_processes, *_ = parse_probe_output(garbled)
+    assert gpus == [] and miner_processes == 1
+
+
+def test_missing_and_unreadable_sections():
+    assert parse_probe_output(b"") == (None, None, None, None, b'')
+    gpus, miner_processes, disk, log_header, _ = parse_probe_output(b"@@miner \n@@disk \n@@log\n")
+    assert (gpus, miner_processes, disk, log_header) == (None, None, None, None)
+
+
+def test_log_data_may_contain_section_markers():
+    output = b"@@gpu\nunavailable\n@@miner 1\n@@log 1 10 0\n@@miner 5\n@@disk x\n"
+    _, miner_processes, disk, log_header, log_data = parse_probe_output(output)
+    assert (miner_processes, disk, log_header) == (1, None, ['1', '10', '0'])
+    assert log_data == b"@@miner 5\n@@disk x\n"
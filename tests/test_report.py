@@ -0,0 +1,25 @@
+import pytest
+
+from vastai_aggregator.metrics import METRICS
+from vastai_aggregator.report import print_outliers, record_fleet_gauges
+
+
+def row(instance_id, num_gpus, gpu_hash_rate):
+    return [instance_id, 'RTX 4090', num_gpus, 99.0, 0.4, 0.4, gpu_hash_rate * num_gpus, gpu_hash_rate, 10, 1.0, 10.0,
+            2500.0, 0.04, '', 5.0, 10.0, '']
+
+
+def test_outliers_without_detector_use_per_gpu_hash_rate(capsys):
+    # An 8-GPU instance with a poor per-GPU hash rate still has the highest instance hash rate
+    table_data = [row(1, 8, 1000.0), row(2, 8, 1010.0), row(3, 1, 990.0), row(4, 1, 1005.0), row(5, 8, 600.0)]
+    gpu_stats = {'RTX 4090': {'mean': 921.0, 'std_dev': 180.0, 'count': 5}}
+    print_outliers(table_data, gpu_stats, set(), threshold=1)
+    output = capsys.readouterr().out
+    assert "Instance ID 5: 600.00H/s" in output
+    assert "Instance ID 3" not in output
+
+
+def test_runway_gauge_includes_the_fee():
+    fleet = {'total_hash_rate': 0.0, 'sum_normal_block_per_hour': 0.0, 'average_dollars_per_normal_block': None}
+    record_fleet_gauges(fleet, 2.0, 202.0)
+    assert METRICS._values['vastai_balance_runway_hours'][()] == pytest.approx(100.0, abs=1 / 60)
@@ -0,0 +1,90 @@
+import pytest
+
+from vastai_aggregator.metrics import classify_ssh_error
+from vastai_aggregator.probe import build_probe_command
+from vastai_aggregator.ssh import SSHConnectionPool, _consume_log, new_log_cursor, probe_instance, take_log_samples
+
+from .helpers import mining_sample, progress_line
+
+
+def test_missing_private_key_is_a_config_error(tmp_path):
+    pool = SSHConnectionPool('root', str(tmp_path / 'missing_key'))
+    probe = probe_instance(pool, 'host', 22)
+    assert probe.error == 'config'
+    assert classify_ssh_error(FileNotFoundError(2, 'No such file')) == 'config'
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_evict_idle_keeps_connections_of_scheduled_hosts(monkeypatch):
+    pool = SSHConnectionPool('root', 'key', idle_timeout=300, max_age=3600)
+    now = 10000.0
+    monkeypatch.setattr('vastai_aggregator.ssh.time.monotonic', lambda: now)
+    for host, created in (('stable', 9000.0), ('gone', 9000.0), ('old', 5000.0)):
+        pool._connections[(host, 22)] = {'transport': FakeTransport(), 'created': created, 'last_used': 9500.0}
+    pool.evict_idle(keep={('stable', 22), ('old', 22)})
+    assert sorted(pool._connections) == [('stable', 22)]
+
+
+def log_bytes(*lines, end='\r'):
+    return ''.join(line + end for line in lines).encode()
+
+
+def test_cursor_consumes_complete_lines_and_resumes_at_the_offset():
+    cursor = new_log_cursor()
+    data = log_bytes(progress_line(60, 1), progress_line(120, 2))
+    assert _consume_log(cursor, ('77', str(len(data)), '0'), data, 4096) == mining_sample(120, 2)
+    assert (cursor['inode'], cursor['offset']) == ('77', len(data))
+    assert take_log_samples(cursor) == [mining_sample(60, 1), mining_sample(120, 2)]
+    assert take_log_samples(cursor) == []
+
+    command = build_probe_command(cursor, '/root/miner.log', 65536, 4096)
+    assert f"[ \"$1\" = '77' ] && [ \"$2\" -ge {len(data)} ]; then start={len(data)}" in command
+
+    more = log_bytes(progress_line(180, 3))
+    assert _consume_log(cursor, ('77', str(len(data) + len(more)), str(len(data))), more, 4096) == mining_sample(180, 3)
+    assert cursor['offset'] == len(data) + len(more)
+    assert take_log_samples(cursor) == [mining_sample(180, 3)]
+
+
+def test_partial_trailing_line_is_read_but_not_consumed():
+    cursor = new_log_cursor()
+    complete = log_bytes(progress_line(60, 1))
+    partial = progress_line(90, 1).encode()
+    assert _consume_log(cursor, ('77', '0', '0'), complete + partial, 4096) == mining_sample(90, 1)
+    assert cursor['offset'] == len(complete)
+    assert take_log_samples(cursor) == [mining_sample(60, 1)]
+
+    # The next poll reads the line again from the offset, now terminated
+    rest = partial + b'\r'
+    assert _consume_log(cursor, ('77', '0', str(len(complete))), rest, 4096) == mining_sample(90, 1)
+    assert take_log_samples(cursor) == [mining_sample(90, 1)]
+
+
+@pytest.mark.parametrize('header', [('78', '500', '0'), ('77', '10', '0')], ids=['rotated', 'truncated'])
+def test_rotated_or_truncated_log_starts_over(header):
+    cursor = new_log_cursor()
+    data = log_bytes(progress_line(600, 9))
+    _consume_log(cursor, ('77', str(len(data)), '0'), data, 4096)
+    cursor['offset'] = 1000
+
+    # Nothing parsable in the new log yet: the old reading must not be reported
+    assert _consume_log(cursor, header, b'starting miner\n', 4096) is None
+    assert cursor['latest'] is None
+    assert (cursor['inode'], cursor['offset']) == (header[0], len(b'starting miner\n'))
+
+    new = log_bytes(progress_line(5, 0))
+    assert _consume_log(cursor, (header[0], '0', str(cursor['offset'])), new, 4096) == mining_sample(5, 0)
+
+
+def test_oversized_line_without_terminator_is_skipped():
+    cursor = new_log_cursor()
+    data = b'x' * 64
+    _consume_log(cursor, ('77', '64', '0'), data, 64)
+    assert cursor['offset'] == 64
@@ -0,0 +1,24 @@
+from vastai_aggregator.storage import build_samples, date_log_samples
+
+from .helpers import instance_record, mining_sample
+
+
+def test_date_log_samples_from_latest_reading():
+    samples = [mining_sample(100), mining_sample(160), mining_sample(20), mining_sample(50)]
+    assert [ts for ts, _ in date_log_samples(samples, mining_sample(70), 1000)] == [870, 930, 950, 980]
+
+
+def test_date_log_samples_without_latest_reading():
+    assert [ts for ts, _ in date_log_samples([mining_sample(100), mining_sample(130)], None, 1000)] == [970, 1000]
+
+
+def test_build_samples_with_log_samples():
+    records = build_samples([instance_record(1), instance_record(2, ssh_port=23)],
+                            {1: mining_sample(130, 2), 2: mining_sample(10)}, timestamp=1000,
+                            log_samples={1: [mining_sample(100, 1), mining_sample(130, 2)]})
+    assert [(r.ts, r.instance_id, r.normal_blocks, r.disk_util) for r in records] == [(970, 1, 1, 10.0), (1000, 1, 2, 10.0)]
+
+
+def test_build_samples_latest_reading_per_instance():
+    [record] = build_samples([instance_record(1, disk_util='N/A', disk_space='N/A')], {}, timestamp=1000)
+    assert (record.ts, record.hash_rate, record.runtime, record.disk_util) == (1000, None, None, None)
@@ -0,0 +1,171 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from vastai_aggregator.stream import StreamingCollector, StreamRecord
+
+from .helpers import instance_record, mining_sample, progress_line
+
+
+class FakePool:
+    """Hands out one end of a socketpair per opened channel; the test writes the log to the other end."""
+
+    def __init__(self):
+        self.commands = []
+        self.remotes = []
+        self.opened = threading.Event()
+
+    def load_key(self, ssh_host=None, ssh_port=None):
+        return None
+
+    def open_channel(self, ssh_host, ssh_port, command, timeout=None):
+        channel, remote = socket.socketpair()
+        self.commands.append((ssh_port, command))
+        self.remotes.append((ssh_port, remote))
+        self.opened.set()
+        return channel
+
+    def remote(self, ssh_port):
+        """The remote end of the newest channel of a host."""
+        wait_for(lambda: any(port == ssh_port for port, _ in self.remotes))
+        return [remote for port, remote in self.remotes if port == ssh_port][-1]
+
+    def close(self):
+        for _, remote in self.remotes:
+            remote.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def collect(collector, instance_id, predicate, drained=None):
+    """Drain until a record of 'instance_id' satisfies 'predicate'; returns its records seen so far.
+
+    Records of other instances are kept in 'drained' ({instance_id: [StreamRecord]}) for later calls.
+    """
+    drained = {} if drained is None else drained
+
+    def check():
+        for record in collector.drain().values():
+            drained.setdefault(record.instance_id, []).append(record)
+        return any(predicate(record) for record in drained.get(instance_id, ()))
+    wait_for(check)
+    return drained.pop(instance_id)
+
+
+@pytest.fixture
+def pool():
+    pool = FakePool()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def collector(pool):
+    collector = StreamingCollector(pool, max_workers=2, retry_base=0.01, retry_max=0.05)
+    yield collector
+    collector.stop()
+
+
+def test_drain_merges_records_of_an_instance(collector):
+    first, second, third = mining_sample(60, 1), mining_sample(120, 2), mining_sample(180, 3)
+    collector.records.put(StreamRecord(1, [first], first))
+    collector.records.put(StreamRecord(2, [], None))
+    collector.records.put(StreamRecord(1, [second, third], third))
+    assert collector.drain() == {1: StreamRecord(1, [first, second, third], third), 2: StreamRecord(2, [], None)}
+    assert collector.drain() == {}
+
+
+def test_selector_reads_every_channel(pool, collector):
+    collector.set_instances([instance_record(1, ssh_port=1001), instance_record(2, ssh_port=1002)])
+    collector.start()
+    for port, blocks in ((1001, 1), (1002, 2)):
+        pool.remote(port).sendall(f"42 0 0\n{progress_line(60, blocks)}\n{progress_line(120, blocks)}\r".encode())
+    drained = {}
+    for instance_id, blocks in ((1, 1), (2, 2)):
+        records = collect(collector, instance_id, lambda record: record.latest == mining_sample(120, blocks), drained)
+        assert [sample for record in records for sample in record.samples] == [mining_sample(60, blocks), mining_sample(120, blocks)]
+        assert records[-1].latest == mining_sample(120, blocks)
+        assert collector.log_cursors[instance_id]['inode'] == '42'
+
+    # A trailing progress line without a line ending is the freshest reading but is not consumed yet
+    pool.remote(1001).sendall(progress_line(180, 1).encode())
+    record = collect(collector, 1, lambda record: record.latest == mining_sample(180, 1))[-1]
+    assert record.samples == []
+    assert collector.log_cursors[1]['offset'] == len(f"{progress_line(60, 1)}\n{progress_line(120, 1)}\r")
+
+
+def test_closed_channel_is_reported_and_reopened_at_the_cursor(pool, collector):
+    collector.set_instances([instance_record(1, ssh_port=1001)])
+    collector.start()
+    data = f"42 0 0\n{progress_line(60, 1)}\n".encode()
+    pool.remote(1001).sendall(data)
+    collect(collector, 1, lambda record: record.samples)
+
+    pool.opened.clear()
+    pool.remote(1001).close()
+    # The instance has no reading until the stream is back
+    collect(collector, 1, lambda record: record.latest is None)
+    wait_for(pool.opened.is_set)
+    offset = len(data) - len(b"42 0 0\n")
+    assert f"start={offset}" in pool.commands[-1][1] and "= '42'" in pool.commands[-1][1]
+
+    pool.remote(1001).sendall(f"42 {offset} {offset}\n{progress_line(120, 2)}\n".encode())
+    records = collect(collector, 1, lambda record: record.samples)
+    assert records[-1].samples == [mining_sample(120, 2)]
+    assert collector.log_cursors[1]['offset'] == offset + len(progress_line(120, 2)) + 1
+
+
+def test_missing_log_closes_before_the_header(pool, collector):
+    collector.set_instances([instance_record(1, ssh_port=1001)])
+    collector.start()
+    pool.remote(1001).close()
+    assert collect(collector, 1, lambda record: True)[-1] == StreamRecord(1, [], None)
+    # Resubscribed with backoff
+    wait_for(lambda: len(pool.commands) >= 2)
+
+
+def test_removed_instance_channel_is_closed(pool, collector):
+    collector.set_instances([instance_record(1, ssh_port=1001)])
+    collector.start()
+    remote = pool.remote(1001)
+    wait_for(lambda: collector._streams[1]['channel'] is not None)
+    collector.set_instances([])
+    remote.settimeout(5)
+    assert remote.recv(1) == b''
+
+
+def test_full_queue_blocks_reading_until_drained_and_drops_on_stop(pool):
+    collector = StreamingCollector(pool, max_pending=1, max_workers=1)
+    collector.set_instances([instance_record(1, ssh_port=1001)])
+    collector.start()
+    remote = pool.remote(1001)
+    remote.sendall(f"42 0 0\n{progress_line(60, 1)}\n".encode())
+    wait_for(collector.records.full)
+    remote.sendall(f"{progress_line(120, 2)}\n".encode())
+    time.sleep(0.1)
+    remote.sendall(f"{progress_line(180, 3)}\n".encode())
+    # The selector thread waits on the queue instead of reading on
+    time.sleep(0.2)
+    assert collector.records.qsize() == 1
+    assert collector.drain()[1].samples == [mining_sample(60, 1)]
+    samples = []
+    wait_for(lambda: samples.extend(sample for record in collector.drain().values() for sample in record.samples) or len(samples) >= 2)
+    assert samples == [mining_sample(120, 2), mining_sample(180, 3)]
+
+    # A record that is still waiting for space when the collector stops is dropped
+    collector.records.put(StreamRecord(2, [], None))
+    pusher = threading.Thread(target=collector._push, args=(StreamRecord(3, [], None),))
+    pusher.start()
+    time.sleep(0.1)
+    assert pusher.is_alive()
+    collector.stop()
+    pusher.join(timeout=5)
+    assert not pusher.is_alive()
+    assert list(collector.drain()) == [2]
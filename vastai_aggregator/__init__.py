@@ -0,0 +1,74 @@
+"""Aggregate XENGPUMiner performance across Vast.ai instances.
+
+The collectors and aggregators can be embedded in other programs:
+
+    from vastai_aggregator import Config, VastClient, SSHConnectionPool, collect_log_info, aggregate_fleet
+
+Submodules are imported on first attribute access, so importing the package is cheap and
+e.g. NumPy and paramiko are only loaded by code that needs them.
+"""
+import importlib
+
+from .config import Config  # noqa: F401
+
+_EXPORTS = {
+    'main': 'cli',
+    'run_once': 'cli',
+    'run_watch': 'cli',
+    'run_balance_only': 'cli',
+    'METRICS': 'metrics',
+    'MetricsRegistry': 'metrics',
+    'start_metrics_server': 'metrics',
+    'VastClient': 'api',
+    'create_vast_client': 'api',
+    'load_api_key': 'api',
+    'fetch_instance_list': 'api',
+    'instance_list': 'api',
+    'InstanceInventory': 'inventory',
+    'Account': 'accounts',
+    'fetch_accounts': 'accounts',
+    'get_vastai_balance': 'balance',
+    'fetch_instances_and_balance': 'balance',
+    'balance_summary': 'balance',
+    'MiningSample': 'logparse',
+    'parse_log_line': 'logparse',
+    'parse_log_lines': 'logparse',
+    'parse_log_buffer': 'logparse',
+    'SSHConnectionPool': 'ssh',
+    'get_log_info': 'ssh',
+    'collect_log_info': 'ssh',
+    'probe_instance': 'ssh',
+    'collect_probes': 'ssh',
+    'AdaptivePollScheduler': 'adaptive',
+    'StreamingCollector': 'stream',
+    'HostCircuitBreaker': 'breaker',
+    'ProbeResult': 'probe',
+    'GpuStatus': 'probe',
+    'MetricsStore': 'storage',
+    'build_samples': 'storage',
+    'InstanceRecord': 'records',
+    'SampleRecord': 'records',
+    'backfill_logs': 'backfill',
+    'FleetAggregator': 'fleet',
+    'aggregate_fleet': 'fleet',
+    'OutlierDetector': 'outliers',
+    'LiveDashboard': 'dashboard',
+    'render_report': 'report',
+    'print_table': 'report',
+    'print_outliers': 'report',
+}
+
+__all__ = ['Config'] + sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
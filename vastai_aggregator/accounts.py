@@ -0,0 +1,70 @@
+"""Several Vast.ai accounts fetched concurrently and merged into one fleet."""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .balance import fetch_instances_and_balance
+
+logger = logging.getLogger(__name__)
+
+
+class Account:
+    """One Vast.ai account: its API client, its instance inventory and optionally its own SSH key."""
+
+    def __init__(self, name, client, inventory=None, private_key_path=None, passphrase=None):
+        self.name = name
+        self.client = client
+        self.inventory = inventory
+        self.private_key_path = private_key_path
+        self.passphrase = passphrase
+
+    def close(self):
+        self.client.close()
+
+
+def account_path(path, name):
+    """Per-account variant of a file path, e.g. inventory_cache_work.json; unchanged for the unnamed account."""
+    if not path or not name:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+
+def fetch_accounts(accounts, include_balance=True):
+    """Fetch the instances and balances of all accounts concurrently and merge them into one fleet.
+
+    Every ssh_info gets an 'account' field with the account's name. Returns (ssh_info_list,
+    total_dph_running_machines, total_gpus_running, balance, balances) where 'balance' is the sum
+    of the balances that could be fetched (None if none could) and 'balances' maps account name to
+    its balance.
+    """
+    def fetch(account):
+        return fetch_instances_and_balance(account.client, include_balance, account.inventory)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(accounts))) as executor:
+        results = list(executor.map(fetch, accounts))
+
+    merged_ssh_info_list = []
+    total_dph_running_machines = 0
+    total_gpus_running = 0
+    balances = {}
+    for account, (ssh_info_list, account_dph, account_gpus, account_balance) in zip(accounts, results):
+        for ssh_info in ssh_info_list:
+            ssh_info = ssh_info.copy()
+            ssh_info['account'] = account.name
+            merged_ssh_info_list.append(ssh_info)
+        total_dph_running_machines += account_dph
+        total_gpus_running += account_gpus
+        balances[account.name] = account_balance
+    known_balances = [balance for balance in balances.values() if balance is not None]
+    balance = sum(known_balances) if known_balances else None
+    return merged_ssh_info_list, total_dph_running_machines, total_gpus_running, balance, balances
+
+
+def assign_account_keys(accounts, ssh_pool, ssh_info_list):
+    """Make the shared SSH pool use each account's own key for that account's instances."""
+    keys = {account.name: (account.private_key_path, account.passphrase) for account in accounts if account.private_key_path}
+    for ssh_info in ssh_info_list:
+        credentials = keys.get(ssh_info.get('account'))
+        if credentials is not None:
+            ssh_pool.assign_key(ssh_info['ssh_host'], ssh_info['ssh_port'], *credentials)
@@ -0,0 +1,88 @@
+"""Per-instance poll intervals that follow each instance's status, stability and failures."""
+import statistics
+import time
+from collections import deque
+
+
+def is_running(ssh_info):
+    return str(ssh_info.get('actual_status')).lower() == 'running'
+
+
+def running_instances(ssh_info_list):
+    """The instances worth connecting to; stopped, loading and exited ones have no miner to read."""
+    return [ssh_info for ssh_info in ssh_info_list if is_running(ssh_info)]
+
+
+class AdaptivePollScheduler:
+    """Decides which instances are due for a poll, each on its own interval.
+
+    Instances that are not running are never due; they are polled right away once the inventory
+    shows them running again. Newly seen, volatile or degraded instances (hash rate or GPU
+    utilization swinging by more than 'volatility' relative to their mean, or GPU utilization
+    below 'low_gpu_util') are polled every 'min_interval', and each stable poll doubles the
+    interval up to 'max_interval'. Failed polls back off the same way, so that an unreachable
+    host does not cost a connect timeout every cycle.
+    """
+
+    def __init__(self, min_interval, max_interval=300, history_size=5, volatility=0.05, low_gpu_util=85):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.history_size = history_size
+        self.volatility = volatility
+        self.low_gpu_util = low_gpu_util
+        self._states = {}  # instance_id -> {'next_poll', 'interval', 'failures', 'hash_rates', 'gpu_utils'}
+
+    def due(self, ssh_info_list, now=None):
+        """The running instances whose interval has elapsed at 'now' (time.monotonic())."""
+        now = time.monotonic() if now is None else now
+        listed = set()
+        due = []
+        for ssh_info in ssh_info_list:
+            instance_id = ssh_info['instance_id']
+            if not is_running(ssh_info):
+                continue
+            listed.add(instance_id)
+            state = self._states.get(instance_id)
+            # Polls are driven by a tick of min_interval; tolerate the tick arriving a little early
+            if state is None or state['next_poll'] <= now + self.min_interval / 2:
+                due.append(ssh_info)
+        # Forget instances that stopped or disappeared, so that they start over as new
+        for instance_id in list(self._states):
+            if instance_id not in listed:
+                del self._states[instance_id]
+        return due
+
+    def _is_volatile(self, values):
+        if len(values) < 2:
+            return False
+        mean = statistics.fmean(values)
+        return mean > 0 and statistics.pstdev(values) / mean > self.volatility
+
+    def record(self, ssh_info, probe, now=None):
+        """Set the next poll time of an instance from the ProbeResult of the poll that started at 'now'."""
+        now = time.monotonic() if now is None else now
+        state = self._states.setdefault(ssh_info['instance_id'], {
+            'next_poll': now,
+            'interval': self.min_interval,
+            'failures': 0,
+            'hash_rates': deque(maxlen=self.history_size),
+            'gpu_utils': deque(maxlen=self.history_size),
+        })
+        hash_rate = probe.sample[6]
+        if probe.error is not None or hash_rate is None:
+            state['failures'] += 1
+            state['interval'] = min(self.max_interval, self.min_interval * 2 ** state['failures'])
+        else:
+            state['failures'] = 0
+            state['hash_rates'].append(hash_rate)
+            gpu_util = probe.gpu_utilization if probe.gpu_utilization is not None else ssh_info.get('gpu_util')
+            if isinstance(gpu_util, (int, float)):
+                state['gpu_utils'].append(gpu_util)
+            degraded = bool(state['gpu_utils']) and state['gpu_utils'][-1] < self.low_gpu_util
+            settling = len(state['hash_rates']) < self.history_size
+            if settling or degraded or self._is_volatile(state['hash_rates']) or self._is_volatile(state['gpu_utils']):
+                state['interval'] = self.min_interval
+            else:
+                state['interval'] = min(self.max_interval, state['interval'] * 2)
+        state['next_poll'] = now + state['interval']
+        return state['interval']
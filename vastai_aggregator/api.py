@@ -0,0 +1,295 @@
+"""Vast.ai REST API client and the instance list."""
+import codecs
+import datetime
+import email.utils
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+
+import requests
+
+from .metrics import METRICS
+from .records import InstanceRecord
+
+logger = logging.getLogger(__name__)
+
+
+def load_api_key(path):
+    """Load the API key; raises OSError if the file cannot be read."""
+    with open(path, 'r') as file:
+        return file.read().strip()
+
+
+class VastClient:
+    """Vast.ai API client on a pooled keep-alive session with rate limiting and retries.
+
+    Requests are spaced out to at most 'requests_per_second'. Responses with status 429 or 5xx
+    and connection errors are retried with jittered exponential backoff, honoring Retry-After.
+    """
+
+    BASE_URL = 'https://console.vast.ai/api/v0'
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, api_key, base_url=None, max_retries=5, backoff_base=1.0, backoff_max=60,
+                 requests_per_second=2, timeout=30, pool_size=10):
+        self.api_key = api_key
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_interval = 1.0 / requests_per_second if requests_per_second else 0
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json'})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    retry_at = email.utils.parsedate_to_datetime(retry_after)
+                except (TypeError, ValueError):
+                    # Neither seconds nor an HTTP date, e.g. "soon"
+                    retry_at = None
+                delay = (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds() if retry_at is not None else None
+            # nan and inf would make time.sleep() fail
+            if delay is not None and math.isfinite(delay):
+                return min(max(delay, 0), self.backoff_max)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, path, params=None, authenticated=True, stream=False):
+        """GET a path below the API base URL, retrying as described above.
+
+        Returns the last response (which may still be an error status once retries run out);
+        raises requests.exceptions.RequestException if the request never got a response.
+        With stream, the body is left to be read (and the response closed) by the caller.
+        """
+        endpoint = '/' + path.strip('/')
+        with METRICS.time('vastai_api_request_seconds', endpoint=endpoint):
+            response = self._get_with_retries(path, params, authenticated, stream)
+        if response.status_code == 429:
+            METRICS.inc('vastai_failures_total', kind='rate_limited')
+        elif response.status_code >= 400:
+            METRICS.inc('vastai_failures_total', kind='api_error')
+        return response
+
+    def _get_with_retries(self, path, params, authenticated, stream=False):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = dict(params or {})
+        if authenticated:
+            params['api_key'] = self.api_key
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    METRICS.inc('vastai_failures_total', kind='api_error')
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning("API request to /%s failed (%s), retrying in %.1f seconds...", path.lstrip('/'), e.__class__.__name__, delay)
+                time.sleep(delay)
+                continue
+            if response.status_code not in self.RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+            delay = self._retry_delay(attempt, response)
+            response.close()
+            if response.status_code == 429:
+                METRICS.inc('vastai_api_rate_limited_retries_total')
+                logger.error("Too many requests, retrying in %.1f seconds...", delay)
+            else:
+                logger.warning("API returned status %s for /%s, retrying in %.1f seconds...", response.status_code, path.lstrip('/'), delay)
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+def create_vast_client(api_key, config):
+    """VastClient using the API settings of a Config."""
+    return VastClient(api_key, max_retries=config.api_max_retries, backoff_base=config.api_backoff_base,
+                      backoff_max=config.api_backoff_max, requests_per_second=config.api_requests_per_second,
+                      timeout=config.api_timeout)
+
+
+def test_api_connection(client):
+    """Function to test the API connection."""
+    try:
+        response = client.get('/', authenticated=False)
+        if response.status_code == 200:
+            logger.info("Connection with API established and working fine.")
+        else:
+            logger.error(f"Error connecting to API. Status code: {response.status_code}. Response: {response.text}")
+    except Exception as e:
+        logger.error(f"Error connecting to API: {e}")
+
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+class MissingJsonKeyError(KeyError):
+    """Raised by iter_json_array() when the JSON object has no such top-level key."""
+
+
+def iter_json_array(chunks, key):
+    """Yield the items of the array under a top-level key of a JSON object, parsing byte chunks as they arrive.
+
+    Only the item being decoded is held in memory, not the whole document. Other top-level
+    values are decoded and dropped. Raises MissingJsonKeyError (a KeyError) if the object has
+    no such key and ValueError if the document is not valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer, pos = '', 0
+
+    def fill():
+        # Append the next chunk to what is left of the buffer; False at the end of the document
+        nonlocal buffer, pos
+        for chunk in chunks:
+            text = text_decoder.decode(chunk)
+            if text:
+                buffer, pos = buffer[pos:] + text, 0
+                return True
+        return False
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE_RE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    def expect(chars):
+        nonlocal pos
+        char = peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON document, got {char or 'end of document'!r}")
+        pos += 1
+        return char
+
+    def decode_value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A number at the end of what has arrived may continue in the next chunk
+            if (end == len(buffer) or isinstance(value, (int, float)) and buffer[end] in '0123456789.eE+-') and fill():
+                continue
+            pos = end
+            return value
+
+    expect('{')
+    if peek() == '}':
+        raise MissingJsonKeyError(key)
+    while True:
+        name = decode_value()
+        expect(':')
+        if name == key:
+            expect('[')
+            if peek() == ']':
+                return
+            while True:
+                yield decode_value()
+                if expect(',]') == ']':
+                    return
+        decode_value()
+        if expect(',}') == '}':
+            raise MissingJsonKeyError(key)
+
+
+def instance_list(client, log_instances=True):
+    """Function to list instances and get SSH information."""
+    return fetch_instance_list(client, log_instances) or ([], 0, 0)
+
+
+def fetch_instance_list(client, log_instances=True):
+    """Like instance_list(), but returns None instead of an empty list when the request failed.
+
+    The response is parsed while it is downloaded and every instance is reduced to an
+    InstanceRecord right away, so memory does not grow with the size of the API's instance
+    objects. With log_instances False the instances are not logged one by one.
+    """
+    ssh_info_list = []
+    total_dph_running_machines = 0  # Initialized at the start
+    total_gpus_running = 0  # Counter for total GPUs of running instances
+
+    try:
+        response = client.get('/instances/', stream=True)
+        with response:
+            if response.status_code == 200:
+                if log_instances:
+                    logger.info("Your Instances:")
+
+                for instance in iter_json_array(response.iter_content(65536), 'instances'):
+                    ssh_info = InstanceRecord.from_api(instance)
+                    if str(ssh_info.actual_status).lower() == 'running':
+                        total_dph_running_machines += float(ssh_info.dph_total)
+                        total_gpus_running += int(ssh_info.num_gpus)
+
+                    if log_instances:
+                        logger.info("Instance ID: %s", ssh_info.instance_id)
+                        logger.info("GPU Name: %s", ssh_info.gpu_name)
+                        logger.info("Dollars Per Hour (DPH): %s", ssh_info.dph_total)
+                        logger.info("SSH Command: ssh -p %s root@%s -L 8080:localhost:8080", ssh_info.ssh_port, ssh_info.ssh_host)
+                        logger.info("Number of GPUs: %s", ssh_info.num_gpus)
+                        logger.info("Current state: %s", ssh_info.actual_status)
+                        logger.info("-" * 30)
+
+                    ssh_info_list.append(ssh_info)
+
+            elif response.status_code == 429:
+                # The client already retried with backoff
+                logger.error("Maximum retries reached. Please try again later.")
+                return None
+
+            elif response.status_code == 401:
+                # Handle Unauthorized error
+                logger.error("Failed to retrieve instances. Status code: 401. Response: %s", response.text)
+                logger.error("This action requires a valid login. Please make sure that api_key.txt contains the correct API key and that the key is the only thing the file contains.")
+                return None
+
+            else:
+                logger.error("Failed to retrieve instances. Status code: %s. Response: %s", response.status_code, response.text)
+                return None
+
+    except MissingJsonKeyError:
+        logger.error("'instances' key not found in response. Please check the API documentation for the correct structure.")
+        return None
+
+    except requests.exceptions.RequestException as e:
+        logger.error("A requests exception occurred: %s", str(e))
+        return None
+
+    except Exception as e:
+        logger.error("An unexpected error occurred: %s", str(e))
+        return None
+
+    return ssh_info_list, total_dph_running_machines, total_gpus_running
@@ -0,0 +1,227 @@
+"""Historical backfill of whole miner logs into the metrics store."""
+import gzip
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .logparse import parse_log_buffer
+from .metrics import METRICS, classify_ssh_error
+from .records import SampleRecord
+from .ssh import DEFAULT_LOG_PATH
+
+logger = logging.getLogger(__name__)
+
+# Exit status of the backfill command when the log does not exist
+MISSING_LOG_STATUS = 3
+
+READ_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def build_backfill_command(log_path, inode=None, offset=0):
+    """Shell command printing "<inode> <size> <mtime> <start> <gz|raw>" and then the log from <start>.
+
+    The log is gzip-compressed on the host when gzip is available. A re-run continues at 'offset'
+    while the inode is unchanged and the file has not shrunk, and starts over after a rotation.
+    Only the bytes up to the size printed in the header are sent, so that the header matches the data.
+    """
+    inode = inode if inode is not None else -1
+    return (f"f='{log_path}'; set -- $(stat -c '%i %s %Y' \"$f\" 2>/dev/null); "
+            f"[ $# -eq 3 ] || exit {MISSING_LOG_STATUS}; "
+            f"if [ \"$1\" = '{inode}' ] && [ \"$2\" -ge {offset} ]; then start={offset}; else start=0; fi; "
+            f"if command -v gzip >/dev/null 2>&1; then echo \"$1 $2 $3 $start gz\"; "
+            f"tail -c +$((start + 1)) \"$f\" | head -c $(($2 - start)) | gzip -1 -c; "
+            f"else echo \"$1 $2 $3 $start raw\"; tail -c +$((start + 1)) \"$f\" | head -c $(($2 - start)); fi")
+
+
+def download_log(pool, ssh_host, ssh_port, command, path, timeout=None):
+    """Run the backfill command and write the log data it sends to 'path'.
+
+    Returns the header (inode, size, mtime, start, compressed) and the number of bytes received,
+    or None if the log does not exist. 'timeout' applies to every read, not the whole transfer.
+    """
+    pool.load_key(ssh_host, ssh_port)
+    channel = pool.open_channel(ssh_host, ssh_port, command, timeout)
+    try:
+        buffer, header, received = b'', None, 0
+        with open(path, 'wb') as f:
+            while True:
+                data = channel.recv(1048576)
+                if not data:
+                    break
+                if header is None:
+                    buffer += data
+                    if b'\n' not in buffer:
+                        continue
+                    line, data = buffer.split(b'\n', 1)
+                    header = line.split()
+                f.write(data)
+                received += len(data)
+        status = channel.recv_exit_status()
+    finally:
+        channel.close()
+    if status == MISSING_LOG_STATUS:
+        return None
+    if header is None and status:
+        raise ValueError(f"Backfill command failed with exit status {status}")
+    if header is None or len(header) != 5:
+        raise ValueError(f"Malformed backfill header: {buffer[:200]!r}")
+    inode, size, mtime, start, mode = header
+    return (inode.decode(), int(size), float(mtime), int(start), mode == b'gz'), received
+
+
+def _runtime_seconds(sample):
+    return sample.hours * 3600 + sample.minutes * 60 + sample.seconds
+
+
+class _SampleThinner:
+    """Keeps one sample per 'resolution' seconds of miner runtime as samples are fed in log order.
+
+    Only the kept samples are held, so a log can be thinned chunk by chunk. A runtime that goes
+    down starts a new miner run; the last sample of a run is always kept.
+    """
+
+    def __init__(self, resolution=60):
+        self.resolution = resolution
+        self.runs = []         # [[(runtime_seconds, sample), ...] per miner run]
+        self.previous = None   # (runtime_seconds, sample, kept) of the last sample seen
+
+    def add(self, samples):
+        runs, previous = self.runs, self.previous
+        for sample in samples:
+            runtime = _runtime_seconds(sample)
+            if previous is None or runtime < previous[0]:
+                if previous is not None and not previous[2]:
+                    runs[-1].append(previous[:2])
+                runs.append([(runtime, sample)])
+                previous = (runtime, sample, True)
+            elif runtime - runs[-1][-1][0] >= self.resolution:
+                runs[-1].append((runtime, sample))
+                previous = (runtime, sample, True)
+            else:
+                previous = (runtime, sample, False)
+        self.previous = previous
+
+    def dated(self, mtime):
+        """[(ts, sample)] in log order; the last sample is dated at 'mtime' and the others back from it.
+
+        An earlier run is assumed to have ended when the next one started.
+        """
+        if self.previous is not None and not self.previous[2]:
+            self.runs[-1].append(self.previous[:2])
+            self.previous = self.previous[:2] + (True,)
+        dated = []
+        end = mtime
+        for run in reversed(self.runs):
+            last_runtime = run[-1][0]
+            dated.extend((end - (last_runtime - runtime), sample) for runtime, sample in reversed(run))
+            end -= last_runtime
+        dated.reverse()
+        return dated
+
+
+def timestamp_samples(samples, mtime, resolution=60):
+    """Keep one sample per 'resolution' seconds of miner runtime and give each a unix timestamp.
+
+    Progress lines only carry the miner's runtime, so the last sample is dated at the log's
+    modification time and the others are dated back from it. A runtime that goes down starts a
+    new miner run; an earlier run is assumed to have ended when the next one started.
+    Returns [(ts, sample)] in log order.
+    """
+    thinner = _SampleThinner(resolution)
+    thinner.add(samples)
+    return thinner.dated(mtime)
+
+
+def parse_log_file(path, compressed, mtime, resolution=60):
+    """Parse a downloaded log in chunks; runs in a worker process.
+
+    Samples are thinned to the resolution as every chunk is parsed, so memory grows with the
+    number of kept samples rather than the size of the log.
+    Returns ([(ts, normal_blocks, hash_rate, runtime_hours, difficulty)], consumed) where
+    'consumed' is the number of log bytes up to the last complete line; a trailing partial line
+    is left for the next backfill.
+    """
+    thinner = _SampleThinner(resolution)
+    consumed = 0
+    remainder = b''
+    with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            data = remainder + chunk
+            cut = max(data.rfind(b'\n'), data.rfind(b'\r')) + 1
+            remainder = data[cut:]
+            consumed += cut
+            thinner.add(parse_log_buffer(data[:cut]))
+    rows = [(ts, sample.normal_blocks, sample.hash_rate, sample.runtime_hours, sample.difficulty)
+            for ts, sample in thinner.dated(mtime)]
+    return rows, consumed
+
+
+def backfill_logs(ssh_info_list, pool, store, log_path=DEFAULT_LOG_PATH, max_workers=16, processes=None,
+                  exec_timeout=None, resolution=60):
+    """Load the miner log history of every instance into the store.
+
+    Logs are downloaded by up to 'max_workers' threads and parsed by a pool of 'processes'
+    worker processes (one per core by default) while other downloads are still running. The
+    workers are spawned rather than forked, as forking next to the SSH threads can deadlock.
+    The samples of an instance and its new log position are written in one transaction, so a
+    re-run only reads what was appended since (or what an interrupted run did not finish)
+    and never stores a sample twice.
+    Returns a summary dict with the number of instances, failures, samples and bytes transferred.
+    """
+    summary = {'instances': 0, 'failed': 0, 'samples': 0, 'bytes': 0}
+    if not ssh_info_list:
+        return summary
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='vastai-backfill-') as workdir, \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as downloads, \
+            ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as parsers:
+        pending = {}
+        for ssh_info in ssh_info_list:
+            inode, offset = store.backfill_position(ssh_info['instance_id'])
+            path = os.path.join(workdir, f"{ssh_info['instance_id']}.log")
+            command = build_backfill_command(log_path, inode, offset)
+            future = downloads.submit(download_log, pool, ssh_info['ssh_host'], ssh_info['ssh_port'], command, path, exec_timeout)
+            pending[future] = ('download', ssh_info, path, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, ssh_info, path, header = pending.pop(future)
+                instance_id = ssh_info['instance_id']
+                try:
+                    result = future.result()
+                except Exception as e:
+                    kind = classify_ssh_error(e) if stage == 'download' else 'parse'
+                    METRICS.inc('vastai_failures_total', kind=kind)
+                    logger.error("Backfill of instance %s failed: %s", instance_id, e)
+                    summary['failed'] += 1
+                    continue
+                if stage == 'download':
+                    if result is None:
+                        logger.error("Backfill of instance %s failed: %s not found", instance_id, log_path)
+                        summary['failed'] += 1
+                        continue
+                    header, received = result
+                    summary['bytes'] += received
+                    compressed, mtime = header[4], header[2]
+                    pending[parsers.submit(parse_log_file, path, compressed, mtime, resolution)] = ('parse', ssh_info, path, header)
+                    continue
+
+                os.remove(path)
+                rows, consumed = result
+                inode, _, _, start, _ = header
+                store.write_backfill(instance_id, [
+                    SampleRecord(ts, instance_id, ssh_info['gpu_name'], ssh_info['num_gpus'], ssh_info['dph_total'],
+                                 hash_rate, normal_blocks, runtime, difficulty)
+                    for ts, normal_blocks, hash_rate, runtime, difficulty in rows], inode, start + consumed)
+                summary['instances'] += 1
+                summary['samples'] += len(rows)
+                logger.info("Backfilled %s samples for instance %s", len(rows), instance_id)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
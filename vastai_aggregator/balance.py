@@ -0,0 +1,97 @@
+"""Vast.ai account balance and how long it lasts at the current spend rate."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .api import instance_list
+
+logger = logging.getLogger(__name__)
+
+
+# Function to calculate time covered by balance
+def calculate_time_covered_by_balance(balance, total_dph):
+    # Calculate the total daily cost by multiplying the hourly cost by 24
+    daily_cost = total_dph * 24
+    # Add a 1% fee disk space cost to the total daily cost
+    daily_cost_with_fee = daily_cost * 1.01  # 1% fee
+    # Calculate the number of days the balance will last
+    days_covered = balance / daily_cost_with_fee
+    # Extract the whole days
+    whole_days = int(days_covered)
+    # Calculate the remaining hours after whole days
+    remaining_hours = (days_covered - whole_days) * 24
+    # Extract the whole hours
+    whole_hours = int(remaining_hours)
+    # Calculate the remaining minutes after whole hours
+    remaining_minutes = (remaining_hours - whole_hours) * 60
+    # Extract the whole minutes
+    whole_minutes = int(remaining_minutes)
+
+    return whole_days, whole_hours, whole_minutes
+
+
+# Function to fetch the Vast.ai balance
+def get_vastai_balance(client):
+    try:
+        response = client.get('/users/current')
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to retrieve data: {e}")
+        return None
+
+    if response.status_code == 200:
+        data = response.json()
+        balance = data.get('credit', None)
+        if balance is not None:
+            return float(balance)  # Ensure the balance is a float
+        logger.error("Balance information was not available in the response.")
+    else:
+        logger.error(f"Failed to retrieve data: {response.status_code}")
+    return None
+
+
+# Function to print the Vast.ai balance and how long it will last
+def print_vastai_balance(balance, total_dph_running_machines):
+    if balance is None:
+        return
+    hourly_cost = total_dph_running_machines
+    daily_cost = hourly_cost * 24
+    daily_cost_with_fee = daily_cost * 1.01  
+    # Display the balance and estimated spend rate
+    print(f"Your Vast.ai balance is: ${balance:.2f}")
+    print(f"Your estimated spend rate: ${daily_cost_with_fee:.2f}/day")
+    # Calculate the time covered by balance
+    days, hours, minutes = calculate_time_covered_by_balance(balance, hourly_cost)
+    print(f"Your balance with current total DPH value will last for approximately {days} days, {hours} hours, and {minutes} minutes.")
+
+
+# Function to check Vast.ai balance
+def check_vastai_balance(client, total_dph_running_machines):
+    print_vastai_balance(get_vastai_balance(client), total_dph_running_machines)
+
+
+# Function to fetch the instance list and the balance at the same time
+def fetch_instances_and_balance(client, include_balance=True, inventory=None):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if inventory is not None:
+            instances_future = executor.submit(inventory.refresh, client)
+        else:
+            instances_future = executor.submit(instance_list, client)
+        balance_future = executor.submit(get_vastai_balance, client) if include_balance else None
+        ssh_info_list, total_dph_running_machines, total_gpus_running = instances_future.result()
+        balance = balance_future.result() if balance_future is not None else None
+    return ssh_info_list, total_dph_running_machines, total_gpus_running, balance
+
+
+def balance_summary(balance, total_dph_running_machines):
+    """The figures printed by print_vastai_balance() as a dict, for machine-readable output."""
+    summary = {
+        'balance': balance,
+        'total_dph': total_dph_running_machines,
+        'spend_per_day': total_dph_running_machines * 24 * 1.01,
+        'runway_hours': None,
+    }
+    if balance is not None and total_dph_running_machines:
+        days, hours, minutes = calculate_time_covered_by_balance(balance, total_dph_running_machines)
+        summary['runway_hours'] = days * 24 + hours + minutes / 60
+    return summary
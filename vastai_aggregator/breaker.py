@@ -0,0 +1,130 @@
+"""Per-host circuit breakers that keep unreachable or misconfigured hosts from eating every poll."""
+import json
+import logging
+import os
+import time
+
+from .logparse import MiningSample
+from .probe import ProbeResult
+
+logger = logging.getLogger(__name__)
+
+
+class HostCircuitBreaker:
+    """Circuit breaker state per (ssh_host, ssh_port), persisted in a JSON file across runs.
+
+    A host is 'closed' (polled normally) until it fails 'failure_threshold' times in a row, then
+    'open': it is not contacted until its backoff delay has passed. The delay starts at the base
+    delay of the failure kind (a wrong key or a missing miner.log will not fix itself in a minute,
+    a timeout may) and doubles with every further failure up to 'max_delay'. Once the delay has
+    passed the host is 'half_open' and admitted for a single test poll; success closes the breaker,
+    failure opens it again with the next delay.
+
+    Local configuration errors (kind 'config', e.g. a missing private key file) affect every host
+    alike and are not held against any of them.
+
+    The last good sample of each host is kept as well, so that a failing instance can still be
+    shown, marked as stale, instead of disappearing from the table. A sample older than
+    'max_sample_age' seconds is dropped, and the instance is then shown with N/A values.
+    """
+
+    # Failure kinds that are not the host's fault
+    LOCAL_KINDS = ('config',)
+
+    BASE_DELAYS = {'auth': 600, 'missing_log': 300, 'parse': 120, 'timeout': 60, 'connection_refused': 60, 'ssh_error': 60}
+
+    def __init__(self, path=None, failure_threshold=2, max_delay=3600, max_sample_age=86400):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.max_delay = max_delay
+        self.max_sample_age = max_sample_age
+        self._hosts = {}  # 'ssh_host:ssh_port' -> {'state', 'failures', 'kind', 'retry_at', 'last_success', 'last_sample'}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._hosts = json.load(f)['hosts']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable circuit breaker state '%s': %s", self.path, e)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'hosts': self._hosts}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Failed to write circuit breaker state '%s': %s", self.path, e)
+
+    @staticmethod
+    def host_key(ssh_info):
+        return f"{ssh_info['ssh_host']}:{ssh_info['ssh_port']}"
+
+    def _entry(self, ssh_info):
+        return self._hosts.setdefault(self.host_key(ssh_info), {
+            'state': 'closed', 'failures': 0, 'kind': None, 'retry_at': None, 'last_success': None, 'last_sample': None,
+        })
+
+    def state(self, ssh_info):
+        entry = self._hosts.get(self.host_key(ssh_info))
+        return entry['state'] if entry is not None else 'closed'
+
+    def allow(self, ssh_info, now=None):
+        """Whether the host may be polled now; an open breaker whose delay has passed turns half-open."""
+        entry = self._hosts.get(self.host_key(ssh_info))
+        if entry is None or entry['state'] == 'closed':
+            return True
+        now = time.time() if now is None else now
+        if entry['state'] == 'open' and now >= entry['retry_at']:
+            entry['state'] = 'half_open'
+            logger.info("Testing host %s again after %s failures (%s).", self.host_key(ssh_info), entry['failures'], entry['kind'])
+        return entry['state'] == 'half_open'
+
+    def record(self, ssh_info, probe, now=None):
+        """Update the breaker of the host from a ProbeResult."""
+        now = time.time() if now is None else now
+        entry = self._entry(ssh_info)
+        if probe.error is None:
+            if entry['state'] != 'closed':
+                logger.info("Host %s is reachable again.", self.host_key(ssh_info))
+            entry.update({'state': 'closed', 'failures': 0, 'kind': None, 'retry_at': None,
+                          'last_success': now, 'last_sample': list(probe.sample)})
+            return
+        if probe.error in self.LOCAL_KINDS:
+            return
+        entry['failures'] += 1
+        entry['kind'] = probe.error
+        if entry['state'] == 'half_open' or entry['failures'] >= self.failure_threshold:
+            exponent = max(0, entry['failures'] - self.failure_threshold)
+            delay = min(self.max_delay, self.BASE_DELAYS.get(probe.error, 60) * 2 ** exponent)
+            entry['state'] = 'open'
+            entry['retry_at'] = now + delay
+            logger.warning("Host %s failed %s times in a row (%s), not polling it for %.0f seconds.",
+                           self.host_key(ssh_info), entry['failures'], probe.error, delay)
+
+    def stale_probe(self, ssh_info, probe=None, now=None):
+        """The failed ProbeResult of a host (or one for a host that was skipped) with its last good sample.
+
+        A host that never succeeded, or whose last sample is older than 'max_sample_age', has no
+        last sample; its result keeps an empty one and is still shown as stale, with N/A values.
+        """
+        entry = self._hosts.get(self.host_key(ssh_info)) or {}
+        if probe is None:
+            probe = ProbeResult((None,) * 8, None, None, None, entry.get('kind') or 'ssh_error')
+        last_sample = entry.get('last_sample')
+        now = time.time() if now is None else now
+        if last_sample and self.max_sample_age is not None and now - (entry.get('last_success') or 0) > self.max_sample_age:
+            entry['last_sample'] = last_sample = None
+        return probe._replace(sample=MiningSample(*last_sample)) if last_sample else probe
+
+    def filter(self, ssh_info_list, now=None):
+        """Split instances into (admitted, blocked) according to their host's breaker."""
+        admitted, blocked = [], []
+        for ssh_info in ssh_info_list:
+            (admitted if self.allow(ssh_info, now) else blocked).append(ssh_info)
+        return admitted, blocked
@@ -0,0 +1,512 @@
+"""Command line entry point: one-shot report, watch mode, balance check and parser benchmark.
+
+Everything but the argument parsing is imported on demand, so that e.g. '--balance-only'
+does not pay for loading paramiko, NumPy and PrettyTable.
+"""
+import argparse
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """Runs named jobs repeatedly, each on its own interval, in a single thread."""
+
+    def __init__(self):
+        self._jobs = []  # heap of (next_run, sequence, name, interval, func)
+        self._sequence = 0
+        self._stopped = threading.Event()
+
+    def add_job(self, name, interval, func, run_now=True):
+        first_run = time.monotonic() if run_now else time.monotonic() + interval
+        heapq.heappush(self._jobs, (first_run, self._sequence, name, interval, func))
+        self._sequence += 1
+
+    def stop(self):
+        """Make run_forever() return, from another thread, once the running job (if any) is done."""
+        self._stopped.set()
+
+    def run_forever(self):
+        while self._jobs and not self._stopped.is_set():
+            next_run, sequence, name, interval, func = heapq.heappop(self._jobs)
+            delay = next_run - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                return
+            try:
+                func()
+            except Exception as e:
+                logger.error("Scheduled job '%s' failed: %s", name, e)
+            # Skip missed runs instead of bursting to catch up after a slow job
+            next_run = max(next_run + interval, time.monotonic())
+            heapq.heappush(self._jobs, (next_run, sequence, name, interval, func))
+
+
+def configure_logging(log_file=None, console=True):
+    """Log INFO and above to stderr (unless console is False) and, if given, to log_file."""
+    handlers = [logging.StreamHandler()] if console else []
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    if not handlers:
+        handlers.append(logging.NullHandler())
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=handlers)
+
+
+def create_client(config, api_key_file=None):
+    """VastClient for an API key file (the configured one by default), exiting with an error message if it cannot be read."""
+    from .api import create_vast_client, load_api_key
+
+    api_key_file = api_key_file or config.api_key_file
+    try:
+        api_key = load_api_key(api_key_file)
+    except FileNotFoundError:
+        logger.error(f"API key file '{api_key_file}' not found.")
+        raise SystemExit(1)
+    except Exception as e:
+        logger.error(f"Error reading API key: {e}")
+        raise SystemExit(1)
+    return create_vast_client(api_key, config)
+
+
+def create_accounts(config):
+    """An Account for every entry of config.accounts, or a single unnamed one for api_key_file."""
+    from .accounts import Account, account_path
+    from .inventory import InstanceInventory
+
+    accounts = []
+    for settings in config.accounts or [{'name': ''}]:
+        name = settings.get('name', '')
+        client = create_client(config, settings.get('api_key_file'))
+        inventory = InstanceInventory(settings.get('inventory_cache_path', account_path(config.inventory_cache_path, name)),
+                                      config.inventory_cache_ttl, config.log_instances)
+        accounts.append(Account(name, client, inventory, settings.get('private_key_path'), settings.get('passphrase')))
+    return accounts
+
+
+def create_ssh_pool(config):
+    from .ssh import SSHConnectionPool
+
+    return SSHConnectionPool(config.username, config.private_key_path, config.passphrase,
+                             connect_timeout=config.ssh_connect_timeout,
+                             idle_timeout=config.ssh_idle_timeout,
+                             max_age=config.ssh_max_connection_age)
+
+
+def create_breaker(config):
+    from .breaker import HostCircuitBreaker
+
+    return HostCircuitBreaker(config.circuit_breaker_path,
+                              failure_threshold=config.circuit_breaker_failure_threshold,
+                              max_delay=config.circuit_breaker_max_delay,
+                              max_sample_age=config.circuit_breaker_max_sample_age)
+
+
+def collect(config, ssh_info_list, ssh_pool, log_cursors=None, breaker=None, scheduled=None):
+    """collect_probes() with the configured concurrency, timeouts and log location.
+
+    'scheduled' are the instances polled later, whose SSH connections are kept open.
+
+    With a breaker, hosts whose circuit is open are not contacted. They, and hosts whose poll
+    failed, are returned with their last good sample, marked stale by the probe's error.
+    """
+    from .metrics import METRICS
+    from .ssh import collect_probes
+
+    blocked = []
+    if breaker is not None:
+        ssh_info_list, blocked = breaker.filter(ssh_info_list)
+        for ssh_info in blocked:
+            logger.warning("Skipping instance %s: circuit breaker of %s is open.", ssh_info['instance_id'], breaker.host_key(ssh_info))
+    probes = collect_probes(ssh_info_list, ssh_pool,
+                          max_workers=config.max_concurrent_ssh,
+                          exec_timeout=config.ssh_exec_timeout,
+                          log_cursors=log_cursors,
+                          log_path=config.miner_log_path,
+                          initial_bytes=config.initial_log_read_bytes,
+                          max_bytes=config.max_log_read_bytes,
+                          history_size=config.log_history_size,
+                          process_pattern=config.miner_process_pattern,
+                          scheduled=scheduled)
+    if breaker is not None:
+        for ssh_info in ssh_info_list:
+            probe = probes[ssh_info['instance_id']]
+            breaker.record(ssh_info, probe)
+            if probe.error is not None:
+                probes[ssh_info['instance_id']] = breaker.stale_probe(ssh_info, probe)
+        for ssh_info in blocked:
+            probes[ssh_info['instance_id']] = breaker.stale_probe(ssh_info)
+        METRICS.set('vastai_open_circuits', len(blocked))
+        breaker.save()
+    return probes
+
+
+def create_streaming_collector(config, ssh_pool, log_cursors=None):
+    """StreamingCollector with the configured log location, queue size and resubscription backoff."""
+    from .stream import StreamingCollector
+
+    return StreamingCollector(ssh_pool, log_cursors,
+                              log_path=config.miner_log_path,
+                              initial_bytes=config.initial_log_read_bytes,
+                              max_bytes=config.max_log_read_bytes,
+                              history_size=config.log_history_size,
+                              max_pending=config.stream_queue_size,
+                              max_workers=config.max_concurrent_ssh,
+                              retry_max=config.stream_resubscribe_max_delay)
+
+
+def create_dashboard(config, accounts):
+    """LiveDashboard with the configured initial sort; the account column is only shown for named accounts."""
+    from .dashboard import LiveDashboard
+    from .report import TABLE_COLUMNS
+
+    columns = TABLE_COLUMNS if any(account.name for account in accounts) else TABLE_COLUMNS[:16]
+    return LiveDashboard(columns, config.sort_column_index, config.sort_order)
+
+
+def report_options(config, json_output=False):
+    """Keyword arguments of render_report() taken from the configuration."""
+    return {
+        'print_balance': config.print_balance_check,
+        'threshold': config.threshold,
+        'output_file': config.table_output_path if config.write_table_output_file else None,
+        'sort_column_index': config.sort_column_index,
+        'sort_order': config.sort_order,
+        'json_output': json_output,
+    }
+
+
+def run_balance_only(config, json_output=False):
+    """Print the balance and how long it lasts, without connecting to any instance."""
+    import json
+
+    from .accounts import fetch_accounts
+    from .balance import balance_summary, print_vastai_balance
+
+    accounts = create_accounts(config)
+    try:
+        ssh_info_list, total_dph_running_machines, total_gpus_running, balance, balances = fetch_accounts(accounts, True)
+    finally:
+        for account in accounts:
+            account.close()
+    if len(balances) > 1:
+        # The DPH of each account, from the merged instance list
+        account_dph = dict.fromkeys(balances, 0.0)
+        for ssh_info in ssh_info_list:
+            if str(ssh_info['actual_status']).lower() == 'running':
+                account_dph[ssh_info['account']] += float(ssh_info['dph_total'])
+    if json_output:
+        summary = balance_summary(balance, total_dph_running_machines)
+        summary['total_gpus'] = total_gpus_running
+        if len(balances) > 1:
+            summary['accounts'] = {name: balance_summary(balances[name], account_dph[name]) for name in balances}
+        print(json.dumps(summary))
+    else:
+        print_vastai_balance(balance, total_dph_running_machines)
+        if len(balances) > 1:
+            for name in balances:
+                print(f"\nAccount {name}:")
+                print_vastai_balance(balances[name], account_dph[name])
+    return 0 if balance is not None else 1
+
+
+def run_once(config, metrics_json=None, json_output=False):
+    """Collect everything once, print the report and exit, optionally dumping the run's metrics to metrics_json."""
+    from .accounts import assign_account_keys, fetch_accounts
+    from .adaptive import running_instances
+    from .api import test_api_connection
+    from .metrics import METRICS
+    from .report import render_report
+    from .storage import MetricsStore
+
+    accounts = create_accounts(config)
+
+    # Test API Connection
+    test_api_connection(accounts[0].client)
+
+    # List Instances and Get SSH Information (and the balances, concurrently for all accounts)
+    ssh_info_list, total_dph_running_machines, total_gpus_running, balance, balances = fetch_accounts(accounts, config.print_balance_check or json_output)
+    for account in accounts:
+        account.close()
+
+    # Fetch Log Information for All Running Instances
+    ssh_pool = create_ssh_pool(config)
+    assign_account_keys(accounts, ssh_pool, ssh_info_list)
+    probes = collect(config, running_instances(ssh_info_list), ssh_pool, breaker=create_breaker(config))
+    ssh_pool.close_all()
+    log_info_by_instance = {instance_id: probe.sample for instance_id, probe in probes.items()}
+
+    store = MetricsStore(config.metrics_db_path) if config.metrics_db_path else None
+    try:
+        render_report(ssh_info_list, log_info_by_instance, total_dph_running_machines, total_gpus_running, balance, store,
+                      probes=probes, account_balances=balances, **report_options(config, json_output))
+    finally:
+        if store is not None:
+            store.close()
+    if metrics_json:
+        try:
+            METRICS.dump_json(metrics_json)
+        except OSError as e:
+            logger.error("Failed to write metrics to %s: %s", metrics_json, e)
+    return 0
+
+
+def run_backfill(config):
+    """Load the miner log history of all running instances into the metrics database and print a summary."""
+    from .accounts import assign_account_keys, fetch_accounts
+    from .adaptive import running_instances
+    from .api import test_api_connection
+    from .backfill import backfill_logs
+    from .storage import MetricsStore
+
+    if not config.metrics_db_path:
+        logger.error("Backfill needs a metrics database; set metrics_db_path.")
+        return 1
+    accounts = create_accounts(config)
+    test_api_connection(accounts[0].client)
+    ssh_info_list = fetch_accounts(accounts, include_balance=False)[0]
+    for account in accounts:
+        account.close()
+
+    ssh_pool = create_ssh_pool(config)
+    assign_account_keys(accounts, ssh_pool, ssh_info_list)
+    store = MetricsStore(config.metrics_db_path)
+    try:
+        summary = backfill_logs(running_instances(ssh_info_list), ssh_pool, store,
+                                log_path=config.miner_log_path,
+                                max_workers=config.max_concurrent_ssh,
+                                processes=config.backfill_processes,
+                                exec_timeout=config.ssh_exec_timeout,
+                                resolution=config.backfill_resolution)
+    finally:
+        ssh_pool.close_all()
+        store.close()
+    print(f"Backfilled {summary['samples']} samples from {summary['instances']} instances "
+          f"({summary['bytes'] / 1e6:.1f} MB transferred, {summary['failed']} failed) in {summary.get('seconds', 0):.1f}s")
+    return 0 if not summary['failed'] else 1
+
+
+def run_watch(config, poll_interval, inventory_interval, metrics_port=None, json_output=False, stream=False, dashboard=False):
+    """Keep running, refreshing the instance list and polling logs on independent intervals.
+
+    Each running instance is polled on its own interval between poll_interval and
+    config.adaptive_poll_max_interval (see AdaptivePollScheduler); instances that are not running are skipped.
+    With stream, the logs are followed over long-lived 'tail -F' channels instead of being polled,
+    and poll_interval only sets how often the report is rendered.
+    If metrics_port is set, the instrumentation is served over HTTP on that port.
+    With dashboard, the report is shown on a live terminal dashboard (see LiveDashboard) while the
+    jobs run in a background thread.
+    """
+    from .accounts import assign_account_keys, fetch_accounts
+    from .adaptive import AdaptivePollScheduler, running_instances
+    from .api import test_api_connection
+    from .fleet import FleetAggregator
+    from .metrics import METRICS, start_metrics_server
+    from .outliers import OutlierDetector
+    from .report import observe_outliers, render_report
+    from .ssh import take_log_samples
+    from .storage import MetricsStore
+
+    state = {
+        'ssh_info_list': [],
+        'total_dph_running_machines': 0,
+        'total_gpus_running': 0,
+        'balance': None,
+        'account_balances': {},
+        'log_info_by_instance': {},
+        'probes': {},
+        'log_cursors': {},
+        'stream_samples': {},
+    }
+    ssh_pool = create_ssh_pool(config)
+    store = MetricsStore(config.metrics_db_path) if config.metrics_db_path else None
+    aggregator = FleetAggregator(config.sort_column_index, config.sort_order)
+    detector = OutlierDetector(config.threshold, config.outlier_window, config.outlier_sustain)
+    accounts = create_accounts(config)
+    options = report_options(config, json_output)
+    breaker = create_breaker(config)
+    poll_scheduler = AdaptivePollScheduler(poll_interval, config.adaptive_poll_max_interval)
+    collector = create_streaming_collector(config, ssh_pool, state['log_cursors']) if stream else None
+    live_dashboard = create_dashboard(config, accounts) if dashboard else None
+    options['dashboard'] = live_dashboard
+
+    def on_inventory_change(kind, old, new):
+        # Only tear down connections and log positions of instances that went away or moved
+        if kind in ('removed', 'changed'):
+            ssh_pool.close(old['ssh_host'], old['ssh_port'])
+            state['log_cursors'].pop(old['instance_id'], None)
+
+    for account in accounts:
+        account.inventory.add_listener(on_inventory_change)
+
+    def refresh_inventory():
+        ssh_info_list, total_dph_running_machines, total_gpus_running, _, balances = fetch_accounts(accounts, config.print_balance_check or json_output)
+        # Accounts whose balance could not be fetched keep their last known one
+        for name, balance in balances.items():
+            if balance is not None or name not in state['account_balances']:
+                state['account_balances'][name] = balance
+        known_balances = [balance for balance in state['account_balances'].values() if balance is not None]
+        state['balance'] = sum(known_balances) if known_balances else None
+        assign_account_keys(accounts, ssh_pool, ssh_info_list)
+        state['ssh_info_list'] = ssh_info_list
+        state['total_dph_running_machines'] = total_dph_running_machines
+        state['total_gpus_running'] = total_gpus_running
+        if collector is not None:
+            collector.set_instances(running_instances(ssh_info_list))
+
+    def poll_logs():
+        polled_at = time.monotonic()
+        due = poll_scheduler.due(state['ssh_info_list'], polled_at)
+        # Instances that are polled less often keep their connection between polls
+        probes = collect(config, due, ssh_pool, state['log_cursors'], breaker, running_instances(state['ssh_info_list']))
+        for ssh_info in due:
+            poll_scheduler.record(ssh_info, probes[ssh_info['instance_id']], polled_at)
+        METRICS.inc('vastai_polls_total', len(due))
+
+        # Instances that were not due keep their last reading; stopped or removed ones are dropped
+        running_ids = {ssh_info['instance_id'] for ssh_info in running_instances(state['ssh_info_list'])}
+        METRICS.inc('vastai_polls_skipped_total', len(running_ids) - len(due))
+        state['probes'] = {instance_id: probe for instance_id, probe in {**state['probes'], **probes}.items() if instance_id in running_ids}
+        state['log_info_by_instance'] = {instance_id: probe.sample for instance_id, probe in state['probes'].items()}
+        # Every sample read by this poll is stored, not only the latest one
+        log_samples = {instance_id: take_log_samples(state['log_cursors'][instance_id])
+                       for instance_id in (ssh_info['instance_id'] for ssh_info in due) if instance_id in state['log_cursors']}
+        render_report(state['ssh_info_list'], state['log_info_by_instance'],
+                      state['total_dph_running_machines'], state['total_gpus_running'], state['balance'], store, aggregator,
+                      probes=state['probes'], detector=detector, account_balances=state['account_balances'],
+                      fresh={ssh_info['instance_id'] for ssh_info in due}, log_samples=log_samples, **options)
+
+    def drain_stream():
+        # Keep the queue moving between renders and feed what arrived to the aggregator right away
+        records = collector.drain()
+        if records:
+            for instance_id, record in records.items():
+                if record.samples:
+                    state['stream_samples'].setdefault(instance_id, deque(maxlen=config.log_history_size)).extend(record.samples)
+                sample = record.latest
+                if sample is None:
+                    # The stream was lost; the instance has no reading until it is back
+                    state['log_info_by_instance'].pop(instance_id, None)
+                else:
+                    state['log_info_by_instance'][instance_id] = sample
+            aggregator.sync(state['ssh_info_list'], state['log_info_by_instance'])
+            observe_outliers(detector, state['ssh_info_list'], state['log_info_by_instance'])
+
+    def render_stream():
+        drain_stream()
+        render_report(state['ssh_info_list'], state['log_info_by_instance'],
+                      state['total_dph_running_machines'], state['total_gpus_running'], state['balance'], store, aggregator,
+                      detector=detector, account_balances=state['account_balances'],
+                      fresh=set(state['stream_samples']), log_samples=state['stream_samples'], **options)
+        state['stream_samples'] = {}
+
+    metrics_server = None
+    if metrics_port is not None:
+        try:
+            metrics_server = start_metrics_server(metrics_port)
+        except OSError as e:
+            logger.error("Failed to start the metrics endpoint on port %s: %s", metrics_port, e)
+
+    test_api_connection(accounts[0].client)
+    refresh_inventory()
+    scheduler = PollScheduler()
+    scheduler.add_job('inventory', inventory_interval, refresh_inventory, run_now=False)
+    if collector is not None:
+        collector.start()
+        scheduler.add_job('stream', min(1.0, poll_interval), drain_stream, run_now=False)
+        scheduler.add_job('report', poll_interval, render_stream, run_now=False)
+    else:
+        scheduler.add_job('logs', poll_interval, poll_logs)
+    try:
+        if live_dashboard is None:
+            scheduler.run_forever()
+        else:
+            worker = threading.Thread(target=scheduler.run_forever, name='vastai-watch', daemon=True)
+            worker.start()
+            live_dashboard.run()
+            scheduler.stop()
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Watch mode stopped.")
+    finally:
+        if collector is not None:
+            collector.stop()
+        ssh_pool.close_all()
+        for account in accounts:
+            account.close()
+        if store is not None:
+            store.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    return 0
+
+
+def main(argv=None, config=None):
+    """Run the command line interface and return the exit code.
+
+    'config' defaults to Config(); the script passes the settings of its user configuration block.
+    """
+    config = Config() if config is None else config
+    parser = argparse.ArgumentParser(description="Aggregate XENGPUMiner performance across your Vast.ai instances.")
+    parser.add_argument('--watch', metavar='INTERVAL', type=float,
+                        help="Keep running and poll instance logs every INTERVAL seconds instead of running once.")
+    parser.add_argument('--stream', action='store_true',
+                        help="In watch mode, follow the miner logs over long-lived 'tail -F' channels instead of polling them; "
+                             "INTERVAL then only sets how often the report is printed.")
+    parser.add_argument('--dashboard', action='store_true',
+                        help="In watch mode, show the report on a live terminal dashboard that only redraws what changed, "
+                             "with scrolling and sorting by any column; log messages then only go to the log file.")
+    parser.add_argument('--balance-only', action='store_true',
+                        help="Only print the account balance and how long it lasts, without connecting to any instance.")
+    parser.add_argument('--backfill', action='store_true',
+                        help="Load the whole miner log history of every running instance into the metrics database and exit; "
+                             "re-runs only add what was appended since.")
+    parser.add_argument('--json', action='store_true',
+                        help="Print the report (or balance) as JSON instead of tables; one document per poll in watch mode.")
+    parser.add_argument('--benchmark-parser', metavar='LOG_FILE', nargs='?', const='',
+                        help="Measure log parser throughput on LOG_FILE (or synthetic lines) and exit.")
+    parser.add_argument('--inventory-interval', metavar='SECONDS', type=float,
+                        help="In watch mode, refresh the instance list and balance every SECONDS seconds "
+                             f"(default: {config.inventory_refresh_interval}).")
+    parser.add_argument('--metrics-port', metavar='PORT', type=int, default=config.metrics_port,
+                        help="In watch mode, serve /metrics and /metrics.json on PORT; 0 disables it (default: %(default)s).")
+    parser.add_argument('--metrics-json', metavar='PATH', default=config.metrics_json_path,
+                        help="In one-shot mode, write the run's metrics to PATH (default: %(default)s).")
+    args = parser.parse_args(argv)
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch INTERVAL must be greater than 0")
+    if args.stream and args.watch is None:
+        parser.error("--stream needs --watch")
+    if args.inventory_interval is not None:
+        if args.watch is None:
+            parser.error("--inventory-interval needs --watch")
+        if args.inventory_interval <= 0:
+            parser.error("--inventory-interval SECONDS must be greater than 0")
+    if args.dashboard:
+        if not args.watch or args.json:
+            parser.error("--dashboard needs --watch and cannot be combined with --json")
+        try:
+            import curses  # noqa: F401
+        except ImportError:
+            parser.error("--dashboard needs the curses module (on Windows: pip install windows-curses)")
+
+    configure_logging(config.log_file, console=not args.dashboard)
+    if args.benchmark_parser is not None:
+        from .logparse import benchmark_parser
+
+        benchmark_parser(args.benchmark_parser or None)
+        return 0
+    if args.balance_only:
+        return run_balance_only(config, args.json)
+    if args.backfill:
+        return run_backfill(config)
+    if args.watch:
+        inventory_interval = args.inventory_interval if args.inventory_interval is not None else config.inventory_refresh_interval
+        return run_watch(config, args.watch, inventory_interval, args.metrics_port or None, args.json, args.stream, args.dashboard)
+    return run_once(config, args.metrics_json, args.json)
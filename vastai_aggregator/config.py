@@ -0,0 +1,85 @@
+"""Settings of the aggregator, with the defaults of the user configuration block of the script."""
+
+
+class Config:
+    """Every setting the collectors, the report and the command line use.
+
+    The class attributes are the defaults; Config(**settings) overrides some of them and
+    Config.from_mapping() picks them out of a mapping such as the script's globals().
+    """
+
+    api_key_file = 'api_key.txt'
+    accounts = None
+    username = 'root'
+    private_key_path = None
+    passphrase = ''
+
+    api_max_retries = 5
+    api_backoff_base = 1.0
+    api_backoff_max = 60
+    api_requests_per_second = 2
+    api_timeout = 30
+
+    inventory_cache_ttl = 120
+    inventory_cache_path = 'inventory_cache.json'
+    log_instances = True
+
+    max_concurrent_ssh = 16
+    ssh_connect_timeout = 10
+    ssh_exec_timeout = 15
+    ssh_idle_timeout = 300
+    ssh_max_connection_age = 3600
+    miner_log_path = '/root/XENGPUMiner/miner.log'
+    miner_process_pattern = 'miner.py'
+    initial_log_read_bytes = 65536
+    max_log_read_bytes = 4194304
+    log_history_size = 1000
+
+    circuit_breaker_path = 'circuit_breakers.json'
+    circuit_breaker_failure_threshold = 2
+    circuit_breaker_max_delay = 3600
+    circuit_breaker_max_sample_age = 86400
+
+    inventory_refresh_interval = 300
+    adaptive_poll_max_interval = 300
+
+    stream_queue_size = 1000
+    stream_resubscribe_max_delay = 60
+
+    sort_column_index = 11
+    sort_order = 'ascending'
+    threshold = 1
+    outlier_window = 10
+    outlier_sustain = 3
+
+    metrics_db_path = 'metrics.db'
+    backfill_processes = None
+    backfill_resolution = 60
+    write_table_output_file = False
+    table_output_path = 'table_output.txt'
+
+    metrics_port = 9101
+    metrics_json_path = 'metrics.json'
+
+    print_balance_check = True
+
+    log_file = 'script_output2.log'
+
+    # Names used in the script that differ from the attribute names
+    ALIASES = {'API_KEY_FILE': 'api_key_file'}
+
+    def __init__(self, **settings):
+        for name, value in settings.items():
+            if name.isupper() or not hasattr(type(self), name):
+                raise TypeError(f"Unknown setting '{name}'")
+            setattr(self, name, value)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Config from the known settings in a mapping; everything else in it is ignored."""
+        settings = {}
+        for name, value in mapping.items():
+            name = cls.ALIASES.get(name, name)
+            if not name.startswith('_') and not name.isupper() and hasattr(cls, name) and not callable(getattr(cls, name)):
+                settings[name] = value
+        return cls(**settings)
@@ -0,0 +1,215 @@
+"""Live terminal dashboard that only redraws what changed between polls."""
+import bisect
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Display width of every table column, in the order of report.TABLE_COLUMNS
+COLUMN_WIDTHS = (11, 12, 5, 7, 7, 8, 10, 10, 10, 8, 8, 9, 9, 16, 6, 6, 10)
+
+HELP_TEXT = "Up/Down/PgUp/PgDn scroll  Left/Right sort column  r reverse  q quit"
+
+
+def _sort_key(value):
+    """Numbers first in numeric order, then everything else as text; 'N/A' sorts lowest."""
+    if value in (None, 'N/A'):
+        return (0, float('-inf'), '')
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+
+def _cell(value, width):
+    text = str(value)
+    if len(text) > width:
+        text = text[:width - 1] + '~'
+    return text.rjust(width)
+
+
+class LiveDashboard:
+    """Fleet table for a curses screen, kept up to date one instance at a time.
+
+    update() compares every row with the one it replaces: only changed rows are re-formatted and
+    moved in the sort index (O(log n) each), and draw() only rewrites the screen lines whose text
+    or highlighting changed, so an update costs what changed rather than a full re-render. Any
+    column can be sorted on interactively; outliers and instances with low GPU utilization are
+    highlighted.
+    """
+
+    def __init__(self, columns, sort_column_index=11, sort_order='ascending'):
+        self.columns = list(columns)
+        self.sort_column_index = sort_column_index if 0 <= sort_column_index < len(self.columns) else 0
+        self.descending = sort_order == 'descending'
+        self.offset = 0
+        self._lock = threading.Lock()
+        self._rows = {}        # instance_id -> table row
+        self._lines = {}       # instance_id -> formatted line
+        self._sort_keys = {}   # instance_id -> sort key
+        self._sorted = []      # sorted list of (sort key, instance_id)
+        self._outliers = set()
+        self._warnings = set()
+        self._summary = ''
+        self._drawn = {}       # screen line -> (text, attribute kind) currently on screen
+        self._stop = threading.Event()
+
+    def _format(self, row):
+        return ' '.join(_cell(value, width) for value, width in zip(row[:len(self.columns)], COLUMN_WIDTHS))
+
+    def _key(self, instance_id):
+        return (_sort_key(self._rows[instance_id][self.sort_column_index]), str(instance_id))
+
+    def _unindex(self, instance_id):
+        entry = (self._sort_keys.pop(instance_id), instance_id)
+        del self._sorted[bisect.bisect_left(self._sorted, entry)]
+
+    def _index(self, instance_id):
+        key = self._key(instance_id)
+        self._sort_keys[instance_id] = key
+        bisect.insort(self._sorted, (key, instance_id))
+
+    def update(self, table_data, summary, outliers=(), warnings=()):
+        """Replace the rows (table rows with the instance ID first), the summary line, the IDs of the
+        outliers and the IDs of the instances with a GPU utilization warning."""
+        with self._lock:
+            current = set()
+            for row in table_data:
+                instance_id = row[0]
+                current.add(instance_id)
+                if self._rows.get(instance_id) == row:
+                    continue
+                if instance_id in self._rows:
+                    self._unindex(instance_id)
+                self._rows[instance_id] = list(row)
+                self._lines[instance_id] = self._format(row)
+                self._index(instance_id)
+            for instance_id in [instance_id for instance_id in self._rows if instance_id not in current]:
+                self._unindex(instance_id)
+                del self._rows[instance_id]
+                del self._lines[instance_id]
+            self._summary = summary
+            self._outliers = set(outliers)
+            self._warnings = set(warnings)
+
+    def set_sort(self, column_index=None, descending=None):
+        """Sort on another column (re-sorting once) and/or flip the order."""
+        with self._lock:
+            if descending is not None:
+                self.descending = descending
+            if column_index is not None and column_index != self.sort_column_index:
+                self.sort_column_index = column_index % len(self.columns)
+                self._sort_keys = {instance_id: self._key(instance_id) for instance_id in self._rows}
+                self._sorted = sorted((key, instance_id) for instance_id, key in self._sort_keys.items())
+
+    def scroll(self, lines, page_size):
+        with self._lock:
+            self.offset = max(0, min(self.offset + lines, len(self._sorted) - page_size))
+
+    def _attribute_kind(self, instance_id):
+        if instance_id in self._outliers:
+            return 'outlier'
+        if instance_id in self._warnings:
+            return 'low_util'
+        return 'normal'
+
+    def _header(self):
+        cells = []
+        for index, (name, width) in enumerate(zip(self.columns, COLUMN_WIDTHS)):
+            if index == self.sort_column_index:
+                name = name[:width - 1] + ('v' if self.descending else '^')
+            cells.append(name[:width].rjust(width))
+        return ' '.join(cells)
+
+    def screen_lines(self, height):
+        """The (text, attribute kind) of every screen line for a screen of the given height."""
+        page_size = max(0, height - 3)
+        with self._lock:
+            self.offset = max(0, min(self.offset, len(self._sorted) - page_size))
+            if self.descending:
+                stop = len(self._sorted) - self.offset
+                visible = [instance_id for _, instance_id in reversed(self._sorted[max(0, stop - page_size):stop])]
+            else:
+                visible = [instance_id for _, instance_id in self._sorted[self.offset:self.offset + page_size]]
+            lines = [(self._summary, 'summary'), (self._header(), 'header')]
+            lines.extend((self._lines[instance_id], self._attribute_kind(instance_id)) for instance_id in visible)
+            lines.extend(('', 'normal') for _ in range(page_size - len(visible)))
+            shown = f"{self.offset + 1}-{self.offset + len(visible)} of {len(self._sorted)}" if visible else "0 of 0"
+            lines.append((f"{shown} instances, {len(self._outliers)} outliers, {len(self._warnings)} low GPU util  |  {HELP_TEXT}", 'help'))
+        return lines
+
+    def draw(self, screen, attributes):
+        """Rewrite the lines whose content changed since the last draw and refresh the screen."""
+        height, width = screen.getmaxyx()
+        for y, (text, kind) in enumerate(self.screen_lines(height)[:height]):
+            if self._drawn.get(y) == (text, kind):
+                continue
+            screen.move(y, 0)
+            screen.clrtoeol()
+            screen.addnstr(y, 0, text, width - 1, attributes.get(kind, 0))
+            self._drawn[y] = (text, kind)
+        screen.refresh()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Show the dashboard until 'q' or Ctrl+C; raises ImportError if curses is not available."""
+        import curses
+
+        def loop(screen):
+            curses.curs_set(0)
+            screen.timeout(250)
+            attributes = {'summary': curses.A_BOLD, 'header': curses.A_REVERSE, 'help': curses.A_DIM}
+            if curses.has_colors():
+                curses.use_default_colors()
+                curses.init_pair(1, curses.COLOR_RED, -1)
+                curses.init_pair(2, curses.COLOR_YELLOW, -1)
+                attributes['outlier'] = curses.color_pair(1) | curses.A_BOLD
+                attributes['low_util'] = curses.color_pair(2)
+            else:
+                attributes['outlier'] = curses.A_BOLD
+                attributes['low_util'] = curses.A_UNDERLINE
+            while not self._stop.is_set():
+                self.draw(screen, attributes)
+                key = screen.getch()
+                page_size = max(1, screen.getmaxyx()[0] - 3)
+                if key in (ord('q'), ord('Q')):
+                    return
+                elif key in (curses.KEY_DOWN, ord('j')):
+                    self.scroll(1, page_size)
+                elif key in (curses.KEY_UP, ord('k')):
+                    self.scroll(-1, page_size)
+                elif key == curses.KEY_NPAGE:
+                    self.scroll(page_size, page_size)
+                elif key == curses.KEY_PPAGE:
+                    self.scroll(-page_size, page_size)
+                elif key in (curses.KEY_RIGHT, ord('>')):
+                    self.set_sort(column_index=self.sort_column_index + 1)
+                elif key in (curses.KEY_LEFT, ord('<')):
+                    self.set_sort(column_index=self.sort_column_index - 1)
+                elif key in (ord('r'), ord('R')):
+                    self.set_sort(descending=not self.descending)
+                elif key == curses.KEY_RESIZE:
+                    screen.clear()
+                    self._drawn.clear()
+
+        try:
+            curses.wrapper(loop)
+        except KeyboardInterrupt:
+            pass
+
+
+def dashboard_summary(fleet, total_dph_running_machines, total_gpus_running, balance=None):
+    """The summary line printed above the table by print_table(), plus the balance."""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    difficulty = int(fleet['mean_difficulty']) if fleet['mean_difficulty'] is not None else "N/A"
+    average_dollars_per_normal_block = fleet['average_dollars_per_normal_block']
+    summary = (f"Timestamp: {timestamp}, GPU's: {total_gpus_running}, Difficulty: {difficulty}, "
+               f"Total Hash: {fleet['total_hash_rate']:.2f} h/s, Total DPH: {total_dph_running_machines:.4f}$, "
+               f"Avg_$/Block: {f'{average_dollars_per_normal_block:.4f}$' if average_dollars_per_normal_block is not None else 'N/A'}, "
+               f"Total Blocks/h: {fleet['sum_normal_block_per_hour']:.2f}")
+    if balance is not None:
+        summary += f", Balance: ${balance:.2f}"
+    return summary
@@ -0,0 +1,365 @@
+"""Per-instance table rows, fleet totals and per GPU type stats."""
+import bisect
+import logging
+import math
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of the fleet snapshot; numeric values that are missing or 'N/A' are stored as NaN
+FLEET_SNAPSHOT_DTYPE = np.dtype([
+    ('instance_id', 'O'),
+    ('gpu_name', 'O'),
+    ('label', 'O'),
+    ('account', 'O'),
+    ('running', '?'),
+    ('stale', '?'),
+    ('num_gpus', 'f8'),
+    ('gpu_util', 'f8'),
+    ('dph_total', 'f8'),
+    ('cpu_util', 'f8'),
+    ('disk_util', 'f8'),
+    ('disk_space', 'f8'),
+    ('hash_rate', 'f8'),
+    ('normal_blocks', 'f8'),
+    ('runtime_hours', 'f8'),
+    ('difficulty', 'f8'),
+])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_fleet_snapshot(ssh_info_list, log_info_by_instance):
+    """Pack the instance list and the latest log information into a NumPy structured array."""
+    snapshot = np.empty(len(ssh_info_list), dtype=FLEET_SNAPSHOT_DTYPE)
+    for i, ssh_info in enumerate(ssh_info_list):
+        hours, minutes, seconds, _, normal_blocks, _, hash_rate, difficulty = log_info_by_instance.get(ssh_info['instance_id'], (None,) * 8)
+        snapshot[i] = (
+            ssh_info['instance_id'],
+            ssh_info['gpu_name'],
+            ssh_info['label'] if ssh_info['label'] is not None else '',
+            ssh_info.get('account') or '',
+            ssh_info['actual_status'] == 'running',
+            bool(ssh_info.get('stale')),
+            _to_float(ssh_info['num_gpus']),
+            _to_float(ssh_info['gpu_util']),
+            _to_float(ssh_info['dph_total']),
+            _to_float(ssh_info['cpu_util']),
+            _to_float(ssh_info['disk_util']),
+            _to_float(ssh_info['disk_space']),
+            _to_float(hash_rate),
+            _to_float(normal_blocks),
+            hours + minutes / 60 + seconds / 3600 if hours is not None else np.nan,
+            _to_float(difficulty),
+        )
+    return snapshot
+
+
+def compute_fleet_metrics(snapshot):
+    """Derive the per-instance table columns in vectorized passes.
+
+    Rows without log information keep NaN in every log-derived column; 'has_log' marks the others.
+    The fleet totals and GPU type stats are kept incrementally by FleetAggregator from the rows'
+    contributions, so they are not computed here.
+    """
+    dph_total = snapshot['dph_total']
+    hash_rate = snapshot['hash_rate']
+    normal_blocks = snapshot['normal_blocks']
+    runtime_hours = snapshot['runtime_hours']
+    has_log = ~np.isnan(normal_blocks)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        usd_per_gpu = dph_total / snapshot['num_gpus']
+        hash_rate_per_usd = hash_rate / dph_total
+        # Block/h and $/Block are 0 when runtime or the number of blocks is zero
+        normal_block_per_hour = np.where(runtime_hours != 0, normal_blocks / runtime_hours, 0.0)
+        dollars_per_normal_block = np.where(normal_blocks != 0, runtime_hours * dph_total / normal_blocks, 0.0)
+        hdd_utilization_percent = snapshot['disk_util'] / snapshot['disk_space'] * 100
+        hash_rate_per_gpu = np.where(hash_rate != 0, hash_rate / snapshot['num_gpus'], np.nan)
+    normal_block_per_hour[~has_log] = np.nan
+    dollars_per_normal_block[~has_log] = np.nan
+
+    return {
+        'has_log': has_log,
+        'usd_per_gpu': usd_per_gpu,
+        'hash_rate_per_usd': hash_rate_per_usd,
+        'normal_block_per_hour': normal_block_per_hour,
+        'dollars_per_normal_block': dollars_per_normal_block,
+        'hdd_utilization_percent': hdd_utilization_percent,
+        'hash_rate_per_gpu': hash_rate_per_gpu,
+        'low_gpu_util': snapshot['running'] & (snapshot['gpu_util'] < 85),
+    }
+
+
+def _table_value(value, digits=None):
+    """Render a numeric cell, using 'N/A' for missing values."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 'N/A'
+    if digits is None:
+        return value
+    return round(float(value), digits)
+
+
+def fleet_rows(snapshot, metrics):
+    """Yield (instance_id, table row or None, contribution) for every instance of a snapshot.
+
+    Instances get a row when they have log information or are stale; a stale instance that was
+    never read shows N/A in the log-derived columns. The contribution holds the values an
+    instance adds to the fleet totals and GPU type stats; a stale instance's last reading is
+    only shown, so it adds nothing.
+    """
+    for i in range(len(snapshot)):
+        row = snapshot[i]
+        table_row = None
+        if metrics['has_log'][i] or row['stale']:
+            table_row = [row['instance_id'], row['gpu_name'], int(row['num_gpus']) if not np.isnan(row['num_gpus']) else 'N/A',
+                         _table_value(row['gpu_util'], 2), _table_value(row['dph_total'], 4), _table_value(metrics['usd_per_gpu'][i], 4),
+                         _table_value(row['hash_rate']), _table_value(metrics['hash_rate_per_gpu'][i]), int(row['normal_blocks']) if metrics['has_log'][i] else 'N/A',
+                         _table_value(row['runtime_hours'], 2), _table_value(metrics['normal_block_per_hour'][i], 2),
+                         _table_value(metrics['hash_rate_per_usd'][i], 2), _table_value(metrics['dollars_per_normal_block'][i], 2),
+                         row['label'], _table_value(row['cpu_util'], 2), _table_value(metrics['hdd_utilization_percent'][i], 2),
+                         row['account']]
+        # Warning if instance is running but GPU not fully utilized
+        warning = None
+        if metrics['low_gpu_util'][i]:
+            warning = f"GPU Utilization for instance {row['instance_id']} is at {row['gpu_util']:.2f}% - Make sure XENGPUMiner is working!"
+        has_log = metrics['has_log'][i] and not row['stale']
+        contribution = {
+            'gpu_name': row['gpu_name'],
+            'difficulty': row['difficulty'] if has_log and row['difficulty'] != 0 and not np.isnan(row['difficulty']) else None,
+            'hash_rate': row['hash_rate'] if has_log and row['hash_rate'] != 0 and not np.isnan(row['hash_rate']) else None,
+            'dollars_per_normal_block': metrics['dollars_per_normal_block'][i] if has_log and row['normal_blocks'] != 0 else None,
+            'normal_block_per_hour': metrics['normal_block_per_hour'][i] if has_log and row['runtime_hours'] != 0 else None,
+            'hash_rate_per_gpu': metrics['hash_rate_per_gpu'][i] if has_log and not np.isnan(metrics['hash_rate_per_gpu'][i]) else None,
+            'warning': warning,
+        }
+        yield row['instance_id'], table_row, contribution
+
+
+class RunningStats:
+    """Welford mean/variance that also supports removing a previously added value."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - value) / self.count
+        self.m2 = max(self.m2 - (value - self.mean) * (value - old_mean), 0.0)
+
+    @property
+    def std_dev(self):
+        """Sample standard deviation (ddof=1)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class FleetAggregator:
+    """Fleet totals, per GPU type stats and a sorted table, updated one instance at a time.
+
+    Each instance update is O(1) for the totals and O(log n) for the sorted index, so in watch
+    mode only instances whose data changed are recomputed and nothing is re-sorted in full.
+    """
+
+    def __init__(self, sort_column_index=11, sort_order='ascending'):
+        self.sort_column_index = sort_column_index
+        self.sort_order = sort_order
+        self._inputs = {}          # instance_id -> (ssh_info, log_info) last fed
+        self._rows = {}            # instance_id -> table row
+        self._contributions = {}   # instance_id -> contribution to the totals
+        self._sorted = []          # sorted list of (sort key, instance_id)
+        self._sort_keys = {}       # instance_id -> sort key
+        self.difficulty_sum = 0.0
+        self.difficulty_count = 0
+        self.total_hash_rate = 0.0
+        self.dollars_per_normal_block_sum = 0.0
+        self.dollars_per_normal_block_count = 0
+        self.sum_normal_block_per_hour = 0.0
+        self.gpu_stats = defaultdict(RunningStats)
+        self._sort_index_warned = False
+
+    def _sort_key(self, row):
+        value = row[self.sort_column_index] if 0 <= self.sort_column_index < len(row) else None
+        if value in (None, 'N/A'):
+            return (0, float('-inf'), '')
+        try:
+            return (0, float(value), '')
+        except (TypeError, ValueError):
+            # Fallback to string sorting if conversion to float is not possible
+            return (1, 0.0, str(value))
+
+    def _apply(self, contribution, sign):
+        if contribution['difficulty'] is not None:
+            self.difficulty_sum += sign * contribution['difficulty']
+            self.difficulty_count += sign
+        if contribution['hash_rate'] is not None:
+            self.total_hash_rate += sign * contribution['hash_rate']
+        if contribution['dollars_per_normal_block'] is not None:
+            self.dollars_per_normal_block_sum += sign * contribution['dollars_per_normal_block']
+            self.dollars_per_normal_block_count += sign
+        if contribution['normal_block_per_hour'] is not None:
+            self.sum_normal_block_per_hour += sign * contribution['normal_block_per_hour']
+        if contribution['hash_rate_per_gpu'] is not None:
+            stats = self.gpu_stats[contribution['gpu_name']]
+            if sign > 0:
+                stats.add(contribution['hash_rate_per_gpu'])
+            else:
+                stats.remove(contribution['hash_rate_per_gpu'])
+                if stats.count == 0:
+                    del self.gpu_stats[contribution['gpu_name']]
+
+    def remove(self, instance_id):
+        self._inputs.pop(instance_id, None)
+        contribution = self._contributions.pop(instance_id, None)
+        if contribution is not None:
+            self._apply(contribution, -1)
+        if self._rows.pop(instance_id, None) is not None:
+            entry = (self._sort_keys.pop(instance_id), instance_id)
+            del self._sorted[bisect.bisect_left(self._sorted, entry)]
+
+    def update(self, instance_id, row, contribution):
+        """Replace one instance's table row and contribution."""
+        self.remove(instance_id)
+        self._contributions[instance_id] = contribution
+        self._apply(contribution, +1)
+        if row is not None:
+            self._rows[instance_id] = row
+            key = self._sort_key(row)
+            self._sort_keys[instance_id] = key
+            bisect.insort(self._sorted, (key, instance_id))
+
+    def sync(self, ssh_info_list, log_info_by_instance):
+        """Feed the current instance list and log information, recomputing only what changed."""
+        current_ids = set()
+        changed = []
+        for ssh_info in ssh_info_list:
+            instance_id = ssh_info['instance_id']
+            current_ids.add(instance_id)
+            inputs = (ssh_info, log_info_by_instance.get(instance_id, (None,) * 8))
+            if self._inputs.get(instance_id) != inputs:
+                changed.append(ssh_info)
+        for instance_id in list(self._inputs):
+            if instance_id not in current_ids:
+                self.remove(instance_id)
+        if not changed:
+            return
+        snapshot = build_fleet_snapshot(changed, log_info_by_instance)
+        metrics = compute_fleet_metrics(snapshot)
+        for ssh_info, (instance_id, row, contribution) in zip(changed, fleet_rows(snapshot, metrics)):
+            self.update(instance_id, row, contribution)
+            self._inputs[instance_id] = (ssh_info, log_info_by_instance.get(instance_id, (None,) * 8))
+
+    @property
+    def mean_difficulty(self):
+        return self.difficulty_sum / self.difficulty_count if self.difficulty_count else None
+
+    @property
+    def average_dollars_per_normal_block(self):
+        return self.dollars_per_normal_block_sum / self.dollars_per_normal_block_count if self.dollars_per_normal_block_count else None
+
+    @property
+    def gpu_util_warnings(self):
+        return {c['warning'] for c in self._contributions.values() if c['warning'] is not None}
+
+    @property
+    def low_gpu_util_instances(self):
+        return {instance_id for instance_id, c in self._contributions.items() if c['warning'] is not None}
+
+    def instances_without_log(self):
+        return [instance_id for instance_id in self._contributions if instance_id not in self._rows]
+
+    def table_data(self):
+        """Table rows in the configured sort order."""
+        if self._rows and not self._sort_index_warned and not 0 <= self.sort_column_index < len(next(iter(self._rows.values()))):
+            # Logged once: table_data() runs on every render and the dashboard owns the terminal
+            logger.warning("Invalid sort_column_index: %s. Must be between 0 and %s.", self.sort_column_index, len(next(iter(self._rows.values()))) - 1)
+            self._sort_index_warned = True
+        ordered = (self._rows[instance_id] for _, instance_id in self._sorted)
+        if self.sort_order == 'descending':
+            ordered = reversed(list(ordered))
+        return list(ordered)
+
+
+def account_summaries(table_data, ssh_info_list, accounts):
+    """Totals and per GPU type stats of every account in 'accounts', in one pass over the instances and the table.
+
+    Rows of stale instances are shown with their last reading, which is not counted.
+    """
+    summaries = {account: {'total_dph': 0.0, 'total_gpus': 0, 'total_hash_rate': 0.0, 'sum_normal_block_per_hour': 0.0,
+                           'gpu_stats': defaultdict(RunningStats)}
+                 for account in accounts}
+    stale = set()
+    for ssh_info in ssh_info_list:
+        if ssh_info.get('stale'):
+            stale.add(ssh_info['instance_id'])
+        summary = summaries.get(ssh_info.get('account') or '')
+        if summary is not None and str(ssh_info['actual_status']).lower() == 'running':
+            summary['total_dph'] += float(ssh_info['dph_total'])
+            summary['total_gpus'] += int(ssh_info['num_gpus'])
+    for row in table_data:
+        summary = summaries.get(row[16])
+        if summary is None or row[0] in stale:
+            continue
+        if row[6] != 'N/A':
+            summary['total_hash_rate'] += float(row[6])
+        if row[10] != 'N/A':
+            summary['sum_normal_block_per_hour'] += float(row[10])
+        if row[7] != 'N/A':
+            summary['gpu_stats'][row[1]].add(float(row[7]))
+    for summary in summaries.values():
+        summary['gpu_stats'] = {gpu_type: {"mean": stats.mean, "std_dev": stats.std_dev, "count": stats.count}
+                                for gpu_type, stats in summary['gpu_stats'].items()}
+    return summaries
+
+
+def aggregate_fleet(ssh_info_list, log_info_by_instance, aggregator=None, sort_column_index=11, sort_order='ascending'):
+    """Combine the instance list with the collected log information into table rows and fleet totals.
+
+    The sort settings are only used when no aggregator is passed in.
+    """
+    if aggregator is None:
+        aggregator = FleetAggregator(sort_column_index, sort_order)
+    aggregator.sync(ssh_info_list, log_info_by_instance)
+
+    # Instances that are not running are not polled, so missing log information is only an error for running ones
+    running_ids = {ssh_info['instance_id'] for ssh_info in ssh_info_list if str(ssh_info['actual_status']).lower() == 'running'}
+    for instance_id in aggregator.instances_without_log():
+        if instance_id in running_ids:
+            logger.error("Failed to retrieve log information or normal blocks is None for instance ID: %s", instance_id)
+    if aggregator.mean_difficulty is None:
+        logger.info("No valid difficulties were found.")
+    if aggregator.average_dollars_per_normal_block is None:
+        logger.info("No valid $/Block values were found.")
+
+    return {
+        'table_data': aggregator.table_data(),
+        'gpu_stats': {gpu_type: {"mean": stats.mean, "std_dev": stats.std_dev, "count": stats.count}
+                      for gpu_type, stats in aggregator.gpu_stats.items()},
+        'gpu_util_warnings': aggregator.gpu_util_warnings,
+        'low_gpu_util_instances': aggregator.low_gpu_util_instances,
+        'mean_difficulty': aggregator.mean_difficulty,
+        'average_dollars_per_normal_block': aggregator.average_dollars_per_normal_block,
+        'sum_normal_block_per_hour': aggregator.sum_normal_block_per_hour,
+        'total_hash_rate': aggregator.total_hash_rate,
+    }
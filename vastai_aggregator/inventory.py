@@ -0,0 +1,110 @@
+"""Instance list cache with a TTL, last-known-good fallback and change events."""
+import json
+import logging
+import os
+import time
+
+from .api import fetch_instance_list
+from .records import InstanceRecord
+
+logger = logging.getLogger(__name__)
+
+
+class InstanceInventory:
+    """Instance list cached in memory and on disk, with a TTL and change detection.
+
+    refresh() only calls the API once the cached list is older than 'ttl' seconds. Each new list is
+    diffed against the cached one and listeners are called with ('added' | 'removed' | 'changed',
+    old ssh_info, new ssh_info). 'changed' only fires when a field that matters for the SSH
+    connection changes, not for utilization updates. When the API call fails, the last-known-good
+    list is returned. With log_instances False, downloaded instances are not logged one by one.
+    """
+
+    CONNECTION_FIELDS = ('ssh_host', 'ssh_port', 'actual_status', 'gpu_name', 'num_gpus')
+
+    def __init__(self, path=None, ttl=120, log_instances=True):
+        self.path = path
+        self.ttl = ttl
+        self.log_instances = log_instances
+        self.fetched_at = None  # unix time of the last successful download
+        self.ssh_info_list = []
+        self._listeners = []
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                cached = json.load(f)
+            self.ssh_info_list = [InstanceRecord.from_dict(ssh_info) for ssh_info in cached['instances']]
+            self.fetched_at = cached['fetched_at']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable inventory cache '%s': %s", self.path, e)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'fetched_at': self.fetched_at, 'instances': [dict(ssh_info) for ssh_info in self.ssh_info_list]}, f)
+        os.replace(tmp_path, self.path)
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at if self.fetched_at is not None else None
+
+    def totals(self):
+        """Total DPH and number of GPUs of the running instances."""
+        total_dph_running_machines = 0
+        total_gpus_running = 0
+        for ssh_info in self.ssh_info_list:
+            if str(ssh_info['actual_status']).lower() == 'running':
+                total_dph_running_machines += float(ssh_info['dph_total'])
+                total_gpus_running += int(ssh_info['num_gpus'])
+        return total_dph_running_machines, total_gpus_running
+
+    def diff(self, new_ssh_info_list):
+        """Return (kind, old, new) events between the cached list and a new one."""
+        old_by_id = {ssh_info['instance_id']: ssh_info for ssh_info in self.ssh_info_list}
+        new_by_id = {ssh_info['instance_id']: ssh_info for ssh_info in new_ssh_info_list}
+        events = []
+        for instance_id, new in new_by_id.items():
+            old = old_by_id.get(instance_id)
+            if old is None:
+                events.append(('added', None, new))
+            elif any(old.get(field) != new.get(field) for field in self.CONNECTION_FIELDS):
+                events.append(('changed', old, new))
+        for instance_id, old in old_by_id.items():
+            if instance_id not in new_by_id:
+                events.append(('removed', old, None))
+        return events
+
+    def refresh(self, client, force=False):
+        """Return (ssh_info_list, total_dph_running_machines, total_gpus_running), downloading if stale."""
+        if not force and self.fetched_at is not None and self.age < self.ttl:
+            logger.info("Using cached instance list (%.0f seconds old).", self.age)
+            return (self.ssh_info_list,) + self.totals()
+
+        result = fetch_instance_list(client, self.log_instances)
+        if result is None:
+            if self.fetched_at is not None:
+                logger.warning("Failed to refresh the instance list, using the last known one from %.0f seconds ago.", self.age)
+            return (self.ssh_info_list,) + self.totals()
+
+        new_ssh_info_list = result[0]
+        events = self.diff(new_ssh_info_list)
+        self.ssh_info_list = new_ssh_info_list
+        self.fetched_at = time.time()
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning("Failed to write inventory cache '%s': %s", self.path, e)
+        for kind, old, new in events:
+            logger.info("Instance %s %s.", (new or old)['instance_id'], kind)
+            for callback in self._listeners:
+                callback(kind, old, new)
+        return result
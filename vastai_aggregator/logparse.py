@@ -0,0 +1,94 @@
+"""Parsing of XENGPUMiner 'Mining:' progress lines from miner.log."""
+import re
+import time
+from collections import namedtuple
+
+
+# Log parsing patterns, compiled once (str and bytes variants)
+ANSI_ESCAPE_PATTERN = r'\x1B[@-_][0-?]*[ -/]*[@-~]'
+MINING_LINE_PATTERN = r'Mining:.*\[(?:(\d+):)?(\d+):(\d+)(?:\.\d+)?,.*?(?:Details=(?:(?:super:(\d+)\s)?normal:(\d+)|xuni:(\d+)).*?)?HashRate:(\d+\.\d+).*Difficulty=(\d+)'
+ANSI_ESCAPE_RE = re.compile(ANSI_ESCAPE_PATTERN, re.IGNORECASE)
+ANSI_ESCAPE_BYTES_RE = re.compile(ANSI_ESCAPE_PATTERN.encode(), re.IGNORECASE)
+MINING_LINE_RE = re.compile(MINING_LINE_PATTERN)
+MINING_LINE_BYTES_RE = re.compile(MINING_LINE_PATTERN.encode())
+
+
+# Function to remove ANSI escape codes
+def clean_ansi_codes(input_string):
+    if isinstance(input_string, bytes):
+        return ANSI_ESCAPE_BYTES_RE.sub(b'', input_string)
+    return ANSI_ESCAPE_RE.sub('', input_string)
+
+
+class MiningSample(namedtuple('MiningSample', ['hours', 'minutes', 'seconds', 'super_blocks', 'normal_blocks', 'xuni_blocks', 'hash_rate', 'difficulty'])):
+    """One parsed 'Mining:' progress line. Unpacks like the tuple returned by get_log_info()."""
+    __slots__ = ()
+
+    @property
+    def runtime_hours(self):
+        return self.hours + self.minutes / 60 + self.seconds / 3600
+
+
+def _sample_from_match(match):
+    hours, minutes, seconds, super_blocks, normal_blocks, xuni_blocks, hash_rate, difficulty = match.groups()
+    return MiningSample(int(hours) if hours is not None else 0,
+                        int(minutes),
+                        int(seconds),
+                        int(super_blocks) if super_blocks is not None else 0,
+                        int(normal_blocks) if normal_blocks is not None else 0,
+                        int(xuni_blocks) if xuni_blocks is not None else 0,
+                        float(hash_rate),
+                        int(difficulty))
+
+
+def parse_log_lines(lines):
+    """Parse many log lines (str or bytes) and yield a MiningSample for every progress line."""
+    for line in lines:
+        if isinstance(line, bytes):
+            if b'Difficulty=' not in line:
+                continue
+            if b'\x1b' in line:
+                line = ANSI_ESCAPE_BYTES_RE.sub(b'', line)
+            match = MINING_LINE_BYTES_RE.search(line)
+        else:
+            if 'Difficulty=' not in line:
+                continue
+            if '\x1b' in line:
+                line = ANSI_ESCAPE_RE.sub('', line)
+            match = MINING_LINE_RE.search(line)
+        if match:
+            yield _sample_from_match(match)
+
+
+def parse_log_buffer(buffer):
+    """Parse a raw miner.log byte buffer; lines may be separated by newlines or carriage returns."""
+    # bytes.splitlines() splits on \n, \r and \r\n, which covers tqdm's carriage-return updates
+    return parse_log_lines(buffer.splitlines())
+
+
+def parse_log_line(line):
+    """Parse a single 'Mining:' progress line.
+
+    Returns a MiningSample (hours, minutes, seconds, super_blocks, normal_blocks, xuni_blocks, hash_rate, difficulty) or None.
+    """
+    return next(parse_log_lines([line]), None)
+
+
+def benchmark_parser(log_file=None, num_lines=200000):
+    """Measure parser throughput on a log file, or on synthetic miner lines when no file is given."""
+    if log_file:
+        with open(log_file, 'rb') as f:
+            buffer = f.read()
+    else:
+        line = (b"\x1b[32mMining\x1b[0m: 1234 Blocks [12:34:56, 1.23 Blocks/s, "
+                b"Details=super:1 normal:42 xuni:3, HashRate:1234.56, Difficulty=120000]")
+        noise = b"\x1b[33mSome other miner output that is not a progress line\x1b[0m"
+        buffer = b"\r".join(line if i % 10 else noise for i in range(num_lines))
+
+    start = time.perf_counter()
+    total_lines = len(buffer.splitlines())
+    samples = sum(1 for _ in parse_log_buffer(buffer))
+    elapsed = time.perf_counter() - start
+
+    print(f"Parsed {total_lines} lines ({len(buffer) / 1e6:.1f} MB), {samples} samples in {elapsed:.3f}s")
+    print(f"Throughput: {total_lines / elapsed:,.0f} lines/sec, {len(buffer) / 1e6 / elapsed:.1f} MB/sec")
@@ -0,0 +1,200 @@
+"""In-process instrumentation: histograms, counters and gauges with Prometheus and JSON export."""
+import bisect
+import contextlib
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters, gauges and histograms, exportable as Prometheus text or JSON.
+
+    Metrics are created on first use; labels are passed as keyword arguments.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._values = defaultdict(dict)  # name -> {labels tuple: value or Histogram}
+
+    def describe(self, name, metric_type, help_text):
+        self._types[name] = metric_type
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            self._values[name][key] = self._values[name].get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'gauge')
+            self._values[name][key] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, 'histogram')
+            histogram = self._values[name].get(key)
+            if histogram is None:
+                histogram = self._values[name][key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        """Observe the wall time of the with-block into a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{str(v)}"' for k, v in pairs) + '}'
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                metric_type = self._types.get(name, 'untyped')
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in sorted(self._values[name].items()):
+                    if isinstance(value, Histogram):
+                        for le, count in zip(value.buckets, value.cumulative_counts()):
+                            lines.append(f"{name}_bucket{self._format_labels(labels, [('le', le)])} {count}")
+                        lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {value.count}")
+                        lines.append(f"{name}_sum{self._format_labels(labels)} {value.sum}")
+                        lines.append(f"{name}_count{self._format_labels(labels)} {value.count}")
+                    elif value is not None:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        result = {}
+        with self._lock:
+            for name, series in self._values.items():
+                entries = []
+                for labels, value in series.items():
+                    entry = {'labels': dict(labels)}
+                    if isinstance(value, Histogram):
+                        entry.update({'count': value.count, 'sum': value.sum,
+                                      'mean': value.sum / value.count if value.count else None,
+                                      'buckets': dict(zip(map(str, value.buckets), value.cumulative_counts()))})
+                    else:
+                        entry['value'] = value
+                    entries.append(entry)
+                result[name] = {'type': self._types.get(name), 'help': self._help.get(name), 'series': entries}
+        return result
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+METRICS = MetricsRegistry()
+METRICS.describe('vastai_api_request_seconds', 'histogram', 'Latency of Vast.ai API requests, including retries.')
+METRICS.describe('vastai_ssh_handshake_seconds', 'histogram', 'Time to connect and authenticate a new SSH transport.')
+METRICS.describe('vastai_ssh_exec_seconds', 'histogram', 'Time to run the remote log command on an instance.')
+METRICS.describe('vastai_log_parse_seconds', 'histogram', 'Time to parse the new log bytes of one instance.')
+METRICS.describe('vastai_collect_seconds', 'histogram', 'Wall time of one log collection pass over the fleet.')
+METRICS.describe('vastai_render_seconds', 'histogram', 'Time to aggregate and print the report.')
+METRICS.describe('vastai_failures_total', 'counter', 'Failures by kind (auth, timeout, connection_refused, missing_log, parse, ssh_error, rate_limited, api_error).')
+METRICS.describe('vastai_polls_total', 'counter', 'Instances polled over SSH in watch mode.')
+METRICS.describe('vastai_polls_skipped_total', 'counter', 'Running instances not polled in a watch cycle because their adaptive interval had not elapsed.')
+METRICS.describe('vastai_open_circuits', 'gauge', 'Hosts skipped in the last collection because their circuit breaker is open.')
+METRICS.describe('vastai_stream_channels', 'gauge', 'Open log stream channels in --stream mode.')
+METRICS.describe('vastai_stream_resubscriptions_total', 'counter', 'Log streams reopened after they closed or failed to open.')
+METRICS.describe('vastai_outlier_alerts_total', 'counter', 'Instances that stayed below their GPU type average for outlier_sustain samples.')
+METRICS.describe('vastai_fleet_hash_rate', 'gauge', 'Total hash rate of the fleet in H/s.')
+METRICS.describe('vastai_fleet_dph', 'gauge', 'Total dollars per hour of the running instances.')
+METRICS.describe('vastai_fleet_blocks_per_hour', 'gauge', 'Sum of normal blocks per hour.')
+METRICS.describe('vastai_fleet_usd_per_block', 'gauge', 'Average dollars per normal block.')
+METRICS.describe('vastai_balance_usd', 'gauge', 'Vast.ai account balance.')
+METRICS.describe('vastai_balance_runway_hours', 'gauge', 'Hours the balance lasts at the current total DPH.')
+
+
+def classify_ssh_error(error):
+    """Failure kind of an exception raised while collecting from an instance."""
+    import paramiko
+
+    if isinstance(error, paramiko.ssh_exception.AuthenticationException):
+        return 'auth'
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, ConnectionRefusedError) or isinstance(error, paramiko.ssh_exception.NoValidConnectionsError):
+        return 'connection_refused'
+    if isinstance(error, (FileNotFoundError, PermissionError, IsADirectoryError)):
+        # A missing remote log is reported by the probe itself; only the local private key file can be missing
+        return 'config'
+    return 'ssh_error'
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=None):
+    """Serve a registry (METRICS by default) at /metrics (Prometheus text) and /metrics.json
+    from a background thread and return the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = METRICS if registry is None else registry
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith('/metrics.json'):
+                body, content_type = json.dumps(registry.to_dict()).encode(), 'application/json'
+            elif self.path.startswith('/metrics'):
+                body, content_type = registry.render_prometheus().encode(), 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Metrics available at http://%s:%s/metrics", host, server.server_port)
+    return server
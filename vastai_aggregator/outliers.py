@@ -0,0 +1,141 @@
+"""Online outlier detection on per-GPU hash rates, grouped by GPU type."""
+import logging
+from collections import defaultdict
+
+from .fleet import RunningStats
+
+logger = logging.getLogger(__name__)
+
+
+class EwmaStats:
+    """Exponentially weighted mean; 'window' is the span in samples.
+
+    Outliers are judged by the spread of the smoothed rates within a GPU type, so no
+    per-instance variance is kept.
+    """
+
+    __slots__ = ('alpha', 'count', 'mean')
+
+    def __init__(self, window=10):
+        self.alpha = 2 / (max(1, window) + 1)
+        self.count = 0
+        self.mean = 0.0
+
+    def add(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        self.mean += self.alpha * (value - self.mean)
+
+
+class OutlierDetector:
+    """Rolling per-instance and per-GPU-type statistics of the per-GPU hash rate.
+
+    Every instance keeps an EWMA of its own per-GPU hash rate over 'window' samples, and every
+    GPU type keeps the mean and standard deviation of its instances' smoothed rates. Adding a
+    sample is O(1): the instance's old smoothed rate is swapped for the new one in its group.
+    An instance is an outlier while its smoothed rate is more than 'threshold' standard
+    deviations below its group's mean; after 'sustain' samples in a row it raises an alert, so
+    that a single bad poll does not.
+    """
+
+    def __init__(self, threshold=1, window=10, sustain=3):
+        self.threshold = threshold
+        self.window = window
+        self.sustain = sustain
+        self._instances = {}                 # instance_id -> {'gpu_type', 'stats', 'streak', 'last_sample'}
+        self._groups = defaultdict(RunningStats)
+        self._members = defaultdict(set)     # gpu_type -> instance IDs
+
+    def remove(self, instance_id):
+        entry = self._instances.pop(instance_id, None)
+        if entry is None:
+            return
+        gpu_type = entry['gpu_type']
+        self._groups[gpu_type].remove(entry['stats'].mean)
+        self._members[gpu_type].discard(instance_id)
+        if not self._members[gpu_type]:
+            del self._members[gpu_type]
+            del self._groups[gpu_type]
+
+    def z_score(self, instance_id):
+        """Z-score of the instance's smoothed rate within its GPU type, or None without enough data."""
+        entry = self._instances.get(instance_id)
+        if entry is None:
+            return None
+        group = self._groups[entry['gpu_type']]
+        std_dev = group.std_dev
+        if group.count < 2 or std_dev <= 0:
+            return None
+        return (entry['stats'].mean - group.mean) / std_dev
+
+    def observe(self, instance_id, gpu_type, value):
+        """Add one per-GPU hash rate sample; returns an alert tuple (instance_id, gpu_type, rate, z_score)
+        when the instance has just been below its group for 'sustain' samples in a row, else None."""
+        entry = self._instances.get(instance_id)
+        if entry is not None and entry['gpu_type'] != gpu_type:
+            self.remove(instance_id)
+            entry = None
+        if entry is None:
+            entry = self._instances[instance_id] = {'gpu_type': gpu_type, 'stats': EwmaStats(self.window), 'streak': 0,
+                                                    'last_sample': None}
+            self._members[gpu_type].add(instance_id)
+        else:
+            self._groups[gpu_type].remove(entry['stats'].mean)
+        entry['stats'].add(value)
+        self._groups[gpu_type].add(entry['stats'].mean)
+
+        z_score = self.z_score(instance_id)
+        entry['streak'] = entry['streak'] + 1 if z_score is not None and z_score < -self.threshold else 0
+        if entry['streak'] == self.sustain:
+            return instance_id, gpu_type, entry['stats'].mean, z_score
+        return None
+
+    def observe_fleet(self, ssh_info_list, log_info_by_instance, probes=None):
+        """Feed the samples of a poll that were not seen before and forget instances that are gone.
+
+        Stale samples (from a failed poll) are skipped. Returns the alerts raised.
+        """
+        alerts = []
+        listed = set()
+        for ssh_info in ssh_info_list:
+            instance_id = ssh_info['instance_id']
+            listed.add(instance_id)
+            sample = log_info_by_instance.get(instance_id)
+            if sample is None or sample[6] is None or (probes and instance_id in probes and probes[instance_id].error is not None):
+                continue
+            entry = self._instances.get(instance_id)
+            if entry is not None and entry['last_sample'] == sample:
+                continue
+            try:
+                value = sample[6] / float(ssh_info['num_gpus'])
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+            alert = self.observe(instance_id, ssh_info['gpu_name'], value)
+            self._instances[instance_id]['last_sample'] = sample
+            if alert is not None:
+                alerts.append(alert)
+        for instance_id in list(self._instances):
+            if instance_id not in listed:
+                self.remove(instance_id)
+        return alerts
+
+    def group_stats(self):
+        """{gpu_type: {"mean", "std_dev", "count"}} of the instances' smoothed per-GPU rates."""
+        return {gpu_type: {"mean": stats.mean, "std_dev": stats.std_dev, "count": stats.count}
+                for gpu_type, stats in self._groups.items()}
+
+    def outliers(self):
+        """{gpu_type: [(instance_id, smoothed rate, z_score, streak), ...]} of instances below the threshold."""
+        result = {}
+        for gpu_type, members in self._members.items():
+            below = []
+            for instance_id in members:
+                z_score = self.z_score(instance_id)
+                if z_score is not None and z_score < -self.threshold:
+                    entry = self._instances[instance_id]
+                    below.append((instance_id, entry['stats'].mean, z_score, entry['streak']))
+            if below:
+                result[gpu_type] = sorted(below, key=lambda outlier: outlier[2])
+        return result
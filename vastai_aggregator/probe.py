@@ -0,0 +1,172 @@
+"""Single remote command per poll returning the new log bytes and host metrics of an instance.
+
+The output is a few '@@'-tagged sections, with the raw miner.log bytes last so that they can
+contain anything:
+
+    @@gpu
+    0, 98, 61, 287.51, 2520, 10501, 1234, 24564      (nvidia-smi CSV, or 'unavailable')
+    @@miner 1                                        (number of miner processes)
+    @@disk /dev/sda1 52403200 20971520 31431680 41% /  (df -Pk of the log folder)
+    @@log <inode> <size> <start>                     (or '@@log missing')
+    <log bytes from <start> onwards>
+"""
+from collections import namedtuple
+
+GPU_QUERY_FIELDS = ('index', 'utilization.gpu', 'temperature.gpu', 'power.draw', 'clocks.sm', 'clocks.mem',
+                    'memory.used', 'memory.total')
+
+
+class GpuStatus(namedtuple('GpuStatus', ['index', 'utilization', 'temperature', 'power_draw', 'sm_clock', 'memory_clock',
+                                        'memory_used', 'memory_total'])):
+    """One GPU as reported by nvidia-smi in percent, degrees C, watts, MHz and MiB; None where not supported."""
+    __slots__ = ()
+
+
+DiskUsage = namedtuple('DiskUsage', ['total_bytes', 'used_bytes'])
+
+
+class ProbeResult(namedtuple('ProbeResult', ['sample', 'gpus', 'miner_processes', 'disk', 'error'], defaults=(None,))):
+    """Everything one poll learned about an instance.
+
+    'sample' is the tuple returned by get_log_info(); 'gpus' is a list of GpuStatus or None when
+    nvidia-smi is not available; 'miner_processes' and 'disk' are None when they could not be read.
+    'error' is the failure kind (auth, timeout, connection_refused, missing_log, parse, ssh_error,
+    or config for a local problem such as an unreadable private key) when the poll failed. A failed result is stale; it may still carry the last known sample.
+    """
+    __slots__ = ()
+
+    @property
+    def stale(self):
+        return self.error is not None
+
+    @property
+    def gpu_utilization(self):
+        """Mean utilization over the GPUs that report it, or None."""
+        values = [gpu.utilization for gpu in self.gpus or () if gpu.utilization is not None]
+        return sum(values) / len(values) if values else None
+
+
+EMPTY_PROBE = ProbeResult((None,) * 8, None, None, None)
+
+
+def _grep_pattern(process_pattern):
+    """Basic regex for a literal process name that does not match its own text, e.g. '[m]iner\\.py'."""
+    escaped = ''.join('\\' + c if c in '.*[]^$\\' else c for c in process_pattern[1:])
+    return f"[{process_pattern[0]}]{escaped}"
+
+
+def build_probe_command(cursor, log_path, initial_bytes, max_bytes, process_pattern='miner.py'):
+    """Shell command printing the probe sections described in the module docstring.
+
+    Log reading continues at the cursor offset while the inode is unchanged and the file has not
+    shrunk; otherwise (first poll, rotation or truncation) only the last 'initial_bytes' are read.
+    Every part degrades to a placeholder instead of failing when a tool or the log is missing.
+    """
+    inode = cursor['inode'] if cursor['inode'] is not None else -1
+    return (f"f='{log_path}'; "
+            f"echo '@@gpu'; nvidia-smi --query-gpu={','.join(GPU_QUERY_FIELDS)} --format=csv,noheader,nounits 2>/dev/null || echo unavailable; "
+            f"echo \"@@miner $(grep -las '{_grep_pattern(process_pattern)}' /proc/[0-9]*/cmdline | wc -l)\"; "
+            f"echo \"@@disk $(df -Pk \"$(dirname \"$f\")\" 2>/dev/null | tail -n 1)\"; "
+            f"if s=$(stat -c '%i %s' \"$f\" 2>/dev/null); then set -- $s; "
+            f"if [ \"$1\" = '{inode}' ] && [ \"$2\" -ge {cursor['offset']} ]; then start={cursor['offset']}; "
+            f"else start=$(( $2 > {initial_bytes} ? $2 - {initial_bytes} : 0 )); fi; "
+            f"echo \"@@log $1 $2 $start\"; tail -c +$((start + 1)) \"$f\" | head -c {max_bytes}; "
+            f"else echo '@@log missing'; fi")
+
+
+def _number(value, kind=float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        # nvidia-smi prints '[N/A]' or '[Not Supported]' for fields a GPU does not have
+        return None
+
+
+def parse_gpu_lines(lines):
+    """GpuStatus for every nvidia-smi CSV line, or None if nvidia-smi was unavailable."""
+    if not lines or lines[0].strip() == 'unavailable':
+        return None
+    gpus = []
+    for line in lines:
+        values = [value.strip() for value in line.split(',')]
+        if len(values) != len(GPU_QUERY_FIELDS):
+            continue
+        gpus.append(GpuStatus(_number(values[0], int), *(_number(value) for value in values[1:])))
+    return gpus
+
+
+def parse_disk_line(line):
+    """DiskUsage from a 'df -Pk' line, or None."""
+    fields = line.split()
+    if len(fields) < 6:
+        return None
+    total_kb, used_kb = _number(fields[1], int), _number(fields[2], int)
+    if total_kb is None or used_kb is None:
+        return None
+    return DiskUsage(total_kb * 1024, used_kb * 1024)
+
+
+def parse_probe_output(output):
+    """Split the probe output into (gpus, miner_processes, disk, log header fields or None, log bytes)."""
+    head, _, log_part = output.partition(b'@@log')
+    log_header, _, log_data = log_part.partition(b'\n')
+    log_header = log_header.decode(errors='replace').split()
+    if not log_header or log_header[0] == 'missing':
+        log_header = None
+
+    gpu_lines, miner_processes, disk = [], None, None
+    section = None
+    for line in head.decode(errors='replace').splitlines():
+        if line.startswith('@@gpu'):
+            section = 'gpu'
+        elif line.startswith('@@miner'):
+            section = None
+            miner_processes = _number(line[len('@@miner'):].strip(), int)
+        elif line.startswith('@@disk'):
+            section = None
+            disk = parse_disk_line(line[len('@@disk'):])
+        elif section == 'gpu' and line.strip():
+            gpu_lines.append(line)
+    return parse_gpu_lines(gpu_lines), miner_processes, disk, log_header, log_data
+
+
+def merge_probe_results(ssh_info_list, probes):
+    """Copy of the instance list with GPU and disk utilization replaced by the fresher probe readings.
+
+    The Vast.ai API snapshot lags behind; fields the probe could not read keep the API value.
+    Instances whose poll failed get the failure kind appended to their label and set as 'stale',
+    so that they are shown even when no sample was ever read from them.
+    Disk usage is expressed in GB like the API's 'disk_util' and 'disk_space'.
+    """
+    merged = []
+    for ssh_info in ssh_info_list:
+        probe = probes.get(ssh_info['instance_id'])
+        if probe is None:
+            merged.append(ssh_info)
+            continue
+        ssh_info = ssh_info.copy()
+        if probe.stale:
+            ssh_info['label'] = f"{ssh_info['label'] or ''} [stale: {probe.error}]".strip()
+            ssh_info['stale'] = probe.error
+        if probe.gpu_utilization is not None:
+            ssh_info['gpu_util'] = probe.gpu_utilization
+        if probe.disk is not None and probe.disk.total_bytes:
+            ssh_info['disk_util'] = probe.disk.used_bytes / 1e9
+            ssh_info['disk_space'] = probe.disk.total_bytes / 1e9
+        merged.append(ssh_info)
+    return merged
+
+
+def probe_warnings(instance_id, probe, low_utilization=85):
+    """Human readable problems spotted in one instance's probe: stopped miner and idle GPUs."""
+    warnings = []
+    if probe.miner_processes == 0:
+        warnings.append(f"XENGPUMiner is not running on instance {instance_id}!")
+    gpus = probe.gpus or []
+    if len(gpus) > 1:
+        # In a multi-GPU box, point at the GPU that lags instead of the instance average
+        for gpu in gpus:
+            if gpu.utilization is not None and gpu.utilization < low_utilization:
+                warnings.append(f"GPU {gpu.index} of instance {instance_id} is at {gpu.utilization:.0f}% utilization "
+                                f"({gpu.temperature or 'N/A'} C, {gpu.power_draw or 'N/A'} W, {gpu.sm_clock or 'N/A'} MHz).")
+    return warnings
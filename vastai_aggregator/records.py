@@ -0,0 +1,80 @@
+"""Compact records for instances and stored samples."""
+from collections import namedtuple
+from collections.abc import Mapping
+
+
+class InstanceRecord(Mapping):
+    """One instance of the instance list, holding only the fields the aggregator uses.
+
+    A slotted object takes a fraction of the memory of the equivalent dict, which matters when
+    thousands of instances are kept across polls. It still reads like the ssh_info dicts it
+    replaces (record['ssh_host'], record.get('account'), dict(record)), and fields can be
+    assigned on a copy(). 'stale' is the failure kind of an instance whose poll failed, set by
+    merge_probe_results().
+    """
+
+    __slots__ = ('instance_id', 'gpu_name', 'dph_total', 'ssh_host', 'ssh_port', 'num_gpus', 'gpu_util',
+                 'actual_status', 'label', 'disk_util', 'disk_space', 'cpu_util', 'account', 'stale')
+
+    # API field name of every attribute that is read from the instances response
+    API_FIELDS = {'instance_id': 'id', 'gpu_name': 'gpu_name', 'dph_total': 'dph_total', 'ssh_host': 'ssh_host',
+                  'ssh_port': 'ssh_port', 'num_gpus': 'num_gpus', 'gpu_util': 'gpu_util',
+                  'actual_status': 'actual_status', 'label': 'label', 'disk_util': 'disk_util',
+                  'disk_space': 'disk_space', 'cpu_util': 'cpu_util'}
+
+    def __init__(self, instance_id='N/A', gpu_name='N/A', dph_total='N/A', ssh_host='N/A', ssh_port='N/A',
+                 num_gpus='N/A', gpu_util='N/A', actual_status='N/A', label='N/A', disk_util='N/A',
+                 disk_space='N/A', cpu_util='N/A', account='', stale=None):
+        self.instance_id = instance_id
+        self.gpu_name = gpu_name
+        self.dph_total = dph_total
+        self.ssh_host = ssh_host
+        self.ssh_port = ssh_port
+        self.num_gpus = num_gpus
+        self.gpu_util = gpu_util
+        self.actual_status = actual_status
+        self.label = label
+        self.disk_util = disk_util
+        self.disk_space = disk_space
+        self.cpu_util = cpu_util
+        self.account = account
+        self.stale = stale
+
+    @classmethod
+    def from_api(cls, instance):
+        """Record from one object of the /instances/ response; missing fields are 'N/A' as before."""
+        return cls(**{name: instance.get(api_name, 'N/A') for name, api_name in cls.API_FIELDS.items()})
+
+    @classmethod
+    def from_dict(cls, mapping):
+        """Record from an ssh_info dict (e.g. the inventory cache); unknown keys are ignored."""
+        return cls(**{name: mapping[name] for name in cls.__slots__ if name in mapping})
+
+    def copy(self):
+        return type(self)(*(getattr(self, name) for name in self.__slots__))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"InstanceRecord({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+SampleRecord = namedtuple('SampleRecord', ['ts', 'instance_id', 'gpu_name', 'num_gpus', 'dph_total', 'hash_rate',
+                                           'normal_blocks', 'runtime', 'difficulty', 'cpu_util', 'gpu_util',
+                                           'disk_util'],
+                          defaults=(None,) * 10)
+SampleRecord.__doc__ = """One row of the metrics store's samples table, in column order; only ts and instance_id are required."""
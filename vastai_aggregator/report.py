@@ -0,0 +1,281 @@
+"""Console table, outlier report and machine-readable output of a fleet snapshot."""
+import datetime
+import json
+import logging
+import time
+from collections import defaultdict
+
+from prettytable import PrettyTable
+
+from .balance import balance_summary, print_vastai_balance
+from .dashboard import dashboard_summary
+from .fleet import account_summaries, aggregate_fleet
+from .metrics import METRICS
+from .outliers import OutlierDetector
+from .probe import merge_probe_results, probe_warnings
+from .storage import build_gpu_samples, build_samples
+
+logger = logging.getLogger(__name__)
+
+TABLE_COLUMNS = ["Instance ID", "GPU Name", "GPU's", "Util.%", "USD/h", "USD/GPU", "Inst.H/s", "GPU H/s", "XNM Blocks", "Runtime", "Block/h", "H/s/USD", "USD/Block", "Label", "CPU %", "HDD %", "Account"]
+
+
+def print_table(data, mean_difficulty, average_dollars_per_normal_block, total_dph_running_machines, usd_per_gpu, hash_rate_per_gpu, hash_rate_per_usd, label, disk_util, disk_space, cpu_util, sum_normal_block_per_hour, total_hash_rate, total_gpus_running, output_file=None):
+    if not data:  # If data list is empty, do not proceed.
+        print("No data to print.")
+        return
+    # Define the table and its columns; the account column is only shown when accounts are named
+    columns = TABLE_COLUMNS if any(row[16] for row in data) else TABLE_COLUMNS[:16]
+    table = PrettyTable()
+    table.field_names = columns
+
+    # Add rows to the table
+    for row in data:
+        table.add_row(row[:len(columns)])
+
+    # Get current timestamp
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Print the table
+    try:
+        if mean_difficulty is not None:
+            difficulty = int(mean_difficulty)
+        else:
+            difficulty = "N/A"
+        
+        total_hash_rate_str = f"{total_hash_rate:.2f} h/s" if total_hash_rate is not None else "N/A"
+        total_dph_running_machines_str = f"{total_dph_running_machines:.4f}$" if total_dph_running_machines is not None else "N/A"
+        average_dollars_per_normal_block_str = f"{average_dollars_per_normal_block:.4f}$" if average_dollars_per_normal_block is not None else "N/A"
+        sum_normal_block_per_hour_str = f"{sum_normal_block_per_hour:.2f}" if sum_normal_block_per_hour is not None else "N/A"
+        
+        print("")
+        print(f"\nTimestamp: {timestamp}, GPU's: {total_gpus_running}, Difficulty: {difficulty}, Total Hash: {total_hash_rate_str}, Total DPH: {total_dph_running_machines_str}, Avg_$/Block: {average_dollars_per_normal_block_str}, Total Blocks/h: {sum_normal_block_per_hour_str}")
+        print(table)
+    except TypeError as e:
+        print(f"Error printing table: {e}")
+
+    if not output_file:
+        return
+
+    # Write the table and timestamp to a text file
+    with open(output_file, 'a') as f:
+        try:
+            f.write(f"Timestamp: {timestamp}, GPU's: {total_gpus_running}, Difficulty: {difficulty}, Total Hash: {total_hash_rate_str}, Total DPH: {total_dph_running_machines_str}, Avg_$/Block: {average_dollars_per_normal_block_str}, Total Blocks/h: {sum_normal_block_per_hour_str}\n{table}\n")
+        except TypeError as e:
+            print(f"Error writing to file: {e}")
+
+    print(f"Table also written to {output_file}\n")
+
+
+def print_outliers(table_data, gpu_stats, gpu_util_warnings_set, threshold, detector=None):
+    """Print GPU utilization warnings and per GPU type performance stats with outliers.
+
+    'gpu_stats' maps GPU type to its running {"mean", "std_dev", "count"} of per-GPU hash rates.
+    With an OutlierDetector, its rolling statistics and outliers are printed instead of those of
+    this snapshot, and instances that have been below average for a while are flagged.
+    """
+    highlighted_outliers = defaultdict(list)
+
+    if detector is not None:
+        gpu_stats = detector.group_stats()
+        highlighted_outliers.update(detector.outliers())
+
+    # Mean and standard deviation for each GPU type with enough data
+    stats = {gpu_type: gpu_type_stats for gpu_type, gpu_type_stats in gpu_stats.items() if gpu_type_stats["count"] > 1}
+
+    if detector is None:
+        # Group the per-GPU hash rates (the 'GPU H/s' column, like the GPU type stats) by GPU type once
+        hash_rates_by_gpu_type = defaultdict(list)
+        for row in table_data:
+            if row[7] != 'N/A':
+                hash_rates_by_gpu_type[row[1]].append((row[0], float(row[7])))
+        for gpu_type, gpu_type_stats in stats.items():
+            average_hash_rate = gpu_type_stats["mean"]
+            std_dev_hash_rate = gpu_type_stats["std_dev"]
+            if std_dev_hash_rate > 0:
+                # Calculate outliers and performances based on actual data per GPU type
+                for instance_id, instance_hash_rate in hash_rates_by_gpu_type.get(gpu_type, ()):
+                    z_score = (instance_hash_rate - average_hash_rate) / std_dev_hash_rate
+                    if z_score < -threshold:
+                        highlighted_outliers[gpu_type].append((instance_id, instance_hash_rate, z_score, 0))
+
+    # Print Warnings if GPU not fully utilized
+    for warning in gpu_util_warnings_set:
+        logger.warning(warning)
+    print("\n" + "-" * 60 )  # Print a blank line for visual separation if there were any warnings     
+
+    # Print Outliers and Stats
+    insufficient_data_messages = []  # List to store messages for insufficient data
+    for gpu_type in gpu_stats.keys():  # Iterate through all GPU types
+
+        if gpu_type in stats:
+            mean = stats[gpu_type]["mean"]
+            std_dev = stats[gpu_type]["std_dev"]
+            print(f"\n** {gpu_type} Performance Stats: **")
+            print(f"- Average hash rate: {mean:.2f} H/s, Standard deviation: {std_dev:.2f} H/s")
+
+            if gpu_type in highlighted_outliers and highlighted_outliers[gpu_type]:
+                # Sort the highlighted outliers by Z-Score from lowest to highest (worst to best)
+                sorted_outliers = sorted(highlighted_outliers[gpu_type], key=lambda x: x[2])
+            
+                print("- Note: Some instances are below the average hash rate:")
+                for ID, h_rate, z_score, streak in sorted_outliers:
+                    percent_from_mean = (mean - h_rate) / mean * 100  # Calculate the percentage from the mean here
+                    sustained = f", below average for the last {streak} samples" if detector is not None and streak >= detector.sustain else ""
+                    print(f"  - Instance ID {ID}: {h_rate:.2f}H/s, {percent_from_mean:.2f}% below average, Variance: {z_score:.2f} Z-Score{sustained}")
+                print()
+            else:
+                # Check the standard deviation and print an additional message if needed
+                print("- All instances are performing within expected range.")
+                if std_dev > 50:
+                    print(f"  (!) Warning: Alarming deviation for {gpu_type} above 50 H/s! Consider lowering the Z-Score threshold in User configuration and re-run script for more details.")
+        else:
+            insufficient_data_messages.append(f"** {gpu_type}: ** Not enough data to measure performance stats.")
+
+    # Print messages for insufficient data at the end
+    print("\n" + "-" * 60 + "\n")
+    for message in insufficient_data_messages:
+        print(message)
+
+
+def record_fleet_gauges(fleet, total_dph_running_machines, balance):
+    """Publish the fleet totals of one report as gauges."""
+    METRICS.set('vastai_fleet_hash_rate', fleet['total_hash_rate'])
+    METRICS.set('vastai_fleet_dph', total_dph_running_machines)
+    METRICS.set('vastai_fleet_blocks_per_hour', fleet['sum_normal_block_per_hour'])
+    METRICS.set('vastai_fleet_usd_per_block', fleet['average_dollars_per_normal_block'])
+    if balance is not None:
+        METRICS.set('vastai_balance_usd', balance)
+        # Same runway as printed with the balance, including the 1% fee
+        runway_hours = balance_summary(balance, total_dph_running_machines)['runway_hours']
+        if runway_hours is not None:
+            METRICS.set('vastai_balance_runway_hours', runway_hours)
+
+
+def accounts_report(table_data, ssh_info_list, account_balances):
+    """Per-account totals, GPU type stats and balance runway."""
+    summaries = account_summaries(table_data, ssh_info_list, account_balances)
+    for account, summary in summaries.items():
+        summary['balance'] = balance_summary(account_balances[account], summary['total_dph'])
+    return summaries
+
+
+def print_accounts(summaries):
+    for account, summary in summaries.items():
+        balance = summary['balance']
+        runway = f", lasts {balance['runway_hours']:.1f} hours" if balance['runway_hours'] is not None else ""
+        balance_str = f"${balance['balance']:.2f}{runway}" if balance['balance'] is not None else "N/A"
+        print(f"\nAccount {account}: GPU's: {summary['total_gpus']}, Total Hash: {summary['total_hash_rate']:.2f} h/s, "
+              f"Total DPH: {summary['total_dph']:.4f}$, Total Blocks/h: {summary['sum_normal_block_per_hour']:.2f}, Balance: {balance_str}")
+        for gpu_type, stats in summary['gpu_stats'].items():
+            print(f"- {gpu_type}: {stats['mean']:.2f} H/s per GPU, Standard deviation: {stats['std_dev']:.2f} H/s ({stats['count']} instances)")
+
+
+def print_host_warnings(probes):
+    """Log what the remote probes found wrong: stopped miners and lagging GPUs of multi-GPU instances."""
+    for instance_id, probe in probes.items():
+        for warning in probe_warnings(instance_id, probe):
+            logger.warning(warning)
+
+
+def probe_dict(probe):
+    """JSON-serializable form of a ProbeResult, without the log sample already in the table."""
+    return {
+        'gpus': [gpu._asdict() for gpu in probe.gpus] if probe.gpus is not None else None,
+        'miner_processes': probe.miner_processes,
+        'disk': probe.disk._asdict() if probe.disk is not None else None,
+    }
+
+
+def observe_outliers(detector, ssh_info_list, log_info_by_instance, probes=None):
+    """Feed the new samples to the detector and log the sustained underperformance alerts it raises."""
+    for instance_id, gpu_type, hash_rate, z_score in detector.observe_fleet(ssh_info_list, log_info_by_instance, probes):
+        METRICS.inc('vastai_outlier_alerts_total')
+        logger.warning("Instance %s has been below the %s average for %s samples: %.2f H/s per GPU, Z-Score %.2f.",
+                       instance_id, gpu_type, detector.sustain, hash_rate, z_score)
+
+
+def fleet_report_dict(fleet, total_dph_running_machines, total_gpus_running, balance=None, probes=None, detector=None, accounts=None):
+    """The data shown by render_report() as a JSON-serializable dict."""
+    return {
+        'timestamp': time.time(),
+        'total_gpus': total_gpus_running,
+        'total_dph': total_dph_running_machines,
+        'total_hash_rate': fleet['total_hash_rate'],
+        'mean_difficulty': fleet['mean_difficulty'],
+        'average_dollars_per_normal_block': fleet['average_dollars_per_normal_block'],
+        'sum_normal_block_per_hour': fleet['sum_normal_block_per_hour'],
+        'balance': balance_summary(balance, total_dph_running_machines) if balance is not None else None,
+        'instances': [dict(zip(TABLE_COLUMNS, row)) for row in fleet['table_data']],
+        'gpu_stats': fleet['gpu_stats'],
+        'gpu_util_warnings': sorted(fleet['gpu_util_warnings']),
+        'hosts': {str(instance_id): probe_dict(probe) for instance_id, probe in (probes or {}).items()},
+        'outliers': {gpu_type: [{'instance_id': instance_id, 'hash_rate_per_gpu': hash_rate, 'z_score': z_score, 'samples_below': streak}
+                                for instance_id, hash_rate, z_score, streak in outliers]
+                     for gpu_type, outliers in detector.outliers().items()} if detector is not None else None,
+        'accounts': accounts,
+    }
+
+
+def render_report(ssh_info_list, log_info_by_instance, total_dph_running_machines, total_gpus_running, balance=None, store=None, aggregator=None,
+                  print_balance=True, threshold=1, output_file=None, sort_column_index=11, sort_order='ascending', json_output=False,
+                  probes=None, detector=None, account_balances=None, dashboard=None, fresh=None, log_samples=None):
+    """Aggregate the latest collected data, record it in the store and print the balance, table, warnings and outliers.
+
+    'probes' are the ProbeResults of the poll; their GPU and disk readings replace the API's where available.
+    'fresh' is the set of instance IDs with a new reading since the last render; only their samples are
+    stored, so readings carried over from earlier polls are not recorded again (default: all of them).
+    With 'log_samples' ({instance_id: [MiningSample]} read since the last render) every one of those
+    samples is stored with its own timestamp instead of only the latest reading.
+    Outliers come from 'detector' (an OutlierDetector kept across polls in watch mode, a new one otherwise).
+    With 'account_balances' ({account name: balance}) of several accounts, per-account summaries are shown as well.
+    With json_output the same data is printed as a single JSON document instead, and with a
+    'dashboard' (a LiveDashboard) the rows and totals are handed to it instead of being printed.
+    """
+    with METRICS.time('vastai_render_seconds'):
+        if probes:
+            ssh_info_list = merge_probe_results(ssh_info_list, probes)
+        if store is not None:
+            # Stale samples were already recorded when they were fresh
+            fresh_log_info = {instance_id: log_info for instance_id, log_info in log_info_by_instance.items()
+                              if (fresh is None or instance_id in fresh)
+                              and (probes is None or instance_id not in probes or probes[instance_id].error is None)}
+            sampled = ssh_info_list if fresh is None else [ssh_info for ssh_info in ssh_info_list if ssh_info['instance_id'] in fresh]
+            store.write_samples(build_samples(sampled, fresh_log_info, log_samples=log_samples))
+            if probes:
+                store.write_gpu_samples(build_gpu_samples({instance_id: probe for instance_id, probe in probes.items()
+                                                           if fresh is None or instance_id in fresh}))
+        fleet = aggregate_fleet(ssh_info_list, log_info_by_instance, aggregator, sort_column_index, sort_order)
+        record_fleet_gauges(fleet, total_dph_running_machines, balance)
+        if detector is None:
+            detector = OutlierDetector(threshold)
+        observe_outliers(detector, ssh_info_list, log_info_by_instance, probes)
+        accounts = None
+        if account_balances is not None and len(account_balances) > 1:
+            accounts = accounts_report(fleet['table_data'], ssh_info_list, account_balances)
+
+        if json_output:
+            print(json.dumps(fleet_report_dict(fleet, total_dph_running_machines, total_gpus_running, balance, probes, detector, accounts), default=str))
+            return
+        if dashboard is not None:
+            outliers = {outlier[0] for outliers in detector.outliers().values() for outlier in outliers}
+            dashboard.update(fleet['table_data'], dashboard_summary(fleet, total_dph_running_machines, total_gpus_running, balance),
+                             outliers, fleet['low_gpu_util_instances'])
+            return
+
+        table_data = fleet['table_data']
+        if print_balance:
+            print("\n" + "-" * 60 + "\n")
+            print_vastai_balance(balance, total_dph_running_machines)
+            print("\n" + "-" * 60)
+        if accounts:
+            print_accounts(accounts)
+            print("\n" + "-" * 60)
+
+        # Print the table
+        print_table(table_data, fleet['mean_difficulty'], fleet['average_dollars_per_normal_block'], total_dph_running_machines, None, None, None, None, None, None, None, fleet['sum_normal_block_per_hour'], fleet['total_hash_rate'], total_gpus_running,
+                    output_file=output_file)
+
+        if probes:
+            print_host_warnings(probes)
+        print_outliers(table_data, fleet['gpu_stats'], fleet['gpu_util_warnings'], threshold, detector)
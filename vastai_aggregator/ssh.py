@@ -0,0 +1,298 @@
+"""Pooled SSH connections and incremental miner.log collection."""
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from .logparse import clean_ansi_codes, parse_log_buffer, parse_log_line
+from .metrics import METRICS, classify_ssh_error
+from .probe import EMPTY_PROBE, ProbeResult, build_probe_command, parse_probe_output
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = '/root/XENGPUMiner/miner.log'
+
+
+class SSHConnectionPool:
+    """Keeps one authenticated SSH transport per (ssh_host, ssh_port) alive between polls.
+
+    The private key is loaded and decrypted once. Hosts can be assigned another key than the
+    default one (e.g. the instances of another account). Commands run on new exec channels of the
+    pooled transport, which is reconnected transparently when it has died or grown too old.
+    """
+
+    def __init__(self, username, private_key_path, passphrase=None, connect_timeout=None, idle_timeout=300, max_age=3600):
+        self.username = username
+        self.private_key_path = private_key_path
+        self.passphrase = passphrase
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self._keys = {}              # (private_key_path, passphrase) -> loaded key
+        self._host_credentials = {}  # (ssh_host, ssh_port) -> (private_key_path, passphrase)
+        self._lock = threading.Lock()
+        self._host_locks = defaultdict(threading.Lock)
+        self._connections = {}  # (ssh_host, ssh_port) -> {'transport', 'created', 'last_used'}
+
+    def assign_key(self, ssh_host, ssh_port, private_key_path, passphrase=None):
+        """Authenticate to one host with another key than the pool's default one."""
+        with self._lock:
+            self._host_credentials[(ssh_host, ssh_port)] = (private_key_path, passphrase)
+
+    def load_key(self, ssh_host=None, ssh_port=None):
+        """Load the key of a host (the default key if none was assigned) on first use and cache it."""
+        with self._lock:
+            credentials = self._host_credentials.get((ssh_host, ssh_port), (self.private_key_path, self.passphrase))
+            key = self._keys.get(credentials)
+            if key is None:
+                key = self._keys[credentials] = paramiko.Ed25519Key(filename=credentials[0], password=credentials[1] or None)
+            return key
+
+    def _connect(self, ssh_host, ssh_port):
+        key = self.load_key(ssh_host, ssh_port)
+        with METRICS.time('vastai_ssh_handshake_seconds'):
+            sock = socket.create_connection((ssh_host, int(ssh_port)), timeout=self.connect_timeout)
+            transport = paramiko.Transport(sock)
+            try:
+                transport.banner_timeout = self.connect_timeout
+                transport.auth_timeout = self.connect_timeout
+                transport.start_client(timeout=self.connect_timeout)
+                transport.auth_publickey(self.username, key)
+            except Exception:
+                transport.close()
+                raise
+        transport.set_keepalive(30)
+        return transport
+
+    def _drop(self, host_key):
+        entry = self._connections.pop(host_key, None)
+        if entry is not None:
+            entry['transport'].close()
+
+    def get_transport(self, ssh_host, ssh_port):
+        """Return a live transport for the host, reconnecting if the pooled one is dead or stale."""
+        host_key = (ssh_host, ssh_port)
+        with self._lock:
+            host_lock = self._host_locks[host_key]
+        with host_lock:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._connections.get(host_key)
+            if entry is not None and (not entry['transport'].is_active() or now - entry['created'] > self.max_age):
+                with self._lock:
+                    self._drop(host_key)
+                entry = None
+            if entry is None:
+                transport = self._connect(ssh_host, ssh_port)
+                entry = {'transport': transport, 'created': now, 'last_used': now}
+                with self._lock:
+                    self._connections[host_key] = entry
+            entry['last_used'] = now
+            return entry['transport']
+
+    def open_channel(self, ssh_host, ssh_port, command, timeout=None):
+        """Start a command on a new channel of the pooled transport and return the channel."""
+        for attempt in range(2):
+            transport = self.get_transport(ssh_host, ssh_port)
+            try:
+                channel = transport.open_session(timeout=self.connect_timeout)
+            except (paramiko.ssh_exception.SSHException, EOFError, OSError):
+                # The transport died since it was last used; reconnect once and retry
+                with self._lock:
+                    self._drop((ssh_host, ssh_port))
+                if attempt == 1:
+                    raise
+                continue
+            try:
+                channel.settimeout(timeout)
+                channel.exec_command(command)
+            except Exception:
+                channel.close()
+                raise
+            return channel
+
+    def exec_command(self, ssh_host, ssh_port, command, timeout=None):
+        """Run a command on a new channel of the pooled transport and return its stdout as bytes."""
+        channel = self.open_channel(ssh_host, ssh_port, command, timeout)
+        try:
+            return channel.makefile('rb').read()
+        finally:
+            channel.close()
+
+    def evict_idle(self, keep=()):
+        """Close connections that have been idle or open for too long.
+
+        Connections to the (ssh_host, ssh_port) pairs in 'keep', hosts that are still going to be
+        polled, are only closed for their age, however long the poll interval is.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for host_key, entry in list(self._connections.items()):
+                idle = host_key not in keep and now - entry['last_used'] > self.idle_timeout
+                if idle or now - entry['created'] > self.max_age:
+                    logger.info("Closing idle SSH connection to %s:%s", *host_key)
+                    self._drop(host_key)
+
+    def close(self, ssh_host, ssh_port):
+        """Close the pooled connection to one host, if any."""
+        with self._lock:
+            self._drop((ssh_host, ssh_port))
+
+    def close_all(self):
+        with self._lock:
+            for host_key in list(self._connections):
+                self._drop(host_key)
+
+
+def new_log_cursor(history_size=1000):
+    """Per-instance read position in the remote miner log, plus the samples parsed from it that were not taken yet."""
+    return {'inode': None, 'offset': 0, 'latest': None, 'samples': deque(maxlen=history_size)}
+
+
+def take_log_samples(cursor):
+    """Remove and return the samples parsed into the cursor since the last call, oldest first."""
+    samples = list(cursor['samples'])
+    cursor['samples'].clear()
+    return samples
+
+
+def _consume_log(cursor, log_header, data, max_bytes):
+    """Advance the cursor over the complete log lines in data and return the freshest sample, or None."""
+    inode, _, start = log_header
+    start = int(start)
+    if inode != str(cursor['inode']) or start != cursor['offset']:
+        cursor['latest'] = None  # New, rotated or truncated log
+
+    # Only consume complete lines (tqdm progress updates are separated by carriage returns)
+    end = max(data.rfind(b'\n'), data.rfind(b'\r')) + 1
+    if end == 0 and len(data) >= max_bytes:
+        end = len(data)
+    cursor['inode'] = inode
+    cursor['offset'] = start + end
+
+    # Clean ANSI codes from the new log lines and parse them in one batch
+    new_samples = list(parse_log_buffer(data[:end]))
+    if new_samples:
+        cursor['samples'].extend(new_samples)
+        cursor['latest'] = new_samples[-1]
+
+    # A trailing progress line without terminator yet is still the freshest reading,
+    # it is only consumed (and stored) once the miner writes past it.
+    last_line = clean_ansi_codes(data[end:].decode(errors='replace')).strip()
+    partial_sample = parse_log_line(last_line) if last_line else None
+    if partial_sample is not None:
+        logger.info("Raw log line: %s", last_line)
+        return partial_sample
+    if cursor['latest'] is None:
+        METRICS.inc('vastai_failures_total', kind='parse')
+        logger.error("Failed to parse the log line: %s", last_line)
+    return cursor['latest']
+
+
+def probe_instance(pool, ssh_host, ssh_port, exec_timeout=None, cursor=None,
+                   log_path=DEFAULT_LOG_PATH, initial_bytes=65536, max_bytes=4194304, process_pattern='miner.py'):
+    """Run the probe command on one instance in a single round trip.
+
+    The miner log bytes appended since the last poll are parsed into the cursor as in get_log_info();
+    the GPU, miner process and disk readings come back alongside in a ProbeResult.
+    """
+    if cursor is None:
+        cursor = new_log_cursor()
+    try:
+        # Attempt to load the private key with the provided passphrase (only decrypted once per pool)
+        try:
+            pool.load_key(ssh_host, ssh_port)
+        except paramiko.ssh_exception.PasswordRequiredException:
+            logger.error("Private key file is encrypted and requires a passphrase.")
+            return EMPTY_PROBE._replace(error='config')
+        except paramiko.ssh_exception.SSHException as e:
+            logger.error("Failed to decrypt private key with provided passphrase: %s", e)
+            return EMPTY_PROBE._replace(error='config')
+        except OSError as e:
+            METRICS.inc('vastai_failures_total', kind='config')
+            logger.error("Failed to read the private key file: %s", e)
+            return EMPTY_PROBE._replace(error='config')
+
+        # Execute the probe over the pooled connection
+        command = build_probe_command(cursor, log_path, initial_bytes, max_bytes, process_pattern)
+        with METRICS.time('vastai_ssh_exec_seconds'):
+            output = pool.exec_command(ssh_host, ssh_port, command, timeout=exec_timeout)
+    except Exception as e:
+        kind = classify_ssh_error(e)
+        METRICS.inc('vastai_failures_total', kind=kind)
+        logger.error("Failed to connect or retrieve log info: %s", e)
+        return EMPTY_PROBE._replace(error=kind)
+
+    parse_started = time.perf_counter()
+    gpus, miner_processes, disk, log_header, data = parse_probe_output(output)
+    sample, error = None, None
+    if log_header is None:
+        error = 'missing_log'
+        METRICS.inc('vastai_failures_total', kind=error)
+        logger.error("Failed to connect or retrieve log info: %s not found", log_path)
+    else:
+        try:
+            sample = _consume_log(cursor, log_header, data, max_bytes)
+        except ValueError as e:
+            METRICS.inc('vastai_failures_total', kind='parse')
+            logger.error("Failed to parse the probe output: %s", e)
+        if sample is None:
+            error = 'parse'
+    METRICS.observe('vastai_log_parse_seconds', time.perf_counter() - parse_started)
+    if sample is None:
+        return ProbeResult(EMPTY_PROBE.sample, gpus, miner_processes, disk, error)
+    return ProbeResult(sample, gpus, miner_processes, disk)
+
+
+def get_log_info(pool, ssh_host, ssh_port, exec_timeout=None, cursor=None,
+                 log_path=DEFAULT_LOG_PATH, initial_bytes=65536, max_bytes=4194304):
+    """Read the miner log bytes appended since the last poll and parse every new progress line.
+
+    All parsed samples are appended to cursor['samples'] (see take_log_samples()); the most recent one is returned.
+    """
+    return probe_instance(pool, ssh_host, ssh_port, exec_timeout, cursor, log_path, initial_bytes, max_bytes).sample
+
+
+def collect_probes(ssh_info_list, pool, max_workers=16, exec_timeout=None, log_cursors=None,
+                   log_path=DEFAULT_LOG_PATH, initial_bytes=65536, max_bytes=4194304, history_size=1000,
+                   process_pattern='miner.py', scheduled=None):
+    """Probe all instances concurrently.
+
+    'log_cursors' maps instance ID to its log cursor and is updated in place, so that the next
+    call only reads what was appended in between. 'scheduled' lists instances that are polled
+    later (e.g. less often by an adaptive scheduler); their connections are not closed as idle.
+    Returns a dict mapping instance ID to the ProbeResult returned by probe_instance().
+    """
+    if log_cursors is None:
+        log_cursors = {}
+    for ssh_info in ssh_info_list:
+        if ssh_info['instance_id'] not in log_cursors:
+            log_cursors[ssh_info['instance_id']] = new_log_cursor(history_size)
+
+    def fetch(ssh_info):
+        logger.info("Fetching log info for instance ID: %s", ssh_info['instance_id'])
+        return probe_instance(pool, ssh_info['ssh_host'], ssh_info['ssh_port'], exec_timeout=exec_timeout,
+                              cursor=log_cursors[ssh_info['instance_id']], log_path=log_path,
+                              initial_bytes=initial_bytes, max_bytes=max_bytes, process_pattern=process_pattern)
+
+    pool.evict_idle({(ssh_info['ssh_host'], ssh_info['ssh_port']) for ssh_info in (*ssh_info_list, *(scheduled or ()))})
+    if not ssh_info_list:
+        return {}
+    with METRICS.time('vastai_collect_seconds'), ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = executor.map(fetch, ssh_info_list)
+        return {ssh_info['instance_id']: result for ssh_info, result in zip(ssh_info_list, results)}
+
+
+def collect_log_info(ssh_info_list, pool, max_workers=16, exec_timeout=None, log_cursors=None,
+                     log_path=DEFAULT_LOG_PATH, initial_bytes=65536, max_bytes=4194304, history_size=1000):
+    """Fetch log information for all instances concurrently.
+
+    Like collect_probes(), but returns a dict mapping instance ID to the tuple returned by get_log_info().
+    """
+    probes = collect_probes(ssh_info_list, pool, max_workers, exec_timeout, log_cursors,
+                            log_path, initial_bytes, max_bytes, history_size)
+    return {instance_id: probe.sample for instance_id, probe in probes.items()}
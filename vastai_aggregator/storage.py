@@ -0,0 +1,197 @@
+"""SQLite history of per-instance samples."""
+import sqlite3
+import threading
+import time
+
+from .records import SampleRecord
+
+
+class MetricsStore:
+    """Append-only SQLite time series of per-instance samples."""
+
+    COLUMNS = SampleRecord._fields
+    GPU_COLUMNS = ('ts', 'instance_id', 'gpu_index', 'utilization', 'temperature', 'power_draw', 'sm_clock',
+                   'memory_clock', 'memory_used')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    ts REAL NOT NULL,            -- unix time of the poll, or of the log line when backfilled
+                    instance_id INTEGER NOT NULL,
+                    gpu_name TEXT,
+                    num_gpus INTEGER,
+                    dph_total REAL,
+                    hash_rate REAL,
+                    normal_blocks INTEGER,
+                    runtime REAL,                -- miner runtime in hours
+                    difficulty INTEGER,
+                    cpu_util REAL,
+                    gpu_util REAL,
+                    disk_util REAL               -- HDD usage in percent
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_instance_ts ON samples (instance_id, ts)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_gpu_ts ON samples (gpu_name, ts)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS gpu_samples (
+                    ts REAL NOT NULL,
+                    instance_id INTEGER NOT NULL,
+                    gpu_index INTEGER,
+                    utilization REAL,            -- percent
+                    temperature REAL,            -- degrees C
+                    power_draw REAL,             -- watts
+                    sm_clock REAL,               -- MHz
+                    memory_clock REAL,           -- MHz
+                    memory_used REAL             -- MiB
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_gpu_samples_instance_ts ON gpu_samples (instance_id, ts)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS backfill (
+                    instance_id INTEGER PRIMARY KEY,
+                    inode TEXT,                  -- inode of the miner log that was read
+                    log_offset INTEGER NOT NULL, -- bytes of it already stored
+                    updated REAL NOT NULL
+                )""")
+
+    def _executemany_insert(self, table, columns, samples):
+        rows = [sample if isinstance(sample, SampleRecord) else tuple(sample.get(column) for column in columns)
+                for sample in samples]
+        if rows:
+            placeholders = ", ".join("?" * len(columns))
+            self._conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def _insert(self, table, columns, samples):
+        with self._lock, self._conn:
+            self._executemany_insert(table, columns, samples)
+
+    def write_samples(self, samples):
+        """Insert a batch of samples (SampleRecords or dicts keyed by COLUMNS) in a single transaction."""
+        self._insert('samples', self.COLUMNS, samples)
+
+    def write_gpu_samples(self, samples):
+        """Insert a batch of per-GPU samples (dicts keyed by GPU_COLUMNS) in a single transaction."""
+        self._insert('gpu_samples', self.GPU_COLUMNS, samples)
+
+    def backfill_position(self, instance_id):
+        """(inode, offset) of the instance's miner log up to which it was backfilled, or (None, 0)."""
+        with self._lock:
+            row = self._conn.execute("SELECT inode, log_offset FROM backfill WHERE instance_id = ?", (instance_id,)).fetchone()
+        return (row['inode'], row['log_offset']) if row is not None else (None, 0)
+
+    def write_backfill(self, instance_id, samples, inode, offset):
+        """Insert backfilled samples and the new log position of the instance in a single transaction."""
+        with self._lock, self._conn:
+            self._executemany_insert('samples', self.COLUMNS, samples)
+            self._conn.execute("INSERT OR REPLACE INTO backfill (instance_id, inode, log_offset, updated) VALUES (?, ?, ?, ?)",
+                               (instance_id, inode, offset, time.time()))
+
+    def query(self, instance_id=None, gpu_name=None, start=None, end=None):
+        """Return samples ordered by time, optionally filtered by instance, GPU type and [start, end) window."""
+        conditions, params = [], []
+        if instance_id is not None:
+            conditions.append("instance_id = ?")
+            params.append(instance_id)
+        if gpu_name is not None:
+            conditions.append("gpu_name = ?")
+            params.append(gpu_name)
+        if start is not None:
+            conditions.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("ts < ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(f"SELECT * FROM samples{where} ORDER BY ts", params)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _runtime_seconds(sample):
+    return sample[0] * 3600 + sample[1] * 60 + sample[2]
+
+
+def date_log_samples(samples, latest, timestamp):
+    """[(ts, sample)] for samples read from one log, in log order.
+
+    'latest' (the freshest reading, or None) was read at 'timestamp'; the samples before it are
+    dated back by the difference in miner runtime. A run that restarted is assumed to have ended
+    when the next one started.
+    """
+    dated = []
+    next_runtime = _runtime_seconds(latest) if latest is not None and latest[0] is not None else None
+    for sample in reversed(samples):
+        runtime = _runtime_seconds(sample)
+        if next_runtime is not None:
+            timestamp -= next_runtime - runtime if runtime <= next_runtime else next_runtime
+        dated.append((timestamp, sample))
+        next_runtime = runtime
+    dated.reverse()
+    return dated
+
+
+def _sample_record(ssh_info, log_info, timestamp):
+    hours, minutes, seconds, _, normal_blocks, _, hash_rate, difficulty = log_info
+    disk_util, disk_space = ssh_info['disk_util'], ssh_info['disk_space']
+    return SampleRecord(
+        ts=timestamp,
+        instance_id=ssh_info['instance_id'],
+        gpu_name=ssh_info['gpu_name'],
+        num_gpus=ssh_info['num_gpus'],
+        dph_total=ssh_info['dph_total'],
+        hash_rate=hash_rate,
+        normal_blocks=normal_blocks,
+        runtime=hours + minutes / 60 + seconds / 3600 if hours is not None else None,
+        difficulty=difficulty,
+        cpu_util=ssh_info['cpu_util'],
+        gpu_util=ssh_info['gpu_util'],
+        disk_util=disk_util / disk_space * 100 if isinstance(disk_util, (int, float)) and isinstance(disk_space, (int, float)) and disk_space else None,
+    )
+
+
+def build_samples(ssh_info_list, log_info_by_instance, timestamp=None, log_samples=None):
+    """One SampleRecord per instance from the instance list and the latest parsed log information.
+
+    With 'log_samples' ({instance_id: [MiningSample]}, the samples read from each log since the
+    last call) a record is built for every one of them instead, dated by date_log_samples();
+    instances without new samples get none.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    samples = []
+    for ssh_info in ssh_info_list:
+        instance_id = ssh_info['instance_id']
+        if log_samples is None:
+            samples.append(_sample_record(ssh_info, log_info_by_instance.get(instance_id, (None,) * 8), timestamp))
+            continue
+        for ts, sample in date_log_samples(log_samples.get(instance_id, ()), log_info_by_instance.get(instance_id), timestamp):
+            samples.append(_sample_record(ssh_info, sample, ts))
+    return samples
+
+
+def build_gpu_samples(probes, timestamp=None):
+    """One store sample per GPU from the probe results of a poll."""
+    timestamp = time.time() if timestamp is None else timestamp
+    samples = []
+    for instance_id, probe in probes.items():
+        for gpu in probe.gpus or ():
+            samples.append({
+                'ts': timestamp,
+                'instance_id': instance_id,
+                'gpu_index': gpu.index,
+                'utilization': gpu.utilization,
+                'temperature': gpu.temperature,
+                'power_draw': gpu.power_draw,
+                'sm_clock': gpu.sm_clock,
+                'memory_clock': gpu.memory_clock,
+                'memory_used': gpu.memory_used,
+            })
+    return samples
@@ -0,0 +1,248 @@
+"""Push-based log collection over long-lived 'tail -F' channels, one per instance."""
+import logging
+import queue
+import selectors
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .logparse import clean_ansi_codes, parse_log_buffer, parse_log_line
+from .metrics import METRICS, classify_ssh_error
+from .ssh import DEFAULT_LOG_PATH, new_log_cursor
+
+logger = logging.getLogger(__name__)
+
+
+StreamRecord = namedtuple('StreamRecord', ['instance_id', 'samples', 'latest'])
+StreamRecord.__doc__ = """New samples of one instance, and its freshest reading (None once its stream is lost)."""
+
+
+def build_tail_command(cursor, log_path, initial_bytes):
+    """Shell command printing "<inode> <size> <start>" and then following the log from <start> with tail -F.
+
+    As with polling, a resubscription continues at the cursor offset while the inode is unchanged
+    and the file has not shrunk, so lines that were already consumed are not replayed.
+    """
+    inode = cursor['inode'] if cursor['inode'] is not None else -1
+    return (f"f='{log_path}'; s=$(stat -c '%i %s' \"$f\" 2>/dev/null) || exit 1; set -- $s; "
+            f"if [ \"$1\" = '{inode}' ] && [ \"$2\" -ge {cursor['offset']} ]; then start={cursor['offset']}; "
+            f"else start=$(( $2 > {initial_bytes} ? $2 - {initial_bytes} : 0 )); fi; "
+            f"echo \"$1 $2 $start\"; exec tail -c +$((start + 1)) -F \"$f\" 2>/dev/null")
+
+
+class StreamingCollector:
+    """Keeps a 'tail -F' channel open on every instance and pushes parsed samples onto a queue.
+
+    All channels are read by one selector thread. The queue of StreamRecords is bounded: when the
+    consumer falls behind, the thread blocks on it and stops reading, so the SSH flow-control
+    windows fill up and the remote tails pause instead of memory growing. Channels that close or
+    fail to open are reopened with exponential backoff.
+    """
+
+    def __init__(self, pool, log_cursors=None, log_path=DEFAULT_LOG_PATH, initial_bytes=65536, max_bytes=4194304,
+                 history_size=1000, max_pending=1000, max_workers=16, retry_base=1.0, retry_max=60.0):
+        self.pool = pool
+        self.log_cursors = {} if log_cursors is None else log_cursors
+        self.log_path = log_path
+        self.initial_bytes = initial_bytes
+        self.max_bytes = max_bytes
+        self.history_size = history_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.records = queue.Queue(maxsize=max(1, max_pending))
+        self._lock = threading.Lock()
+        self._streams = {}   # instance_id -> {'ssh_info', 'channel', 'opened', 'connecting', 'buffer', 'header', 'failures', 'retry_at'}
+        self._retired = []   # channels of removed streams, closed by the selector thread
+        self._selector = selectors.DefaultSelector()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Close every channel and stop the selector thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for stream in self._streams.values():
+                for channel in (stream['channel'], stream['opened']):
+                    if channel is not None:
+                        channel.close()
+            self._streams.clear()
+            for channel in self._retired:
+                channel.close()
+            self._retired.clear()
+        self._selector.close()
+
+    def set_instances(self, ssh_info_list):
+        """Subscribe to instances that are new and drop the ones that are gone or moved to another host."""
+        wanted = {ssh_info['instance_id']: ssh_info for ssh_info in ssh_info_list}
+        with self._lock:
+            for instance_id, stream in list(self._streams.items()):
+                ssh_info = wanted.get(instance_id)
+                old = stream['ssh_info']
+                if ssh_info is None or (ssh_info['ssh_host'], ssh_info['ssh_port']) != (old['ssh_host'], old['ssh_port']):
+                    del self._streams[instance_id]
+                    self._retired.extend(channel for channel in (stream['channel'], stream['opened']) if channel is not None)
+            for instance_id, ssh_info in wanted.items():
+                stream = self._streams.get(instance_id)
+                if stream is None:
+                    self._streams[instance_id] = {'ssh_info': ssh_info, 'channel': None, 'opened': None, 'connecting': False,
+                                                  'buffer': b'', 'header': False, 'failures': 0, 'retry_at': 0.0}
+                else:
+                    stream['ssh_info'] = ssh_info
+
+    def drain(self):
+        """Take every queued record without blocking and return {instance_id: StreamRecord}.
+
+        The records of an instance are merged into one with all of their samples, oldest first,
+        and the freshest reading.
+        """
+        merged = {}
+        while True:
+            try:
+                record = self.records.get_nowait()
+            except queue.Empty:
+                return merged
+            previous = merged.get(record.instance_id)
+            if previous is not None:
+                previous.samples.extend(record.samples)
+                record = previous._replace(latest=record.latest)
+            merged[record.instance_id] = record
+
+    def _cursor(self, instance_id):
+        return self.log_cursors.setdefault(instance_id, new_log_cursor(self.history_size))
+
+    def _subscribe(self, instance_id, stream):
+        """Open the tail channel of one instance (in a worker thread)."""
+        ssh_info = stream['ssh_info']
+        channel = None
+        try:
+            self.pool.load_key(ssh_info['ssh_host'], ssh_info['ssh_port'])
+            command = build_tail_command(self._cursor(instance_id), self.log_path, self.initial_bytes)
+            with METRICS.time('vastai_ssh_exec_seconds'):
+                channel = self.pool.open_channel(ssh_info['ssh_host'], ssh_info['ssh_port'], command)
+        except Exception as e:
+            METRICS.inc('vastai_failures_total', kind=classify_ssh_error(e))
+            logger.error("Failed to open the log stream of instance %s: %s", instance_id, e)
+        with self._lock:
+            stream['connecting'] = False
+            if self._streams.get(instance_id) is not stream:
+                # Removed while connecting
+                if channel is not None:
+                    channel.close()
+            elif channel is None:
+                self._schedule_retry(stream)
+            else:
+                stream['opened'] = channel
+
+    def _schedule_retry(self, stream):
+        stream['failures'] += 1
+        stream['retry_at'] = time.monotonic() + min(self.retry_max, self.retry_base * 2 ** (stream['failures'] - 1))
+
+    def _reconcile(self):
+        """Apply subscription changes to the selector; only ever called from the selector thread."""
+        now = time.monotonic()
+        with self._lock:
+            for channel in self._retired:
+                self._unregister(channel)
+                channel.close()
+            self._retired.clear()
+            for instance_id, stream in self._streams.items():
+                if stream['opened'] is not None:
+                    stream['channel'], stream['opened'] = stream['opened'], None
+                    stream['buffer'], stream['header'] = b'', False
+                    self._selector.register(stream['channel'], selectors.EVENT_READ, (instance_id, stream))
+                elif stream['channel'] is None and not stream['connecting'] and stream['retry_at'] <= now:
+                    stream['connecting'] = True
+                    if stream['failures']:
+                        METRICS.inc('vastai_stream_resubscriptions_total')
+                    self._executor.submit(self._subscribe, instance_id, stream)
+            METRICS.set('vastai_stream_channels', len(self._selector.get_map()))
+
+    def _unregister(self, channel):
+        try:
+            self._selector.unregister(channel)
+        except KeyError:
+            pass  # Already dropped
+
+    def _close_channel(self, instance_id, stream, kind):
+        """Drop a dead channel, publish that the instance has no reading and schedule the resubscription."""
+        self._unregister(stream['channel'])
+        stream['channel'].close()
+        with self._lock:
+            stream['channel'] = None
+            if self._streams.get(instance_id) is stream:
+                self._schedule_retry(stream)
+        METRICS.inc('vastai_failures_total', kind=kind)
+        logger.error("Log stream of instance %s closed (%s), resubscribing.", instance_id, kind)
+        self._push(StreamRecord(instance_id, [], None))
+
+    def _push(self, record):
+        while not self._stopped.is_set():
+            try:
+                self.records.put(record, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _read(self, instance_id, stream):
+        try:
+            data = stream['channel'].recv(65536)
+        except Exception as e:
+            self._close_channel(instance_id, stream, classify_ssh_error(e))
+            return
+        if not data:
+            self._close_channel(instance_id, stream, 'ssh_error' if stream['header'] else 'missing_log')
+            return
+
+        parse_started = time.perf_counter()
+        cursor = self._cursor(instance_id)
+        buffer = stream['buffer'] + data
+        if not stream['header']:
+            header, found, buffer = buffer.partition(b'\n')
+            if not found:
+                stream['buffer'] = header
+                return
+            try:
+                inode, _, start = header.decode(errors='replace').split()
+                start = int(start)
+            except ValueError:
+                self._close_channel(instance_id, stream, 'parse')
+                return
+            if inode != str(cursor['inode']) or start != cursor['offset']:
+                cursor['latest'] = None  # New, rotated or truncated log
+            cursor['inode'], cursor['offset'] = inode, start
+            stream['header'] = True
+            stream['failures'] = 0
+
+        # Only consume complete lines; a trailing progress line is still the freshest reading
+        end = max(buffer.rfind(b'\n'), buffer.rfind(b'\r')) + 1
+        if end == 0 and len(buffer) >= self.max_bytes:
+            end = len(buffer)
+        new_samples = list(parse_log_buffer(buffer[:end]))
+        cursor['offset'] += end
+        stream['buffer'] = buffer[end:]
+        if new_samples:
+            cursor['latest'] = new_samples[-1]
+        last_line = clean_ansi_codes(stream['buffer'].decode(errors='replace')).strip()
+        partial_sample = parse_log_line(last_line) if last_line else None
+        METRICS.observe('vastai_log_parse_seconds', time.perf_counter() - parse_started)
+
+        latest = partial_sample if partial_sample is not None else cursor['latest']
+        if new_samples or partial_sample is not None:
+            self._push(StreamRecord(instance_id, new_samples, latest))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._reconcile()
+            for key, _ in self._selector.select(timeout=0.5):
+                instance_id, stream = key.data
+                if stream['channel'] is key.fileobj:
+                    self._read(instance_id, stream)